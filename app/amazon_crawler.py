@@ -15,27 +15,40 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from contextlib import closing
+from crawl_manifest import CrawlManifest
+from http_client import HttpClient, shared_client
+from page_store import PageStore, totalre
 from time import sleep
 import argparse
 import codecs
+import math
 import numpy as np
 import os
 import re
+import requests
 import socket
 import sys
+import threading
+import time
 
 
 if sys.version_info[0] >= 3:
-    import urllib
-    import urllib.request as request
-    import urllib.error as urlerror
+    import queue
+    from urllib.parse import urlparse
 else:
-    import urllib2 as request
-    import urllib2 as urlerror
+    import Queue as queue
+    from urlparse import urlparse
 
+counterre = re.compile('cm_cr_arp_d_paging_btm_([0-9]+)')
+robotre = re.compile('images-amazon\.com/captcha/')
 
-def download_page(url, referer, maxretries, timeout, pause):
+# throttles shared by the crawls of this process, by host
+_throttles = dict()
+_throttles_lock = threading.Lock()
+
+
+def download_page(url, referer, maxretries, timeout, pause, client=None):
+    client = client or shared_client()
     tries = 0
     htmlpage = None
     while tries < maxretries and htmlpage is None:
@@ -70,14 +83,16 @@ def download_page(url, referer, maxretries, timeout, pause):
             # print choice
 
             code = 404
-            req = request.Request(url)
-            req.add_header('Referer', referer)
-            req.add_header('User-agent', choice)
-            with closing(request.urlopen(req, timeout=timeout)) as f:
-                code = f.getcode()
-                htmlpage = f.read()
-                sleep(pause)
-        except (urlerror.URLError, socket.timeout, socket.error):
+            response = client.get(url, headers={'Referer': referer,
+                                                'User-agent': choice},
+                                  timeout=timeout)
+            code = response.status_code
+            if code != 200:
+                # error statuses such as 503 are handled by the caller
+                return None, code
+            htmlpage = response.content
+            sleep(pause)
+        except (requests.RequestException, socket.timeout, socket.error):
             tries += 1
     if htmlpage:
         return htmlpage.decode('utf-8'), code
@@ -85,6 +100,419 @@ def download_page(url, referer, maxretries, timeout, pause):
         return None, code
 
 
+class HostThrottle(object):
+    '''
+    Politeness budget shared by all crawler threads. Requests to the same
+    host are started at least the current pause apart, plus a random jitter.
+    The pause of a host grows on 503 and captcha pages and shrinks back to the
+    base pause after successful pages.
+    '''
+
+    def __init__(self, pause=1, jitter=2.75, step=1):
+        self.base = pause
+        self.jitter = jitter
+        self.step = step
+        self._lock = threading.Lock()
+        self._next = dict()
+        self._pause = dict()
+
+    def pause(self, host):
+        return self._pause.get(host, self.base)
+
+    def wait(self, host):
+        with self._lock:
+            now = time.time()
+            start = max(now, self._next.get(host, now))
+            self._next[host] = start + self.pause(host) + \
+                np.random.random() * self.jitter
+        if start > now:
+            sleep(start - now)
+
+    def backoff(self, host):
+        with self._lock:
+            self._pause[host] = self.pause(host) + 2 * self.step
+
+    def relax(self, host):
+        with self._lock:
+            self._pause[host] = max(self.base, self.pause(host) - self.step)
+
+
+def shared_throttle(host, pause=1):
+    '''
+    Returns the HostThrottle shared by all crawls of host within the process,
+    so that concurrent crawls of different products together stay within
+    the request rate allowed by the pause. pause is the base pause of the
+    throttle when it is created by the first crawl of host.
+    '''
+    with _throttles_lock:
+        if host not in _throttles:
+            _throttles[host] = HostThrottle(pause)
+
+    return _throttles[host]
+
+
+def page_url(base_url, id_, page, sort='helpful'):
+    return (base_url + '/product-reviews/' + str(id_) +
+            '/?ie=UTF8&showViewpoints=0&pageNumber=' + str(page) +
+            '&sortBy=' + sort)
+
+
+def page_path(basepath, id_, page):
+    return basepath + os.sep + id_ + os.sep + id_ + '_' + str(page) + '.html'
+
+
+def delta_path(basepath, id_):
+    return basepath + os.sep + id_ + os.sep + 'delta'
+
+
+def crawl(ids, domain='com', out='amazonreviews', force=False, maxretries=3,
+          timeout=180, pause=1, maxreviews=-1, captcha=False, workers=1,
+          base_url=None, throttle=None, client=None, progress=None,
+          raw=False):
+    '''
+    Downloads the review pages of the products in ids with a pool of worker
+    threads. Page 1 of each product is fetched first to discover the last
+    page, the remaining pages are then fetched in parallel. All threads share
+    one HostThrottle, by default the shared_throttle of the host that every
+    crawl in the process uses, so adding workers or concurrent crawls
+    overlaps the latency of requests but never exceeds the request rate
+    allowed by the pause. Pages are downloaded over the keep-alive
+    connections of client, which defaults to the shared HttpClient when its
+    pool is large enough for all workers.
+
+    progress is called with a dictionary describing every page that is
+    fetched, skipped, retried or failed, see the event function. The
+    progress of each product is also saved to a CrawlManifest in its folder.
+
+    Pages are saved to the PageStore of each product, which keeps only the
+    compressed review list of every page, or as full html files if raw.
+
+    Returns a dictionary with product ID as key and a dictionary as value
+    with the keys:
+        codes: status code of the last request of each page
+        elapsed: seconds from the start of the crawl until the product was
+                 done
+        fetched: sorted list of downloaded pages
+        last_page: last page number found in the pager links
+        skipped: sorted list of pages that were already downloaded
+        status: 'complete', 'failed' if a page could not be downloaded,
+                'captcha' if a captcha page stopped the crawl, or 'stopped'
+                if the crawl was stopped by a captcha of another product
+        timings: seconds taken to download each page
+    '''
+    base_url = base_url or 'https://www.amazon.' + domain
+    host = urlparse(base_url).netloc
+    throttle = throttle or shared_throttle(host, pause)
+    if client is None:
+        client = shared_client()
+        if client.pool_size < workers:
+            client = HttpClient(pool_size=workers)
+    basepath = out + os.sep + domain
+    maxpage = int(math.ceil(maxreviews / 10.)) if maxreviews > 0 else None
+    start = time.time()
+
+    tasks = queue.Queue()
+    lock = threading.Lock()
+    stop = threading.Event()
+    results = dict()
+    queued = dict()
+    manifests = dict()
+    stores = dict()
+
+    def event(kind, id_, page, code=None, url=None, error=None):
+        # reports a page to progress and updates the product timing
+        state = results[id_]
+        state['elapsed'] = time.time() - start
+
+        if progress:
+            progress({'asin': id_, 'code': code, 'error': error,
+                      'event': kind, 'last_page': state['last_page'],
+                      'page': page, 'pause': throttle.pause(host),
+                      'url': url})
+
+    def update(id_):
+        # saves the progress of a product to its manifest
+        state, manifest = results[id_], manifests[id_]
+        manifest.completed_pages = sorted(state['fetched'] +
+                                          state['skipped'])
+        manifest.last_page = state['last_page']
+        manifest.expected_pages = min(state['last_page'],
+                                      maxpage or state['last_page'])
+        manifest.save()
+
+    def schedule(id_, last_page):
+        # queues the pages up to last_page that were not queued before
+        state = results[id_]
+        state['last_page'] = max(state['last_page'], last_page)
+        last_page = min(last_page, maxpage or last_page)
+        skipped = []
+
+        for page in range(queued[id_] + 1, last_page + 1):
+            queued[id_] = page
+
+            if not force and (page in stores[id_] or os.path.exists(
+                    page_path(basepath, id_, page))):
+                state['skipped'].append(page)
+                skipped.append(page)
+            else:
+                tasks.put((id_, page))
+
+        return skipped
+
+    def fetch(id_, page):
+        state = results[id_]
+        url = page_url(base_url, id_, page)
+        referer = page_url(base_url, id_, max(page - 1, 1))
+
+        throttle.wait(host)
+        page_start = time.time()
+        htmlpage, code = download_page(url, referer, maxretries, timeout, 0,
+                                       client)
+
+        with lock:
+            state['codes'][page] = code
+            state['timings'][page] = time.time() - page_start
+
+        if htmlpage is None or code != 200:
+            if code == 503:
+                throttle.backoff(host)
+                tasks.put((id_, page))
+                event('retry', id_, page, code, url)
+            else:
+                state['status'] = 'failed'
+                event('failed', id_, page, code, url)
+            return
+
+        if robotre.search(htmlpage):
+            if captcha or page == 1:
+                # stop crawling if robot detected
+                state['status'] = 'captcha'
+                stop.set()
+                event('captcha', id_, page, code, url)
+                return
+            else:
+                throttle.backoff(host)
+                event('captcha', id_, page, code, url)
+
+        if raw:
+            with codecs.open(page_path(basepath, id_, page), mode='w',
+                             encoding='utf8') as file:
+                file.write(htmlpage)
+        else:
+            stores[id_].put(page, htmlpage)
+
+        throttle.relax(host)
+        last_page = max([1] + [int(match)
+                               for match in counterre.findall(htmlpage)])
+
+        with lock:
+            state['fetched'].append(page)
+            skipped = schedule(id_, last_page)
+
+            if page == 1 and totalre.search(htmlpage):
+                manifests[id_].review_count = int(
+                    totalre.search(htmlpage).group(1).replace(',', ''))
+            update(id_)
+
+        event('fetched', id_, page, code, url)
+
+        for page in skipped:
+            event('skipped', id_, page)
+
+    def worker():
+        while True:
+            task = tasks.get()
+
+            try:
+                if task is None:
+                    return
+                if stop.is_set() or results[task[0]]['status']:
+                    continue
+                fetch(*task)
+            except Exception as e:
+                results[task[0]]['status'] = 'failed'
+                event('error', task[0], task[1], error=str(e))
+            finally:
+                tasks.task_done()
+
+    for id_ in ids:
+        if not os.path.exists(basepath + os.sep + id_):
+            os.makedirs(basepath + os.sep + id_)
+
+        previous = CrawlManifest.load(basepath + os.sep + id_)
+        manifests[id_] = CrawlManifest(basepath + os.sep + id_, id_,
+                                       maxreviews)
+        if previous:
+            # keep the newest review seen by delta crawls
+            manifests[id_].newest_review = previous.newest_review
+        stores[id_] = PageStore(basepath + os.sep + id_, id_)
+        manifests[id_].save()
+
+        results[id_] = {'codes': dict(), 'elapsed': 0., 'fetched': [],
+                        'last_page': 1, 'skipped': [], 'status': None,
+                        'timings': dict()}
+        queued[id_] = 1
+        tasks.put((id_, 1))
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    tasks.join()
+
+    for thread in threads:
+        tasks.put(None)
+    for thread in threads:
+        thread.join()
+
+    for id_, state in results.items():
+        state['fetched'].sort()
+        state['skipped'].sort()
+
+        if not state['status']:
+            done = len(state['fetched']) + len(state['skipped'])
+            complete = done >= min(state['last_page'],
+                                   maxpage or state['last_page'])
+            state['status'] = 'complete' if complete else 'stopped'
+
+        update(id_)
+        manifests[id_].finish(state['status'])
+
+    return results
+
+
+def crawl_delta(id_, known, domain='com', out='amazonreviews', maxretries=3,
+                timeout=180, pause=1, maxpages=10, base_url=None,
+                throttle=None, client=None, progress=None):
+    '''
+    Downloads the review pages of product id_ sorted by most recent review,
+    one page at a time, until known(htmlpage) is true for a page, meaning
+    that the page reaches reviews that are already stored, or until the last
+    page or maxpages pages, None for all. Once the delta crawl completes, its
+    pages are appended to the PageStore in the delta folder of the product,
+    numbered after the pages of earlier delta crawls. Pages of a delta crawl
+    that fails are not stored, so that the next one fetches them again.
+
+    progress is called with the same events as in crawl. Like crawl, it
+    defaults to the shared_throttle of the host.
+
+    Returns a dictionary with the keys:
+        codes: status code of the last request of each page
+        elapsed: seconds the delta crawl took
+        fetched: list of downloaded pages, in order
+        last_page: last page number found in the pager links
+        reached: whether a page with known reviews was reached
+        status: 'complete', 'failed' if a page could not be downloaded or
+                'captcha' if a captcha page stopped the crawl
+        stored: delta store page number of each downloaded page, empty if
+                the delta crawl did not complete
+        timings: seconds taken to download each page
+    '''
+    base_url = base_url or 'https://www.amazon.' + domain
+    host = urlparse(base_url).netloc
+    throttle = throttle or shared_throttle(host, pause)
+    client = client or shared_client()
+    folder = delta_path(out + os.sep + domain, id_)
+    start = time.time()
+
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+
+    store = PageStore(folder, id_)
+    pages = []
+    result = {'codes': dict(), 'elapsed': 0., 'fetched': [], 'last_page': 1,
+              'reached': False, 'status': None, 'stored': [],
+              'timings': dict()}
+
+    def event(kind, page, code=None, url=None):
+        result['elapsed'] = time.time() - start
+
+        if progress:
+            progress({'asin': id_, 'code': code, 'error': None,
+                      'event': kind, 'last_page': result['last_page'],
+                      'page': page, 'pause': throttle.pause(host),
+                      'url': url})
+
+    page = 1
+
+    while not result['status']:
+        url = page_url(base_url, id_, page, 'recent')
+        referer = page_url(base_url, id_, max(page - 1, 1), 'recent')
+
+        throttle.wait(host)
+        page_start = time.time()
+        htmlpage, code = download_page(url, referer, maxretries, timeout, 0,
+                                       client)
+        result['codes'][page] = code
+        result['timings'][page] = time.time() - page_start
+
+        if htmlpage is None or code != 200:
+            if code == 503:
+                throttle.backoff(host)
+                event('retry', page, code, url)
+                continue
+            result['status'] = 'failed'
+            event('failed', page, code, url)
+            break
+
+        if robotre.search(htmlpage):
+            result['status'] = 'captcha'
+            event('captcha', page, code, url)
+            break
+
+        throttle.relax(host)
+        pages.append(htmlpage)
+        result['fetched'].append(page)
+        result['last_page'] = max([result['last_page']] +
+                                  [int(match) for match in
+                                   counterre.findall(htmlpage)])
+        event('fetched', page, code, url)
+
+        if known(htmlpage):
+            result['reached'] = True
+            result['status'] = 'complete'
+        elif page >= min(result['last_page'],
+                         maxpages or result['last_page']):
+            result['status'] = 'complete'
+
+        page += 1
+
+    if result['status'] == 'complete':
+        for htmlpage in pages:
+            result['stored'].append(store.append(htmlpage))
+
+    result['elapsed'] = time.time() - start
+
+    return result
+
+
+def print_progress(event):
+    '''
+    Prints the progress events of crawl
+    '''
+    kind, id_, page = event['event'], event['asin'], event['page']
+
+    if kind == 'skipped':
+        print('Already got page ' + str(page) + ' for product ' + id_)
+    elif kind == 'fetched':
+        print('Got page ' + str(page) + ' out of ' +
+              str(event['last_page']) + ' for product ' + id_ +
+              ' timeout=' + str(event['pause']))
+    elif kind == 'retry':
+        print('(' + str(event['code']) + ') Retrying downloading the URL: ' +
+              event['url'])
+    elif kind == 'failed':
+        print('(' + str(event['code']) + ') Done downloading the URL: ' +
+              event['url'])
+    elif kind == 'captcha':
+        print('ROBOT! timeout=' + str(event['pause']))
+    else:
+        print('Error downloading page ' + str(page) + ' for product ' + id_ +
+              ': ' + event['error'])
+
+
 def main():
     # sys.stdout = codecs.getwriter('utf8')(sys.stdout.buffer)
     parser = argparse.ArgumentParser()
@@ -121,83 +549,31 @@ def main():
                         help='Retry on captcha pages until captcha is not '
                         'asked. Default: skip', required=False,
                         action='store_true')
+    parser.add_argument('--raw',
+                        help='Save full html pages instead of the compressed '
+                        'review lists', required=False, action='store_true')
+    parser.add_argument(
+        '-w', '--workers', help='Number of pages downloaded concurrently. '
+        'Default: 1', required=False, type=int, default=1)
     parser.add_argument('ids', metavar='ID', nargs='+',
                         help='Product IDs for which to download reviews')
     args = parser.parse_args()
 
-    basepath = args.out + os.sep + args.domain
-
-    counterre = re.compile('cm_cr_arp_d_paging_btm_([0-9]+)')
-    robotre = re.compile('images-amazon\.com/captcha/')
+    results = crawl(args.ids, domain=args.domain, out=args.out,
+                    force=args.force, maxretries=args.maxretries,
+                    timeout=args.timeout, pause=args.pause,
+                    maxreviews=args.maxreviews, captcha=args.captcha,
+                    workers=args.workers, progress=print_progress,
+                    raw=args.raw)
 
     for id_ in args.ids:
+        result = results[id_]
+        print('Product ' + id_ + ': ' + result['status'] + ', ' +
+              str(len(result['fetched'])) + ' pages downloaded, ' +
+              str(len(result['skipped'])) + ' already downloaded in ' +
+              '{:.1f}s'.format(result['elapsed']))
 
-        if not os.path.exists(basepath + os.sep + id_):
-            os.makedirs(basepath + os.sep + id_)
-
-        pause = args.pause + np.random.random() * 2.75
-
-        urlPart1 = "http://www.amazon." + args.domain + "/product-reviews/"
-        urlPart2 = "/?ie=UTF8&showViewpoints=0&pageNumber="
-        urlPart3 = "&sortBy=helpful"
-
-        referer = urlPart1 + str(id_) + urlPart2 + "1" + urlPart3
-
-        page = 1
-        lastPage = 1
-        while page <= lastPage:
-            if not page == 1 and not args.force and os.path.exists(
-                basepath + os.sep + id_ + os.sep + id_ + '_' + str(
-                    page) + '.html'):
-                print('Already got page ' + str(page) + ' for product ' + id_)
-                page += 1
-                continue
-
-            url = urlPart1 + str(id_) + urlPart2 + str(page) + urlPart3
-            print(url)
-            htmlpage, code = download_page(url, referer, args.maxretries,
-                                           args.timeout, pause)
-
-            if htmlpage is None or code != 200:
-                if code == 503:
-                    page -= 1
-                    args.pause += 2
-                    print('(' + str(code) +
-                          ') Retrying downloading the URL: ' +
-                          url)
-                else:
-                    print user_ag
-                    print('(' + str(code) + ') Done downloading the URL: ' +
-                          url)
-                    break
-            else:
-                print('Got page ' + str(page) + ' out of ' + str(lastPage) +
-                      ' for product ' + id_ + ' timeout=' + str(
-                    args.pause))
-                if robotre.search(htmlpage):
-                    print('ROBOT! timeout=' + str(args.pause))
-                    if args.captcha or page == 1:
-                        # break if robot detected
-                        return None
-                    else:
-                        args.pause += 2
-                for match in counterre.findall(htmlpage):
-                    try:
-                        value = int(match)
-                        if value > lastPage:
-                            lastPage = value
-                    except:
-                        pass
-                with codecs.open(basepath + os.sep + id_ + os.sep + id_ + '_' +
-                                 str(page) + '.html', mode='w',
-                                 encoding='utf8') as file:
-                    file.write(htmlpage)
-                if args.pause >= 2:
-                    args.pause -= 1
-            referer = urlPart1 + str(id_) + urlPart2 + str(page) + urlPart3
-            if args.maxreviews > 0 and page * 10 >= args.maxreviews:
-                return page
-            page += 1
+    return results
 
 if __name__ == '__main__':
     main()
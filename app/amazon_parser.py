@@ -23,6 +23,8 @@ import os
 import fnmatch
 import re
 
+from page_store import PageStore, contentre
+
 if sys.version_info[0] >= 3:
     import html
 
@@ -33,10 +35,32 @@ def get_review_filesnames(input_dir):
             yield os.path.join(root, filename)
 
 
+def get_review_pages(input_dir):
+    # yields product ID, source and review list region of every page, from
+    # the page stores of amazon_crawler.py and from full html files
+    stored = set()
+
+    for root, dirnames, filenames in os.walk(input_dir):
+        if PageStore.index_name in filenames:
+            store = PageStore(root)
+            for page, htmlpage in store.items():
+                stored.add((root, page))
+                yield store.asin, root + '#' + str(page), htmlpage
+
+    for filepath in get_review_filesnames(input_dir):
+        root, filename = os.path.split(filepath)
+        page = filename[:-5].split('_')[-1]
+        if page.isdigit() and (root, int(page)) in stored:
+            continue
+        with codecs.open(filepath, mode='r', encoding='utf8') as file:
+            htmlpage = file.read()
+        if not idre.search(htmlpage):
+            continue
+        yield idre.findall(htmlpage)[0], filepath, \
+            contentre.findall(htmlpage)[0]
+
+
 idre = re.compile('product\-reviews/([A-Z0-9]+)/ref\=cm_cr_arp_d_hist', re.MULTILINE | re.S)
-contentre = re.compile(
-    'cm_cr-review_list.*?>(.*?)(?:askReviewsPageAskWidget|a-form-actions a-spacing-top-extra-large|/html)',
-    re.MULTILINE | re.S)
 blockre = re.compile('a-section review\">(.*?)report-abuse-link', re.MULTILINE | re.S)
 ratingre = re.compile('star-(.) review-rating', re.MULTILINE | re.S)
 titlere = re.compile('review-title.*?>(.*?)</a>', re.MULTILINE | re.S)
@@ -59,14 +83,8 @@ def main():
 
     with codecs.open(args.outfile, 'w', encoding='utf8') as out:
         writer = csv.writer(out, lineterminator='\n')
-        for filepath in get_review_filesnames(args.dir):
-            with codecs.open(filepath, mode='r', encoding='utf8') as file:
-                htmlpage = file.read()
-            if not idre.search(htmlpage):
-                continue
-            id_ = idre.findall(htmlpage)[0]
+        for id_, filepath, htmlpage in get_review_pages(args.dir):
             print(id_, filepath)
-            htmlpage = contentre.findall(htmlpage)[0]
             for block in blockre.findall(htmlpage):
                 title = titlere.findall(block)[0]
                 reviewtext = reviewre.findall(block)[0]
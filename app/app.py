@@ -5,9 +5,9 @@ See the readme.md for more info on how to install/run Mongo, Celery and
 Redis-Server.
 '''
 
-from celery import Celery
-from flask import Flask, redirect, render_template, request, session, url_for
-from pymongo import MongoClient
+from celery import Celery, chain, chord
+from flask import Flask, abort, jsonify, redirect, render_template, request, \
+    session, url_for
 import datetime
 import json
 import numpy as np
@@ -15,9 +15,13 @@ import os
 import requests
 
 from app_preparer import collect
+from doc_cache import DocCache
 from parsers import ReviewSents
 from pipeline import load, summarize
+from review_store import ReviewStore, shared_mongo
 from scraper import Loader
+from summary_cache import SummaryCache
+from task_payload import PayloadCodec
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.urandom(24)   # random cookie
@@ -27,10 +31,19 @@ app.config.update(CELERY_BROKER_URL='redis://localhost:6379',
 celery = Celery(app.name, backend=app.config['CELERY_RESULT_BACKEND'],
                 broker=app.config['CELERY_BROKER_URL'])
 
-client = MongoClient()
+# tasks pass compact msgpack payloads from task_payload.py, not pickles
+celery.conf.update(CELERY_ACCEPT_CONTENT=['msgpack'],
+                   CELERY_RESULT_SERIALIZER='msgpack',
+                   CELERY_TASK_SERIALIZER='msgpack')
+
+client = shared_mongo()
 db = client['ars']
 tab = db['review_data']
 
+# snippet clicks look up single reviews through the (asin, review_idx) index
+review_store = ReviewStore(tab)
+review_store.ensure_index()
+
 check1 = list(tab.find({'_id': 'B004NBXVFS_0'}))
 check2 = list(tab.find({'_id': 'B00J7B8T5Q_0'}))
 
@@ -39,25 +52,136 @@ if not check1 or not check2:
     from sample_data import store_sample_data
     store_sample_data()
 
+# parsed reviews are reused across requests for the same product
+doc_cache = DocCache()
+
+# finished summaries are reused until the scraped reviews change
+summary_cache = SummaryCache(db['summaries'])
+
+# results of celery tasks are passed as versioned payloads
+payload_codec = PayloadCodec()
+
+
+def summarize_asin(asin, progress=None):
+    '''returns the stored summary of a product, or runs the sentiment analysis
+    pipeline and stores its summary if the scraped reviews have changed.
+    progress is called with the name of each stage of the pipeline as it
+    starts, and with the number of reviews parsed so far'''
+
+    if not progress:
+        progress = lambda stage, n_parsed=None: None
+
+    fingerprint = Loader().fingerprint(asin)
+    summary = summary_cache.get(asin, fingerprint)
+
+    if not summary:
+        progress('extract')
+        product = Loader().extract(asin)
+        review_store.invalidate([asin])
+        progress('parse', 0)
+        corpus = ReviewSents(product, cache=doc_cache,
+                             progress=lambda n: progress('parse', n))
+        polarizer = summarize(corpus, lazy=True, progress=progress)
+        summary = summary_cache.put(polarizer, fingerprint)
+
+    return summary
+
 
 @celery.task
 def scraper(url):
     '''parallelizes the load function'''
 
     try:
-        return load(url)
+        product = load(url)
     except:
         raise RuntimeError("Scraping failed")
 
+    return payload_codec.encode_product(product)
+
+
+@celery.task(bind=True)
+def aspectize(self, product):
+    '''extracts, parses, mines aspects and polarizes a scraped product.
+    these steps share the parsed reviews in memory, so they run in one task
+    that reports the stage it is in through its PROGRESS state'''
+
+    asin = payload_codec.decode_product(product)['asin']
+
+    def progress(stage, n_parsed=None):
+        self.update_state(state='PROGRESS',
+                          meta={'stage': stage, 'asin': asin,
+                                'parsed': n_parsed})
+
+    return payload_codec.encode_summary(summarize_asin(asin, progress))
+
 
 @celery.task
-def aspectize(asin):
-    '''paralellizes the sentiment analysis pipeline'''
+def collector(summaries):
+    '''prepares the results page of one or two summarized products'''
+
+    if not isinstance(summaries, list):
+        summaries = [summaries]
+
+    polarizers = [payload_codec.decode_summary(summary)
+                  for summary in summaries]
+    result = collect(*polarizers)
+
+    if result == "No matches":
+        result = None
+
+    return payload_codec.encode_results([polarizer.asin
+                                         for polarizer in polarizers], result)
+
+
+def start_job(workflow):
+    '''starts a celery workflow and keeps the ids of its tasks in the session,
+    final task first, so that the web process only polls for its results'''
+
+    result = workflow.apply_async()
+    pending, ids = [result], []
+
+    while pending:
+        result = pending.pop(0)
+
+        if hasattr(result, 'results'):
+            # group of the chains of the compared products
+            pending.extend(result.results)
+        else:
+            ids.append(result.id)
+
+        if getattr(result, 'parent', None) is not None:
+            pending.append(result.parent)
+
+    session['job'] = ids
 
-    product = Loader().extract(asin)
-    corpus = ReviewSents(product)
-    polarizer = summarize(corpus)
-    return product, polarizer
+
+def job_status():
+    '''returns the progress of the workflow started by start_job, with the
+    stage of every aspectize task that is running'''
+
+    results = [celery.AsyncResult(id_) for id_ in session['job']]
+    states = [result.state for result in results]
+    stages = [result.info for result in results if result.state == 'PROGRESS']
+
+    return {'done': states.count('SUCCESS'), 'tasks': len(states),
+            'failed': 'FAILURE' in states, 'ready': states[0] == 'SUCCESS',
+            'stages': stages}
+
+
+def job_results():
+    '''returns the results of the finished workflow started by start_job, or
+    the name of the template to show while it is running or if it failed'''
+
+    status = job_status()
+
+    if status['failed']:
+        return 'failed.html'
+    if not status['ready']:
+        return 'waiting.html'
+
+    result = celery.AsyncResult(session['job'][0]).get()
+
+    return payload_codec.decode_results(result)
 
 
 @app.route('/')
@@ -95,15 +219,9 @@ def compare_scraped():
     if not url1 or not url2:
         raise RuntimeError("No url entered")
 
-    try:
-        items = [scraper.delay(url) for url in [url1, url2]]
-    except RuntimeError:
-        return render_template('failed.html')
-
-    asin1 = next(items[0].collect())[1].asin
-    asin2 = next(items[1].collect())[1].asin
-
-    session['products'] = [asin1, asin2]
+    # both products are scraped and summarized in parallel, then collected
+    start_job(chord([chain(scraper.s(url), aspectize.s())
+                     for url in [url1, url2]], collector.s()))
 
     print "post request completed at " + \
         datetime.datetime.now().time().isoformat()
@@ -119,24 +237,22 @@ def compare_results():
     print "post request started at " + \
         datetime.datetime.now().time().isoformat()
 
-    try:
-        print session['products']
-    except RuntimeError:
+    if 'job' not in session:
         return render_template('failed.html')
 
-    asin1, asin2 = session['products']
+    results = job_results()
 
-    polarizers = [aspectize.delay(asin) for asin in session['products']]
-    product1, polarizer1 = next(polarizers[0].collect())[1]
-    product2, polarizer2 = next(polarizers[1].collect())[1]
+    if not isinstance(results, dict):
+        return render_template(results, status_url=url_for('status'))
 
-    result = collect(polarizer1, polarizer2)
+    # reviews may have been extracted again by the workers
+    review_store.invalidate(results['asins'])
 
-    if result == "No matches":
+    if results['result'] is None:
         return render_template('no_matches.html')
     else:
         [aspectsf, aspects_pct, en_aspects, ratings, html_str, js_arr,
-         img_urls, prices, titles, urls] = result
+         img_urls, prices, titles, urls] = results['result']
 
         print "post request completed at " + \
             datetime.datetime.now().time().isoformat()
@@ -157,8 +273,8 @@ def summarize_home():
 
 @app.route('/summarize_scraped', methods=['POST'])
 def summarize_scraped():
-    '''intermediate function for product summarization that scrapes product
-    asin and stores cookies. does not involve the use of celery'''
+    '''intermediate function for product summarization that starts scraping
+    and summarizing the product on celery and stores cookies'''
 
     print "post request started at " + \
         datetime.datetime.now().time().isoformat()
@@ -168,12 +284,7 @@ def summarize_scraped():
     if not url:
         raise RuntimeError("No url entered")
 
-    try:
-        item = load(url)
-    except RuntimeError:
-        return render_template('failed.html')
-
-    session['products'] = item.asin
+    start_job(chain(scraper.s(url), aspectize.s(), collector.s()))
 
     print "post request completed at " + \
         datetime.datetime.now().time().isoformat()
@@ -183,25 +294,26 @@ def summarize_scraped():
 
 @app.route('/summarize_results')
 def summarize_results():
-    '''runs aspect mining, sentiment analysis, and outputs final results for
-    product summarization. does not involve the use of celery'''
+    '''outputs final results for product summarization once aspect mining
+    and sentiment analysis have finished on celery'''
     print "post request started at " + \
         datetime.datetime.now().time().isoformat()
-    
-    try:
-        print session['products']
-    except RuntimeError:
+
+    if 'job' not in session:
         return render_template('failed.html')
 
-    asin = session['products']
-    product = Loader().extract(asin)
-    corpus = ReviewSents(product)
-    polarizer = summarize(corpus)
+    results = job_results()
+
+    if not isinstance(results, dict):
+        return render_template(results, status_url=url_for('status'))
 
-    result = collect(polarizer)
+    review_store.invalidate(results['asins'])
+
+    if results['result'] is None:
+        return render_template('no_matches.html')
 
     [aspectsf, aspects_pct, en_aspects, ratings, html_str, js_arr,
-     img_urls, prices, titles, urls] = result
+     img_urls, prices, titles, urls] = results['result']
 
     print "post request completed at " + \
         datetime.datetime.now().time().isoformat()
@@ -213,13 +325,28 @@ def summarize_results():
                            titles=titles, prices=prices, urls=urls)
 
 
+@app.route('/status')
+def status():
+    '''progress of the celery workflow of the current product results, polled
+    by the waiting page, and counters of the caches of the web process'''
+
+    status = job_status() if 'job' in session else dict()
+    status['payloads'] = payload_codec.stats()
+    status['review_cache'] = review_store.cache_stats()
+
+    return jsonify(status)
+
+
 @app.route('/full_review')
 def full_review():
     '''directs user to page of full review details'''
 
     asin_id = request.args.get('asin')
     review_idx = int(request.args.get('review_idx'))
-    data = tab.find({'asin': asin_id, 'review_idx': review_idx})[0]
+    data = review_store.get(asin_id, review_idx)
+
+    if data is None:
+        abort(404)
 
     auth = data['author']
     head = data['headline']
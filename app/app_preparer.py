@@ -6,10 +6,10 @@ needed for passing information to create dynamic HTML pages.
 
 from __future__ import division
 from bs4 import BeautifulSoup
+from http_client import shared_client
 from summarizer import *
 import json
 import numpy as np
-import requests
 
 
 def displayed_aspects(polarizer1, polarizer2=None, n=10):
@@ -28,8 +28,7 @@ def displayed_aspects(polarizer1, polarizer2=None, n=10):
                                             printing=False)
         aspectsf, aspects = aspectsf[0:10, 1:].tolist(), aspects[0:10]
     else:
-        aspects = polarizer1.top_asps[0][0:10]
-        aspectsf = polarizer1.top_asps[1][0:10]
+        aspects, aspectsf = polarizer1.top_aspects(n)
 
     if not aspectsf:
         return None, None, None
@@ -52,7 +51,7 @@ def model_data(polarizer, aspects=None):
     data for aspect
     '''
     if not aspects:
-        aspects = polarizer.top_asps[0]
+        aspects = polarizer.top_aspects()[0]
 
     aspects_pct = np.array([polarizer.aspect_pct[x] for x in aspects])
     aspects_pct_vis = np.apply_along_axis(lambda x: 5 + x / sum(x) * 85, 1,
@@ -82,7 +81,8 @@ def product_info(polarizer, head=0):
                'Mozilla/5.0 (compatible; MSIE 10.0; Windows NT 6.1; ' +
                'Trident/6.0)']
 
-    html = requests.get(url, headers={'User-Agent': headers[head]}).content
+    html = shared_client().get(url, headers={'User-Agent': headers[head]}) \
+        .content
     soup = BeautifulSoup(html, 'html.parser')
 
     try:
@@ -0,0 +1,195 @@
+'''
+This script contains the manifest that amazon_crawler.py keeps in the review
+folder of every crawled product. The manifest records the progress of the
+crawl, so that the Loader class in scraper.py can tell whether the reviews of
+a product are ready, or wait for a crawl running in the background, without
+parsing any html.
+'''
+
+import json
+import math
+import os
+import threading
+import time
+
+# notified whenever a manifest is saved in this process
+_changed = threading.Condition()
+
+
+class CrawlManifest(object):
+    '''
+    Progress of the crawl of one product, stored as manifest.json in the
+    folder of its review pages
+    '''
+
+    filename = 'manifest.json'
+
+    def __init__(self, folder, asin=None, max_reviews=-1):
+        '''
+        INPUT: str, str, int
+        OUTPUT: None
+
+        Args:
+            folder: folder of the review pages of the product
+            asin: asin identifier for Amazon product
+            max_reviews: maximum number of reviews to crawl, -1 for all
+
+        Attributes:
+            asin (str):             asin identifier for Amazon product
+            completed_pages (list): sorted page numbers stored in folder
+            expected_pages (int):   number of pages the crawl will store
+            finished (float):       time the crawl ended, None while running
+            folder (str):           folder of the review pages
+            last_page (int):        last page number found in the pager
+            max_reviews (int):      maximum number of reviews to crawl
+            newest_review (str):    id of the newest review seen by the last
+                                    delta crawl, None before the first one
+            review_count (int):     total number of reviews of the product
+            started (float):        time the crawl started
+            status (str):           'running' or the status of the finished
+                                    crawl from amazon_crawler.crawl
+            updated (float):        time the manifest was last saved
+        '''
+        self.asin = asin
+        self.completed_pages = []
+        self.expected_pages = 1
+        self.finished = None
+        self.folder = folder
+        self.last_page = 1
+        self.max_reviews = max_reviews
+        self.newest_review = None
+        self.review_count = None
+        self.started = time.time()
+        self.status = 'running'
+        self.updated = self.started
+
+    @classmethod
+    def load(cls, folder):
+        '''
+        INPUT: str
+        OUTPUT: CrawlManifest
+
+        Args:
+            folder: folder of the review pages of the product
+
+        Returns the manifest stored in folder, or None if there is none
+        '''
+        try:
+            with open(os.path.join(folder, cls.filename)) as f:
+                doc = json.load(f)
+        except (IOError, ValueError):
+            return None
+
+        manifest = cls(folder)
+        manifest.__dict__.update(doc)
+        manifest.folder = folder
+
+        return manifest
+
+    def save(self):
+        '''
+        INPUT: None
+        OUTPUT: None
+
+        Writes the manifest and wakes up the threads waiting on a manifest
+        '''
+        self.updated = time.time()
+        doc = dict((key, value) for key, value in self.__dict__.items()
+                   if key != 'folder')
+        path = os.path.join(self.folder, self.filename)
+
+        # write to a temporary file first so readers never see a partial file
+        with open(path + '.tmp', 'w') as f:
+            json.dump(doc, f, sort_keys=True)
+        os.rename(path + '.tmp', path)
+
+        with _changed:
+            _changed.notify_all()
+
+    def finish(self, status):
+        '''
+        INPUT: str
+        OUTPUT: None
+
+        Args:
+            status: status of the finished crawl
+
+        Marks the crawl as finished and saves the manifest
+        '''
+        self.status = status
+        self.finished = time.time()
+        self.save()
+
+    def running(self, stale=300):
+        '''
+        INPUT: float
+        OUTPUT: bool
+
+        Args:
+            stale: seconds without an update after which a running crawl is
+                   assumed to have died
+
+        Returns whether a crawl of the product is still running
+        '''
+        return self.status == 'running' and \
+            time.time() - self.updated < stale
+
+    def missing_pages(self, n_reviews=-1):
+        '''
+        INPUT: int
+        OUTPUT: list(int)
+
+        Args:
+            n_reviews: number of reviews needed, -1 for all
+
+        Returns the sorted page numbers needed for n_reviews reviews that are
+        not stored in folder, whether or not the crawl finished
+        '''
+        needed = self.last_page
+        if n_reviews > 0:
+            needed = min(needed, int(math.ceil(n_reviews / 10.)))
+
+        return sorted(set(range(1, needed + 1)) - set(self.completed_pages))
+
+    def ready(self, n_reviews=-1):
+        '''
+        INPUT: int
+        OUTPUT: bool
+
+        Args:
+            n_reviews: number of reviews needed, -1 for all
+
+        Returns whether a finished crawl stored every page needed for
+        n_reviews reviews
+        '''
+        return self.status == 'complete' and not self.missing_pages(n_reviews)
+
+    @classmethod
+    def wait(cls, folder, timeout=600, poll=0.5, stale=300):
+        '''
+        INPUT: str, float, float, float
+        OUTPUT: CrawlManifest
+
+        Args:
+            folder: folder of the review pages of the product
+            timeout: maximum seconds to wait
+            poll: seconds between checks for crawls in other processes
+            stale: seconds without an update after which a running crawl is
+                   assumed to have died
+
+        Waits until the crawl of the product is no longer running and returns
+        its manifest. Crawls in the same process wake the waiter as soon as
+        they save the manifest.
+        '''
+        deadline = time.time() + timeout
+
+        with _changed:
+            while True:
+                manifest = cls.load(folder)
+                remaining = deadline - time.time()
+
+                if not manifest or not manifest.running(stale) or \
+                        remaining <= 0:
+                    return manifest
+
+                _changed.wait(min(poll, remaining))
@@ -0,0 +1,224 @@
+'''
+This script contains an on-disk cache of serialized spacy documents for use
+with the ReviewSents class in parsers.py. Parsed reviews are stored under a
+hash of the review text so that a review is only parsed by spacy once, no
+matter how many times its product is summarized. The folder can be shared by
+the processes of several workers, which evict documents under a file lock
+after reading the size of the whole folder from disk.
+'''
+
+from collections import OrderedDict
+from spacy import about
+import fcntl
+import hashlib
+import os
+
+
+class DocCache(object):
+    '''
+    Least recently used cache of serialized spacy Doc objects stored as files
+    in a folder. Keys are hashes of the review text and the spacy version.
+    '''
+
+    def __init__(self, folder=None, max_bytes=500 * 1024 ** 2,
+                 scan_every=100):
+        '''
+        INPUT: str, int, int
+        OUTPUT: None
+
+        Args:
+            folder: folder to store cached documents in
+            max_bytes: maximum size of cached documents on disk
+            scan_every: number of documents written between scans of the
+                        folder for documents written by other processes
+
+        Attributes:
+            evictions (int): number of documents removed from cache
+            folder (str): folder where cached documents are stored
+            hits (int): number of lookups found in cache
+            max_bytes (int): maximum size of cached documents on disk
+            misses (int): number of lookups not found in cache
+            scan_every (int): number of writes between scans of the folder
+            size (int): size of cached documents on disk at the last scan,
+                        plus the documents written since
+        '''
+        if not folder:
+            folder = os.getcwd() + '/cache/docs'
+
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        self.evictions = 0
+        self.folder = folder
+        self.hits = 0
+        self.max_bytes = max_bytes
+        self.misses = 0
+        self.scan_every = scan_every
+        self.size = 0
+        self._index = self._load_index()
+        self._writes = 0
+
+    def _load_index(self):
+        '''
+        INPUT: None
+        OUTPUT: OrderedDict
+
+        Builds an index of key to file size for the documents in the cache
+        folder, ordered from least to most recently used, and sets size to
+        their total size
+        '''
+        files = []
+        self.size = 0
+
+        for file_ in os.listdir(self.folder):
+            if file_[-4:] != '.doc':
+                continue
+
+            try:
+                stat = os.stat(os.path.join(self.folder, file_))
+            except OSError:
+                # file was removed by another process
+                continue
+
+            files.append((stat.st_mtime, file_[:-4], stat.st_size))
+
+        index = OrderedDict()
+
+        for _, key, size in sorted(files):
+            index[key] = size
+            self.size += size
+
+        return index
+
+    def _path(self, key):
+        '''
+        INPUT: str
+        OUTPUT: str
+
+        Returns file path of the cached document for key
+        '''
+        return os.path.join(self.folder, key + '.doc')
+
+    def key(self, text):
+        '''
+        INPUT: unicode
+        OUTPUT: str
+
+        Args:
+            text: review text to be parsed
+
+        Returns the cache key for a review text
+        '''
+        sha = hashlib.sha1(about.__version__)
+        sha.update(text.encode('utf-8'))
+
+        return sha.hexdigest()
+
+    def get(self, key):
+        '''
+        INPUT: str
+        OUTPUT: str
+
+        Args:
+            key: key returned by the key function
+
+        Returns serialized document for key, or None if key is not cached
+        '''
+        if key not in self._index:
+            if not os.path.isfile(self._path(key)):
+                self.misses += 1
+                return None
+
+            # document was cached by another process
+            self._index[key] = os.path.getsize(self._path(key))
+            self.size += self._index[key]
+
+        try:
+            with open(self._path(key), 'rb') as f:
+                doc_bytes = f.read()
+        except IOError:
+            # file was removed by another process
+            self.size -= self._index.pop(key)
+            self.misses += 1
+            return None
+
+        os.utime(self._path(key), None)
+        self._index[key] = self._index.pop(key)
+        self.hits += 1
+
+        return doc_bytes
+
+    def put(self, key, doc_bytes):
+        '''
+        INPUT: str, str
+        OUTPUT: None
+
+        Args:
+            key: key returned by the key function
+            doc_bytes: serialized spacy document
+
+        Writes serialized document to the cache, then removes least recently
+        used documents if the cache may no longer fit within max_bytes
+        '''
+        if key in self._index:
+            self.size -= self._index.pop(key)
+
+        # write to a temporary file first so readers never see partial files
+        tmp_path = '{}.{}.tmp'.format(self._path(key), os.getpid())
+
+        with open(tmp_path, 'wb') as f:
+            f.write(doc_bytes)
+
+        os.rename(tmp_path, self._path(key))
+
+        self._index[key] = len(doc_bytes)
+        self.size += len(doc_bytes)
+        self._writes += 1
+
+        # other processes write to the folder too, so the size is only
+        # known after a scan
+        if self.size > self.max_bytes or self._writes >= self.scan_every:
+            self._evict()
+
+    def _evict(self):
+        '''
+        INPUT: None
+        OUTPUT: None
+
+        Rebuilds the index from the cache folder and removes least recently
+        used documents until the folder fits within max_bytes. Documents are
+        removed under a lock on the folder, so that processes sharing it
+        never evict against a stale view of its size.
+        '''
+        with open(os.path.join(self.folder, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            try:
+                self._index = self._load_index()
+                self._writes = 0
+
+                while self.size > self.max_bytes and len(self._index) > 1:
+                    old_key, old_size = self._index.popitem(last=False)
+                    self.size -= old_size
+                    self.evictions += 1
+
+                    try:
+                        os.remove(self._path(old_key))
+                    except OSError:
+                        pass
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def stats(self):
+        '''
+        INPUT: None
+        OUTPUT: dict
+
+        Returns dictionary of cache counters
+        '''
+        lookups = self.hits + self.misses
+
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / float(lookups) if lookups else 0.,
+                'evictions': self.evictions, 'docs': len(self._index),
+                'bytes': self.size}
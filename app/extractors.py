@@ -0,0 +1,166 @@
+'''
+This script contains the review extraction engines used by the extract method
+of the Loader class in scraper.py. Every engine takes the html of a review
+page, either a full page or the review list kept by page_store.py, and returns
+the rating, review text, author, headline and Amazon review id of each review
+on the page.
+'''
+
+from bs4 import BeautifulSoup
+from HTMLParser import HTMLParser
+import re
+
+blockre = re.compile(r'<div\s[^>]*?class=["\']a-section review["\'][^>]*>',
+                     re.S)
+idre = re.compile(r'\sid=["\']([^"\']*)["\']')
+ratingre = re.compile(r'<i\b[^>]*>(.*?)</i>', re.S)
+reviewre = re.compile(r'<span\s[^>]*?class=["\']a-size-base review-text["\']'
+                      r'[^>]*>', re.S)
+spanre = re.compile(r'<(/?)span\b[^>]*?(/?)>', re.S | re.I)
+authorre = re.compile(r'<a\s[^>]*?class=["\']a-size-base a-link-normal '
+                      r'author["\'][^>]*>(.*?)</a>', re.S)
+headlinere = re.compile(r'<a\s[^>]*?class=["\']a-size-base a-link-normal '
+                        r'review-title a-color-base a-text-bold["\']'
+                        r'[^>]*>(.*?)</a>', re.S)
+tagre = re.compile(r'<[^>]*>')
+_unescape = HTMLParser().unescape
+
+
+def _text(fragment):
+    '''
+    INPUT: unicode
+    OUTPUT: unicode
+
+    Returns the text of an html fragment without tags and entities
+    '''
+    return _unescape(tagre.sub(u'', fragment))
+
+
+def _inner(html, start, tagre_):
+    '''
+    INPUT: unicode, int, re.RegexObject
+    OUTPUT: unicode
+
+    Args:
+        html: html containing the element
+        start: position right after the opening tag of the element
+        tagre_: pattern of the opening and closing tags of the element's
+                type, with the slash of closing tags and of self-closing tags
+                as groups
+
+    Returns the content of an element up to its own closing tag, counting the
+    nested elements of the same type, or the rest of html if the element is
+    never closed
+    '''
+    depth = 1
+
+    for tag in tagre_.finditer(html, start):
+        if tag.group(1):
+            depth -= 1
+        elif not tag.group(2):
+            depth += 1
+
+        if not depth:
+            return html[start:tag.start()]
+
+    return html[start:]
+
+
+def soup_reviews(html):
+    '''
+    INPUT: unicode
+    OUTPUT: list(dict)
+
+    Args:
+        html: html of a review page
+
+    Reference engine that finds reviews with BeautifulSoup. Returns a list of
+    dictionaries with the rating, review, author, headline and review_id of
+    each review. review_id is None if the review has no id.
+    '''
+    soup = BeautifulSoup(html, 'html.parser')
+    tags = soup.findAll("div", {"class": "a-section review"})
+    records = []
+
+    for tag in tags:
+        r_class = "a-size-base review-text"
+        a_class = "a-size-base a-link-normal author"
+        h_class = "a-size-base a-link-normal review-title " \
+            "a-color-base a-text-bold"
+
+        rating = int(tag.find('i').text[0])
+        review = tag.findAll("span", {"class": r_class})[0].text
+
+        try:
+            author = tag.findAll("a", {"class": a_class})[0].text
+        except:
+            author = "Anonymous"
+        try:
+            headline = tag.findAll("a", {"class": h_class})[0].text
+        except:
+            headline = "No headline"
+
+        records.append({'rating': rating, 'review': review,
+                        'author': author, 'headline': headline,
+                        'review_id': tag.get('id')})
+
+    return records
+
+
+def regex_reviews(html):
+    '''
+    INPUT: unicode
+    OUTPUT: list(dict)
+
+    Args:
+        html: html of a review page
+
+    Fast engine that finds the same fields as soup_reviews with precompiled
+    regular expressions, without building a parse tree. Each review block
+    runs from its review div to the next one.
+    '''
+    if isinstance(html, str):
+        html = html.decode('utf-8')
+
+    matches = list(blockre.finditer(html))
+    ends = [match.start() for match in matches[1:]] + [len(html)]
+    records = []
+
+    for match, end in zip(matches, ends):
+        block = html[match.start():end]
+        review_id = idre.search(match.group(0))
+
+        rating = int(_text(ratingre.search(block).group(1))[0])
+        review = _text(_inner(block, reviewre.search(block).end(), spanre))
+
+        author = authorre.search(block)
+        author = _text(author.group(1)) if author else "Anonymous"
+        headline = headlinere.search(block)
+        headline = _text(headline.group(1)) if headline else "No headline"
+
+        records.append({'rating': rating, 'review': review,
+                        'author': author, 'headline': headline,
+                        'review_id': _unescape(review_id.group(1))
+                        if review_id else None})
+
+    return records
+
+
+EXTRACTORS = {'regex': regex_reviews, 'soup': soup_reviews}
+
+
+def get_extractor(engine):
+    '''
+    INPUT: str
+    OUTPUT: function
+
+    Args:
+        engine: name of an extraction engine in EXTRACTORS
+
+    Returns the extraction function of an engine
+    '''
+    if engine not in EXTRACTORS:
+        raise ValueError("engine must be one of {}"
+                         .format(", ".join(sorted(EXTRACTORS))))
+
+    return EXTRACTORS[engine]
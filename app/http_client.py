@@ -0,0 +1,156 @@
+'''
+This script contains the pooled HTTP client shared by amazon_crawler.py and
+the product_info function in app_preparer.py. Connections are kept alive and
+reused between requests to the same host, so that only the first request to
+a host pays for the TCP and TLS handshakes.
+'''
+
+from requests.adapters import HTTPAdapter
+import requests
+import threading
+import time
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class _CountingAdapter(HTTPAdapter):
+    '''
+    HTTPAdapter whose connection pools report every socket they open to the
+    HttpClient, including sockets reopened after the server closed them
+    '''
+
+    def __init__(self, client, **kwargs):
+        self.client = client
+        HTTPAdapter.__init__(self, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        HTTPAdapter.init_poolmanager(self, *args, **kwargs)
+        pool_classes = self.poolmanager.pool_classes_by_scheme
+        self.poolmanager.pool_classes_by_scheme = dict(
+            (scheme, self._counting_pool(pool_cls))
+            for scheme, pool_cls in pool_classes.items())
+
+    def _counting_pool(self, pool_cls):
+        client, conn_cls = self.client, pool_cls.ConnectionCls
+
+        class CountingConnection(conn_cls):
+            def connect(self):
+                client._connected()
+                return conn_cls.connect(self)
+
+        return type(pool_cls.__name__, (pool_cls,),
+                    {'ConnectionCls': CountingConnection})
+
+
+class HttpClient(object):
+    '''
+    requests Session with a pool of keep-alive connections per host and a
+    default timeout for every request
+    '''
+
+    def __init__(self, pool_size=10, timeout=30, keep_alive=True):
+        '''
+        INPUT: int, float, bool
+        OUTPUT: None
+
+        Args:
+            pool_size: number of connections kept open per host, should be at
+                       least the number of threads sharing the client
+            timeout: default seconds to wait for a server response
+            keep_alive: option to reuse connections between requests
+
+        Attributes:
+            connections (int):  number of connections opened
+            elapsed (float):    total seconds spent in requests
+            keep_alive (bool):  whether connections are reused
+            pool_size (int):    number of connections kept open per host
+            requests (int):     number of requests sent
+            session (Session):  requests Session sending the requests
+            timeout (float):    default seconds to wait for a response
+        '''
+        self.connections = 0
+        self.elapsed = 0.
+        self.keep_alive = keep_alive
+        self.pool_size = pool_size
+        self.requests = 0
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._lock = threading.Lock()
+
+        adapter = _CountingAdapter(self, pool_connections=pool_size,
+                                   pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        if not keep_alive:
+            self.session.headers['Connection'] = 'close'
+
+    def get(self, url, headers=None, timeout=None):
+        '''
+        INPUT: str, dict, float
+        OUTPUT: requests.Response
+
+        Args:
+            url: url to request
+            headers: extra request headers
+            timeout: seconds to wait for a response, defaults to the timeout
+                     of the client
+
+        Sends a GET request over a pooled connection
+        '''
+        start = time.time()
+
+        try:
+            return self.session.get(url, headers=headers,
+                                    timeout=timeout or self.timeout)
+        finally:
+            with self._lock:
+                self.requests += 1
+                self.elapsed += time.time() - start
+
+    def _connected(self):
+        with self._lock:
+            self.connections += 1
+
+    def close(self):
+        '''
+        INPUT: None
+        OUTPUT: None
+
+        Closes all pooled connections
+        '''
+        self.session.close()
+
+    def stats(self):
+        '''
+        INPUT: None
+        OUTPUT: dict
+
+        Returns dictionary of request and connection counters. Requests that
+        did not open a new connection reused a pooled one.
+        '''
+        reused = max(0, self.requests - self.connections)
+
+        return {'requests': self.requests, 'connections': self.connections,
+                'reused': reused,
+                'reuse_rate': reused / float(self.requests)
+                if self.requests else 0.,
+                'mean_latency': self.elapsed / self.requests
+                if self.requests else 0.}
+
+
+def shared_client():
+    '''
+    INPUT: None
+    OUTPUT: HttpClient
+
+    Returns an HttpClient shared within the process
+    '''
+    global _client
+
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+
+    return _client
@@ -0,0 +1,329 @@
+'''
+This script contains the compressed store of crawled review pages used by
+amazon_crawler.py, the Loader class in scraper.py and amazon_parser.py. Only
+the review list region of each page is kept, and it is stored zlib
+compressed in one data file per product together with a json index. The
+region is found with contentre, which amazon_parser.py uses as well.
+'''
+
+from bs4 import BeautifulSoup
+from contextlib import contextmanager
+import fcntl
+import json
+import os
+import re
+import threading
+import zlib
+
+# review list region of a page, shared with amazon_parser.py
+contentre = re.compile(
+    'cm_cr-review_list.*?>(.*?)(?:askReviewsPageAskWidget|'
+    'a-form-actions a-spacing-top-extra-large|/html)', re.MULTILINE | re.S)
+totalre = re.compile('totalReviewCount">([0-9,]+)<')
+
+
+def trim(htmlpage):
+    '''
+    INPUT: unicode
+    OUTPUT: unicode, bool
+
+    Args:
+        htmlpage: html of a review page
+
+    Returns the review list region of a page and whether it was found. Pages
+    without a review list are returned whole.
+    '''
+    match = contentre.search(htmlpage)
+
+    if not match:
+        return htmlpage, False
+
+    return match.group(1), True
+
+
+def page_meta(htmlpage):
+    '''
+    INPUT: unicode
+    OUTPUT: dict
+
+    Args:
+        htmlpage: html of the first review page of a product
+
+    Returns the product name and total number of reviews from the parts of
+    the first page that are not kept in the store
+    '''
+    meta = {'name': None, 'review_count': None}
+    soup = BeautifulSoup(htmlpage, 'html.parser')
+    links = soup.select('.a-link-normal')
+    match = totalre.search(htmlpage)
+
+    if links:
+        meta['name'] = links[0].text
+    if match:
+        meta['review_count'] = int(match.group(1).replace(',', ''))
+
+    return meta
+
+
+class PageStore(object):
+    '''
+    Compressed review pages of one product. Pages are appended to pages.z and
+    pages.json maps each page number to its offset and length in pages.z.
+    Storing a page again appends the new version and points the index at it,
+    and pages.z is rewritten without the old versions once they take up more
+    than max_dead of it. Processes writing the same product, such as two
+    scraper tasks or overlapping delta crawls, take turns under a lock on
+    pages.lock and reload the index saved by the others before changing it,
+    so that none of them drops the pages of another from the index.
+    '''
+
+    data_name = 'pages.z'
+    index_name = 'pages.json'
+    lock_name = 'pages.lock'
+
+    def __init__(self, folder, asin=None, max_dead=0.5):
+        '''
+        INPUT: str, str, float
+        OUTPUT: None
+
+        Args:
+            folder: folder of the review pages of the product
+            asin: asin identifier for Amazon product
+            max_dead: share of pages.z taken up by replaced pages above which
+                      it is compacted
+
+        Attributes:
+            asin (str):          asin identifier for Amazon product
+            folder (str):        folder of the review pages
+            max_dead (float):    share of replaced pages that triggers
+                                 compaction
+            name (str):          name of product from the first page
+            pages (dict):        dictionary with page number as key and
+                                 [offset, length, trimmed] as value
+            review_count (int):  total number of reviews of the product
+        '''
+        self.asin = asin
+        self.folder = folder
+        self.max_dead = max_dead
+        self.name = None
+        self.pages = dict()
+        self.review_count = None
+        self._lock = threading.Lock()
+        self._load_index()
+
+    @classmethod
+    def exists(cls, folder):
+        '''
+        INPUT: str
+        OUTPUT: bool
+
+        Returns whether folder contains a page store
+        '''
+        return os.path.exists(os.path.join(folder, cls.index_name))
+
+    def _path(self, name):
+        return os.path.join(self.folder, name)
+
+    @contextmanager
+    def _locked(self, operation=fcntl.LOCK_EX):
+        '''
+        Holds the lock on pages.lock shared by all processes using the store,
+        exclusive for writers and shared for readers
+        '''
+        with open(self._path(self.lock_name), 'a') as lock:
+            fcntl.flock(lock, operation)
+
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load_index(self):
+        '''
+        INPUT: None
+        OUTPUT: None
+
+        Reads the index saved in pages.json, if there is one, replacing the
+        index in memory. The saved index has every page stored by any
+        process, since writers reload it under the lock before saving.
+        '''
+        if not os.path.exists(self._path(self.index_name)):
+            return
+
+        with open(self._path(self.index_name)) as f:
+            index = json.load(f)
+
+        self.asin = index['asin'] or self.asin
+        self.name = index['name']
+        self.review_count = index['review_count']
+        self.pages = dict((int(page), value)
+                          for page, value in index['pages'].items())
+
+    def __contains__(self, page):
+        return page in self.pages
+
+    def __len__(self):
+        return len(self.pages)
+
+    def put(self, page, htmlpage):
+        '''
+        INPUT: int, unicode
+        OUTPUT: None
+
+        Args:
+            page: page number
+            htmlpage: full html of the page
+
+        Stores the review list region of a page. The product name and review
+        count are read from the first page.
+        '''
+        region, trimmed = trim(htmlpage)
+        blob = zlib.compress(region.encode('utf-8'), 6)
+        meta = page_meta(htmlpage) if page == 1 else None
+
+        with self._lock, self._locked():
+            self._load_index()
+            self._write(page, blob, trimmed, meta)
+
+    def append(self, htmlpage):
+        '''
+        INPUT: unicode
+        OUTPUT: int
+
+        Args:
+            htmlpage: full html of the page
+
+        Stores the review list region of a page after the last stored page,
+        and returns its page number. The number is picked under the lock, so
+        concurrent delta crawls never store their pages under the same
+        number.
+        '''
+        region, trimmed = trim(htmlpage)
+        blob = zlib.compress(region.encode('utf-8'), 6)
+
+        with self._lock, self._locked():
+            self._load_index()
+            page = max([0] + list(self.pages)) + 1
+            self._write(page, blob, trimmed,
+                        page_meta(htmlpage) if page == 1 else None)
+
+        return page
+
+    def _write(self, page, blob, trimmed, meta):
+        '''
+        INPUT: int, str, bool, dict
+        OUTPUT: None
+
+        Appends the compressed region of a page to pages.z and saves the
+        index, compacting pages.z if needed. Must be called holding both
+        locks, with the index just reloaded.
+        '''
+        with open(self._path(self.data_name), 'ab') as f:
+            f.seek(0, os.SEEK_END)
+            offset = f.tell()
+            f.write(blob)
+
+        self.pages[page] = [offset, len(blob), trimmed]
+
+        if meta:
+            self.name = meta['name']
+            self.review_count = meta['review_count']
+
+        # bytes of pages.z taken up by replaced pages
+        size = offset + len(blob)
+        dead = size - sum(length for _, length, _ in self.pages.values())
+
+        if dead > self.max_dead * size:
+            self._compact()
+        else:
+            self._save_index()
+
+    def _compact(self):
+        '''
+        INPUT: None
+        OUTPUT: None
+
+        Rewrites pages.z with only the current version of every page and
+        saves the index with the new offsets. Like _write, it must be called
+        holding both locks with the index just reloaded, so that the pages
+        of other processes are kept. Both files are written to temporary
+        files first and then renamed, so the old files stay readable until
+        the rename.
+        '''
+        path = self._path(self.data_name)
+
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        offset = 0
+
+        with open(path + '.tmp', 'wb') as f:
+            for page in sorted(self.pages, key=lambda x: self.pages[x][0]):
+                old_offset, length, trimmed = self.pages[page]
+                f.write(data[old_offset:old_offset + length])
+                self.pages[page] = [offset, length, trimmed]
+                offset += length
+
+        os.rename(path + '.tmp', path)
+        self._save_index()
+
+    def _save_index(self):
+        index = {'asin': self.asin, 'name': self.name,
+                 'review_count': self.review_count,
+                 'pages': dict((str(page), value)
+                               for page, value in self.pages.items())}
+        path = self._path(self.index_name)
+
+        # write to a temporary file first so readers never see a partial file
+        with open(path + '.tmp', 'w') as f:
+            json.dump(index, f, sort_keys=True)
+        os.rename(path + '.tmp', path)
+
+    def get(self, page):
+        '''
+        INPUT: int
+        OUTPUT: unicode
+
+        Returns the stored review list region of a page. The index is
+        reloaded first, as another process may have compacted pages.z.
+        '''
+        with self._locked(fcntl.LOCK_SH):
+            self._load_index()
+            offset, length, _ = self.pages[page]
+
+            with open(self._path(self.data_name), 'rb') as f:
+                f.seek(offset)
+                blob = f.read(length)
+
+        return zlib.decompress(blob).decode('utf-8')
+
+    def items(self):
+        '''
+        INPUT: None
+        OUTPUT: generator
+
+        Yields page number and stored review list region of every page, in
+        page order, reading the index and the data file once
+        '''
+        with self._locked(fcntl.LOCK_SH):
+            self._load_index()
+            pages = dict(self.pages)
+
+            with open(self._path(self.data_name), 'rb') as f:
+                data = f.read()
+
+        for page in sorted(pages):
+            offset, length, _ = pages[page]
+            yield page, zlib.decompress(data[offset:offset + length]) \
+                .decode('utf-8')
+
+    def size(self):
+        '''
+        INPUT: None
+        OUTPUT: int
+
+        Returns bytes used by the store on disk
+        '''
+        return sum(os.path.getsize(self._path(name))
+                   for name in [self.data_name, self.index_name]
+                   if os.path.exists(self._path(name)))
@@ -7,6 +7,7 @@ SentCustomProperties: An object that stores index and rating data from the
                       original document corpus with a parsed spacy sentence
                       object.
 ReviewSents:          An object that stoes many SentCustomProperties objects
+                      and a TokenStore of their tokens
 Unigramer:            A class of functions that predicts unigram aspects
 Bigramer:             A class of functions that predicts bigram aspects
 Trigramer:            A class of functions that predicts trigram aspects
@@ -14,16 +15,125 @@ Trigramer:            A class of functions that predicts trigram aspects
 
 
 from __future__ import division
-from collections import Counter, defaultdict
-from sklearn.feature_extraction.text import CountVectorizer
+from collections import defaultdict
+from multiprocessing import Pool
+from postings import PostingList
 from spacy.en import English
+from spacy.tokens.doc import Doc
 from textblob import TextBlob
+from token_store import TokenStore
 from wordsets import com_dep, com_tag, noun_tag, nonaspects
 import numpy as np
 import re
 
 parser = English()
 
+# token pattern of sklearn's CountVectorizer, used to split unigram lemmas
+word_re = re.compile(r'(?u)\b\w\w+\b')
+
+
+def _parse_batch(batch, n_threads=1):
+    '''
+    INPUT: list(tuple(int, unicode)), int
+    OUTPUT: list(tuple(int, spacy.tokens.doc.Doc))
+
+    Args:
+        batch: list of (review index, review text) pairs
+        n_threads: number of threads for spacy to use within the batch
+
+    Streams a batch of reviews through spacy. If spacy fails on the batch, the
+    reviews are parsed one at a time so that only the failing reviews are
+    dropped. Failed reviews are returned with None in place of a Doc.
+    '''
+    idxs, texts = zip(*batch)
+
+    try:
+        docs = list(parser.pipe(texts, batch_size=len(texts),
+                                n_threads=n_threads))
+    except AssertionError:
+        docs = []
+
+        for text in texts:
+            try:
+                docs.append(parser(text))
+            except AssertionError:
+                docs.append(None)
+
+    return zip(idxs, docs)
+
+
+def _parse_batch_bytes(batch):
+    '''
+    INPUT: list(tuple(int, unicode))
+    OUTPUT: list(tuple(int, str))
+
+    Args:
+        batch: list of (review index, review text) pairs
+
+    Worker process version of _parse_batch. Docs are serialized to bytes so
+    they can be sent back to the parent process.
+    '''
+    return [(i, doc.to_bytes() if doc is not None else None)
+            for i, doc in _parse_batch(batch)]
+
+
+def _word_index(ngrams, position=None):
+    '''
+    INPUT: iterable(str), int
+    OUTPUT: dict
+
+    Args:
+        ngrams: n-grams with words seperated by space
+        position: if set, only index the word at this position of each n-gram
+
+    Returns dictionary with word as key and list of n-grams containing the word
+    as value
+    '''
+    index = defaultdict(list)
+
+    for ngram in sorted(ngrams):
+        words = ngram.split(" ")
+
+        if position is not None:
+            words = words[position:position + 1]
+
+        for word in set(words):
+            index[word].append(ngram)
+
+    return index
+
+
+def _substring_index(words, ngrams):
+    '''
+    INPUT: iterable(str), iterable(str)
+    OUTPUT: dict
+
+    Args:
+        words: words to look up
+        ngrams: n-grams with words seperated by space
+
+    Returns dictionary with word as key and list of n-grams containing the word
+    as a substring as value, the n-grams that "word in ngram" is true for. A
+    word without spaces is only compared to the distinct words of the n-grams
+    instead of to every n-gram.
+    '''
+    word_index = _word_index(ngrams)
+    index = dict()
+
+    for word in words:
+        if " " in word:
+            matches = [ngram for ngram in ngrams if word in ngram]
+        else:
+            matches = set()
+
+            for ngram_word, containing in word_index.iteritems():
+                if word in ngram_word:
+                    matches.update(containing)
+
+        index[word] = sorted(matches)
+
+    return index
+
 
 class SentCustomProperties(object):
     '''
@@ -57,11 +167,25 @@ class ReviewSents(object):
     (with additional properties) in the returned object
     '''
 
-    def __init__(self, product):
+    def __init__(self, product, n_jobs=1, batch_size=None, cache=None,
+                 stream=None, progress=None):
         '''
-        INPUT: Loader
+        INPUT: Loader, int, int, DocCache, iterator, function
         OUTPUT: None
 
+        Args:
+            n_jobs: number of worker processes used for parsing
+            batch_size: number of reviews streamed through spacy at a time.
+                        Reviews are parsed one at a time if None and n_jobs
+                        is 1.
+            cache: optional DocCache of previously parsed reviews
+            stream: optional iterator of (rating, review) pairs, such as
+                    Loader.stream, used instead of the ratings and reviews of
+                    product. Reviews are parsed in chunks of batch_size, or
+                    of a page of 10 reviews, as soon as they arrive.
+            progress: optional function called with the number of reviews
+                      parsed so far after each chunk of reviews
+
         Attribures:
             asin (str): asin identifier for Amazon product
             n_reviews (int): total number of reviews for product
@@ -70,33 +194,212 @@ class ReviewSents(object):
             ratings (list): list of customer review ratings for product
             reviews (list): list of customer review text for product
             sentences (list): list of SentCustomProperties objects
+            tokens (TokenStore): columnar arrays of every token in sentences
+        '''
+        self.asin = product.asin
+
+        if stream is None:
+            self.ratings, self.reviews = product.ratings, product.reviews
+        else:
+            self.ratings, self.reviews = [], []
+
+        self.n_reviews, self.n_sent, self.sentences = \
+            self._parse_sentences(n_jobs, batch_size, cache, stream, progress)
+        self.tokens = TokenStore(self.sentences)
+
+        # the name of a streamed product is known once its first page is read
+        self.name = product.name
+
+    def _parse_texts(self, texts, n_jobs, batch_size, pool=None):
+        '''
+        INPUT: list(tuple(int, unicode)), int, int, Pool
+        OUTPUT: generator(tuple(int, spacy.tokens.doc.Doc))
+
+        Args:
+            texts: list of (review index, review text) pairs to parse
+            n_jobs: number of worker processes used for parsing
+            batch_size: number of reviews streamed through spacy at a time
+            pool: pool of n_jobs worker processes to reuse, a pool is made
+                  for texts if None
+
+        Yields (review index, parsed review) in the order of texts. The parsed
+        review is None if spacy failed on the review.
+        '''
+        if n_jobs == 1 and not batch_size:
+            for i, text in texts:
+                try:
+                    yield i, parser(text)
+                except AssertionError:
+                    yield i, None
+            return
+
+        if not batch_size:
+            batch_size = max(1, len(texts) // (n_jobs * 4))
+
+        batches = [texts[i:i + batch_size]
+                   for i in xrange(0, len(texts), batch_size)]
+
+        if n_jobs == 1:
+            for batch in batches:
+                for i, doc in _parse_batch(batch):
+                    yield i, doc
+            return
+
+        own_pool = pool is None
+        pool = pool or Pool(n_jobs)
+
+        try:
+            for batch in pool.imap(_parse_batch_bytes, batches):
+                for i, doc_bytes in batch:
+                    if doc_bytes is None:
+                        yield i, None
+                    else:
+                        yield i, Doc(parser.vocab).from_bytes(doc_bytes)
+        finally:
+            if own_pool:
+                pool.terminate()
+
+    def _read_stream(self, stream, size):
+        '''
+        INPUT: iterator, int
+        OUTPUT: generator(list(tuple(int, unicode)))
+
+        Args:
+            stream: iterator of (rating, review) pairs
+            size: number of reviews per chunk
+
+        Adds the reviews of stream to ratings and reviews as they arrive and
+        yields them in chunks of (review index, review text) pairs
+        '''
+        chunk = []
+
+        for rating, review in stream:
+            self.ratings.append(rating)
+            self.reviews.append(review)
+            chunk.append((len(self.reviews) - 1, review))
+
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
+
+    def _iter_docs(self, n_jobs, batch_size, cache, stream=None,
+                   progress=None):
+        '''
+        INPUT: int, int, DocCache, iterator, function
+        OUTPUT: generator(tuple(int, spacy.tokens.doc.Doc))
+
+        Args:
+            n_jobs: number of worker processes used for parsing
+            batch_size: number of reviews streamed through spacy at a time
+            cache: cache of parsed reviews. Only reviews missing from the cache
+                   are parsed with spacy.
+            stream: optional iterator of (rating, review) pairs to parse
+                    instead of reviews
+            progress: optional function called with the number of reviews
+                      parsed so far after each chunk of reviews
+
+        Yields (review index, parsed review) in review order. The parsed review
+        is None if spacy failed on the review. Streamed reviews are parsed in
+        chunks as they arrive, by one pool of workers kept for the stream.
+        '''
+        if stream is None:
+            chunks = [list(enumerate(self.reviews))]
+            pool = None
+        else:
+            chunks = self._read_stream(stream, batch_size or 10)
+            pool = Pool(n_jobs) if n_jobs > 1 else None
+
+        try:
+            for chunk in chunks:
+                for i, doc in self._iter_chunk(chunk, n_jobs, batch_size,
+                                               cache, pool):
+                    yield i, doc
+
+                if progress and chunk:
+                    progress(chunk[-1][0] + 1)
+        finally:
+            if pool:
+                pool.terminate()
+
+    def _iter_chunk(self, reviews, n_jobs, batch_size, cache, pool=None):
         '''
-        self.asin, self.name = product.asin, product.name
-        self.ratings, self.reviews = product.ratings, product.reviews
-        self.n_reviews, self.n_sent, self.sentences = self._parse_sentences()
+        INPUT: list(tuple(int, unicode)), int, int, DocCache, Pool
+        OUTPUT: generator(tuple(int, spacy.tokens.doc.Doc))
+
+        Args:
+            reviews: list of (review index, review text) pairs to parse
+            n_jobs: number of worker processes used for parsing
+            batch_size: number of reviews streamed through spacy at a time
+            cache: cache of parsed reviews. Only reviews missing from the cache
+                   are parsed with spacy.
+            pool: pool of n_jobs worker processes to reuse
+
+        Yields (review index, parsed review) in the order of reviews
+        '''
+        regex = re.compile(r'\.\.\.\.+')
+        texts = [(i, regex.sub(u'...', review)) for i, review in reviews]
+
+        if cache is None:
+            for i, doc in self._parse_texts(texts, n_jobs, batch_size, pool):
+                yield i, doc
+            return
+
+        keys = dict((i, cache.key(text)) for i, text in texts)
+        cached = dict()
+
+        for i, _ in texts:
+            doc_bytes = cache.get(keys[i])
 
-    def _parse_sentences(self):
+            if doc_bytes is not None:
+                cached[i] = Doc(parser.vocab).from_bytes(doc_bytes)
+
+        misses = [item for item in texts if item[0] not in cached]
+        parsed = self._parse_texts(misses, n_jobs, batch_size, pool)
+
+        for i, _ in texts:
+            if i in cached:
+                yield i, cached[i]
+                continue
+
+            _, doc = next(parsed)
+
+            if doc is not None:
+                cache.put(keys[i], doc.to_bytes())
+
+            yield i, doc
+
+    def _parse_sentences(self, n_jobs=1, batch_size=None, cache=None,
+                         stream=None, progress=None):
         '''
-        INPUT: None
+        INPUT: int, int, DocCache, iterator, function
         OUTPUT: int, int, list(SentCustomProperties)
 
+        Args:
+            n_jobs: number of worker processes used for parsing
+            batch_size: number of reviews streamed through spacy at a time
+            cache: optional DocCache of previously parsed reviews
+            stream: optional iterator of (rating, review) pairs to parse
+                    instead of reviews
+            progress: optional function called with the number of reviews
+                      parsed so far after each chunk of reviews
+
         Uses spacy to parse and split the sentences
         Return number of reviews, sentences, and list of spacy objects
         '''
-        regex = re.compile(r'\.\.\.\.+')
-
         n_sent, n_reviews = 0, 0
         sentences = []
 
-        for i, review in enumerate(self.reviews):
-            try:
-                review = regex.sub(u'...', review)
-                review = parser(review)
-                n_reviews += 1
-            except AssertionError:
+        for i, review in self._iter_docs(n_jobs, batch_size, cache, stream,
+                                         progress):
+            if review is None:
                 print 'parser for review #{} failed'.format(i)
                 continue
 
+            n_reviews += 1
+
             for sent in review.sents:
                 if sent.string:
                     sentences.append(SentCustomProperties(i, self.ratings[i],
@@ -117,55 +420,69 @@ class Unigramer(object):
             cnt_dict (dict):      dictionary with word as key and count of how
                                   frequently such word appears in all review
                                   for products as value
-            dep_dict (dict):      dictionary with word as key and list of every
-                                  dependency type that corresponds with the
-                                  word token as value
+            amod_dict (dict):     dictionary with word as key and share of
+                                  dependencies with the word as head that are
+                                  'amod' dependencies as value
             n_reviews (int):      total number of reviews for product
-            rev_dict (dict):      dictionary with word as key and set of review
-                                  indexes containg word as value
-            sent_dict (dict):     dictionary with word as key and list of
-                                  sentence indexes containg word as value
+            rev_dict (dict):      dictionary with word as key and PostingList
+                                  of review indexes containg word as value
+            sent_dict (dict):     dictionary with word as key and PostingList
+                                  of sentence indexes containg word as value
             unigrams (set):       set of unigrams obtained with
                                   candidate_unigrams function
             word_pos_dict (dict): dictionary with word as key and list of
                                   token index of word within spacy sentence as
                                   value
         '''
+        self.amod_dict = dict()
         self.cnt_dict = defaultdict(int)
-        self.dep_dict = defaultdict(list)
         self.n_reviews = None
-        self.rev_dict = defaultdict(set)
-        self.sent_dict = defaultdict(list)
+        self.rev_dict = defaultdict(PostingList)
+        self.sent_dict = defaultdict(PostingList)
         self.unigrams = None
         self.word_pos_dict = defaultdict(list)
 
-    def _iter_nouns(self, sent):
+    def _noun_postings(self, tokens):
         '''
-        INPUT: SentCustomProperties
-        OUTPUT: str
+        INPUT: TokenStore
+        OUTPUT: np.array(int)
 
-        Iterates through each token of spacy sentence and collects
-        lemmas of all nouns into a set.
+        Collects the review indexes, sentence indexes and first position
+        within each sentence of all nouns that are valid aspects and uncommon
+        words. Returns the number of sentences containing each lemma id.
         '''
-        wordset = set()
-
-        for token in sent.sent:
-            self.cnt_dict[token.lemma_] += 1
-            self.dep_dict[token.head.lemma_].append(token.dep_)
-            root = parser.vocab[token.lemma].prob
-
-            # filter to only consider nouns, valid aspects, and uncommon words
-            if token.tag_ in noun_tag and (root < -7.5 and
-                                           token.lemma_ not in nonaspects):
-                wordset.add(token.lemma_)
-                self.rev_dict[token.lemma_].add(sent.review_idx)
-
-                if sent.sent_idx not in self.sent_dict[token.lemma_]:
-                    i = token.i - sent.start_idx
-                    self.word_pos_dict[token.lemma_].append(i)
-                    self.sent_dict[token.lemma_].append(sent.sent_idx)
-
-        return " ".join(wordset)
+        # filter to only consider nouns, valid aspects, and uncommon words
+        nouns = tokens.mask('tag', noun_tag) & \
+            ~tokens.mask('lemma', nonaspects) & \
+            (tokens.prob[tokens.lemma] < -7.5)
+        noun_idx = np.flatnonzero(nouns)
+
+        if not noun_idx.shape[0]:
+            return np.zeros(len(tokens.lemmas), dtype=int)
+
+        # first occurrence of each lemma within each sentence
+        n_sent = tokens.sent_start.shape[0]
+        key = tokens.lemma[noun_idx].astype(np.int64) * n_sent + \
+            tokens.sent[noun_idx]
+        key, first = np.unique(key, return_index=True)
+        first = noun_idx[first]
+
+        lemma = key // n_sent
+        bounds = np.flatnonzero(np.diff(lemma)) + 1
+        starts = np.hstack([0, bounds]).astype(int)
+        ends = np.hstack([bounds, len(lemma)]).astype(int)
+
+        sents = tokens.sent[first]
+        reviews = tokens.review[first]
+        positions = tokens.pos[first].tolist()
+
+        for start, end in zip(starts, ends):
+            word = tokens.lemmas[lemma[start]]
+            self.rev_dict[word] = PostingList(reviews[start:end])
+            self.sent_dict[word] = PostingList(sents[start:end])
+            self.word_pos_dict[word] = positions[start:end]
+
+        return np.bincount(lemma, minlength=len(tokens.lemmas))
 
     def candidate_unigrams(self, corpus, min_pct=0.01, amod_pct=0.094):
         '''
@@ -180,27 +497,47 @@ class Unigramer(object):
         Obtains a set of candidate unigrams
         Each candidate unigram must be a noun
         '''
-        count_X = []
+        tokens = corpus.tokens
+        n_lemmas = len(tokens.lemmas)
         self.n_reviews = corpus.n_reviews
 
-        for sent in corpus.sentences:
-            count_X.append(self._iter_nouns(sent))
+        counts = np.bincount(tokens.lemma, minlength=n_lemmas)
+        self.cnt_dict.update(zip(tokens.lemmas, counts.tolist()))
 
-        cnt_vec = CountVectorizer()
-        freq = cnt_vec.fit_transform(count_X)
+        # share of dependencies pointing at each lemma that are 'amod'
+        head_lemma = tokens.lemma[np.arange(len(tokens)) + tokens.head]
+        amod = tokens.mask('dep', ['amod'])
+        n_deps = np.bincount(head_lemma, minlength=n_lemmas)
+        n_amod = np.bincount(head_lemma, weights=amod, minlength=n_lemmas)
 
-        total_count = freq.toarray().sum(axis=0)
-        filter_ = total_count >= min_pct * corpus.n_sent
+        for i in np.flatnonzero(n_deps):
+            self.amod_dict[tokens.lemmas[i]] = n_amod[i] / n_deps[i]
+
+        # split lemmas into words the same way as sklearn's CountVectorizer
+        sent_freq = self._noun_postings(tokens)
+        word_ids, rows, cols = dict(), [], []
+
+        for i in np.flatnonzero(sent_freq):
+            for word in word_re.findall(tokens.lemmas[i].lower()):
+                rows.append(i)
+                cols.append(word_ids.setdefault(word, len(word_ids)))
+
+        words = np.empty(len(word_ids), dtype=object)
+
+        for word, i in word_ids.iteritems():
+            words[i] = word
+
+        total_count = np.bincount(np.array(cols, dtype=int),
+                                  weights=sent_freq[rows],
+                                  minlength=len(words))
 
         # filter for aspect appearing in min_pct of sentences
-        features = np.array(cnt_vec.get_feature_names())
-        unigrams = set(features[filter_])
+        filter_ = total_count >= min_pct * corpus.n_sent
+        unigrams = set(words[filter_])
 
         # filter for percentage of time aspect is modified by amod
         for word in unigrams.copy():
-            arr = np.array(self.dep_dict[word]) == 'amod'
-
-            if np.mean(arr) < amod_pct:
+            if self.amod_dict.get(word, 0.) < amod_pct:
                 unigrams.remove(word)
 
         self.unigrams = unigrams
@@ -213,21 +550,21 @@ class Unigramer(object):
         OUTPUT: none
 
         Updates Unigramer rev_dict so that reviews aren't double counted for
-        unigram words appearing in bigrams and trigrams.
+        unigram words appearing in bigrams and trigrams. As in the all-pairs
+        version, a unigram is matched to every n-gram it is a substring of,
+        so 'ear' is also matched to 'year warranty'.
         '''
         update_queue = self.unigrams & bigramer.bigram_words
+        bigram_index = _substring_index(update_queue, bigramer.bigrams)
+        trigram_index = _substring_index(update_queue, trigramer.trigrams) \
+            if trigramer else {}
 
         for unigram in update_queue:
-            for bigram in bigramer.bigrams:
-                if unigram in bigram:
-                    self.rev_dict[unigram] -= bigramer.rev_dict[bigram]
-
-            if not trigramer:
-                continue
+            for bigram in bigram_index.get(unigram, []):
+                self.rev_dict[unigram] -= bigramer.rev_dict[bigram]
 
-            for trigram in trigramer.trigrams:
-                if unigram in trigram:
-                    self.rev_dict[unigram] -= trigramer.rev_dict[trigram]
+            for trigram in trigram_index.get(unigram, []):
+                self.rev_dict[unigram] -= trigramer.rev_dict[trigram]
 
 
 class Bigramer(object):
@@ -255,10 +592,10 @@ class Bigramer(object):
             pmi (dict):            dictionary with bigram as key and float
                                    describing Pointwise Mutual Information
                                    between words in bigram as value
-            rev_dict (dict):       dictionary with word as key and set of
-                                   review indexes containg word as value
-            sent_dict (dict):      dictionary with word as key and list of
-                                   sentence indexes containg word as value
+            rev_dict (dict):       dictionary with word as key and PostingList
+                                   of review indexes containg word as value
+            sent_dict (dict):      dictionary with word as key and PostingList
+                                   of sentence indexes containg word as value
             unigramer (Unigramer): Unigramer object for product
             word_pos_dict (dict):  dictionary with word as key and list of
                                    token index of word within spacy sentence as
@@ -270,8 +607,8 @@ class Bigramer(object):
         self.distances = defaultdict(list)
         self.ordering = defaultdict(list)
         self.pmi = defaultdict(float)
-        self.rev_dict = defaultdict(set)
-        self.sent_dict = defaultdict(list)
+        self.rev_dict = defaultdict(PostingList)
+        self.sent_dict = defaultdict(PostingList)
         self.unigramer = unigramer
         self.word_pos_dict = defaultdict(list)
 
@@ -294,55 +631,107 @@ class Bigramer(object):
         self.sent_dict[new_key] = self.sent_dict.pop(key)
         self.word_pos_dict[new_key] = self.word_pos_dict.pop(key)
 
-    def _get_compactness_feat(self, corpus):
+    def _get_compactness_feat(self, corpus, window=3):
         '''
-        INPUT: ReviewSents
-        OUTPUT: generator(tuples(unicode))
+        INPUT: ReviewSents, int
+        OUTPUT: dict
 
-        Outputs generator of tuples (in alphabetical order) consisting of:
+        Args:
+            window: maximum word spacing between the words of a bigram
+
+        Finds every pair of words (as a bigram in alphabetical order)
+        consisting of:
             at least one noun
-            a second word within +/- 3 words of noun
+            a second word within +/- window words of noun
         Excludes dependencies and tags not likely to be a feature word
-        '''
-
-        for sent in corpus.sentences:
-            output = set()
 
-            for i, token in enumerate(sent.sent):
-                # one word in bigram must be noun
-                if token.tag_ in noun_tag and token.lemma_ not in nonaspects:
-                    arr = sent.sent[max(0, i - 3):min(i + 4, sent.words)]
-                    arr = np.array(arr)
-                    arr = arr[arr != token]
-
-                    for item in arr:
-                        root = parser.vocab[item.lemma].prob
-                        # filter out unlikely features
-                        if root < -7.5 and (item.dep_ not in com_dep and
-                                            item.tag_ not in com_tag and
-                                            item.lemma_ not in nonaspects):
-                            bigrm = " ".join(sorted([item.lemma_,
-                                                     token.lemma_]))
-                            dist = item.i - token.i
-                            word_sort = item.lemma_ < token.lemma_
+        All (noun, neighbour) pairs are found at once by shifting the token
+        arrays of the corpus. Returns dictionary with bigram as key and number
+        of sentences containing bigram as value.
+        '''
+        tokens = corpus.tokens
+        n_tokens = len(tokens)
 
-                            if not self.ordering[bigrm]:
-                                self.ordering[bigrm] = [0, 0]
+        # one word in bigram must be noun
+        nouns = np.flatnonzero(tokens.mask('tag', noun_tag) &
+                               ~tokens.mask('lemma', nonaspects))
 
-                            self.distances[bigrm].append(abs(dist))
-                            self.rev_dict[bigrm].add(sent.review_idx)
-                            self.ordering[bigrm][word_sort == (dist > 0)] += 1
+        # filter out unlikely features
+        feats = (tokens.prob[tokens.lemma] < -7.5) & \
+            ~tokens.mask('dep', com_dep) & \
+            ~tokens.mask('tag', com_tag) & \
+            ~tokens.mask('lemma', nonaspects)
 
-                            if sent.sent_idx not in self.sent_dict[bigrm]:
-                                i = token.i - sent.start_idx
-                                self.word_pos_dict[bigrm].append(i)
-                                self.sent_dict[bigrm].append(sent.sent_idx)
+        noun_idx, item_idx = [], []
 
-                            output.add(bigrm)
+        for shift in range(-window, window + 1):
+            if not shift:
+                continue
 
-            if output:
-                for element in output:
-                    yield element
+            item = nouns + shift
+            valid = (item >= 0) & (item < n_tokens)
+            noun, item = nouns[valid], item[valid]
+            valid = (tokens.sent[item] == tokens.sent[noun]) & feats[item]
+            noun_idx.append(noun[valid])
+            item_idx.append(item[valid])
+
+        # order pairs the same way as iterating through each sentence
+        noun, item = np.hstack(noun_idx), np.hstack(item_idx)
+        order = np.lexsort((item, noun))
+        noun, item = noun[order], item[order]
+
+        if not noun.shape[0]:
+            return dict()
+
+        # rank of each lemma in alphabetical order
+        n_lemmas = len(tokens.lemmas)
+        alpha = sorted(xrange(n_lemmas), key=tokens.lemmas.__getitem__)
+        rank = np.empty(n_lemmas, dtype=np.int64)
+        rank[alpha] = np.arange(n_lemmas)
+
+        noun_rank = rank[tokens.lemma[noun]]
+        item_rank = rank[tokens.lemma[item]]
+        dist = item - noun
+        word_sort = item_rank < noun_rank
+        ordering = (word_sort == (dist > 0)).astype(int)
+
+        key = np.minimum(noun_rank, item_rank) * n_lemmas + \
+            np.maximum(noun_rank, item_rank)
+        key, key_idx = np.unique(key, return_inverse=True)
+        n_keys = key.shape[0]
+
+        # events grouped by bigram, in sentence order within each bigram
+        group = np.argsort(key_idx, kind='mergesort')
+        group_ends = np.cumsum(np.bincount(key_idx, minlength=n_keys))
+        distances = np.split(np.abs(dist)[group], group_ends[:-1])
+        reviews = np.split(tokens.review[noun][group], group_ends[:-1])
+        orderings = np.bincount(key_idx * 2 + ordering,
+                                minlength=n_keys * 2).reshape(-1, 2).tolist()
+
+        # first occurrence of each bigram within each sentence
+        n_sent = tokens.sent_start.shape[0]
+        sent_key = key_idx.astype(np.int64) * n_sent + tokens.sent[noun]
+        sent_key, first = np.unique(sent_key, return_index=True)
+        sent_ends = np.cumsum(np.bincount(sent_key // n_sent,
+                                          minlength=n_keys))
+        sents = np.split(tokens.sent[noun[first]], sent_ends[:-1])
+        positions = np.split(tokens.pos[noun[first]], sent_ends[:-1])
+
+        output = dict()
+
+        for k in xrange(n_keys):
+            bigrm = " ".join([tokens.lemmas[alpha[key[k] // n_lemmas]],
+                              tokens.lemmas[alpha[key[k] % n_lemmas]]])
+
+            self.distances[bigrm] = distances[k].tolist()
+            self.ordering[bigrm] = orderings[k]
+            self.rev_dict[bigrm] = PostingList(reviews[k])
+            self.sent_dict[bigrm] = PostingList(sents[k])
+            self.word_pos_dict[bigrm] = positions[k].tolist()
+
+            output[bigrm] = len(self.sent_dict[bigrm])
+
+        return output
 
     def candidate_bigrams(self, corpus, min_pct=0.005,
                           pmi_pct=0.0003, max_avg_dist=2):
@@ -361,7 +750,7 @@ class Bigramer(object):
         bigrams, bigram_words = self.bigrams, self.bigram_words
         cnt_dict = self.unigramer.cnt_dict
 
-        feats = Counter(self._get_compactness_feat(corpus))
+        feats = self._get_compactness_feat(corpus)
 
         for (key, val) in feats.iteritems():
             order = sorted(key.split(" "),
@@ -392,14 +781,15 @@ class Bigramer(object):
 
         Remove bigrams if the words appear in a trigram
         '''
-        bigrams = sorted(list(self.bigrams))
-        split_bigrams = [bigram.split(" ") for bigram in bigrams]
+        bigram_index = _word_index(self.bigrams, position=0)
 
         for trigram in trigramer.trigrams:
             trigram = trigram.split(" ")
-            for bigram, split in zip(bigrams, split_bigrams):
-                if split[0] in trigram and split[1] in trigram:
-                    self.bigrams -= set([bigram])
+
+            for word in set(trigram):
+                for bigram in bigram_index.get(word, []):
+                    if bigram.split(" ")[1] in trigram:
+                        self.bigrams.discard(bigram)
 
 
 class Trigramer(object):
@@ -413,10 +803,10 @@ class Trigramer(object):
 
         Attribures:
             bigramer (Bigramer):  Bigramer object for product
-            rev_dict (dict):      dictionary with word as key and set of review
-                                  indexes containg word as value
-            sent_dict (dict):     dictionary with word as key and list of
-                                  sentence indexes containg word as value
+            rev_dict (dict):      dictionary with word as key and PostingList
+                                  of review indexes containg word as value
+            sent_dict (dict):     dictionary with word as key and PostingList
+                                  of sentence indexes containg word as value
             trigrams (set):       set of trigrams obtained with
                                   candidate_trigrams function
             word_pos_dict (dict): dictionary with word as key and list of
@@ -424,8 +814,8 @@ class Trigramer(object):
                                   value
         '''
         self.bigramer = bigramer
-        self.rev_dict = defaultdict(set)
-        self.sent_dict = defaultdict(list)
+        self.rev_dict = defaultdict(PostingList)
+        self.sent_dict = defaultdict(PostingList)
         self.trigrams = set()
         self.word_pos_dict = defaultdict(list)
 
@@ -442,22 +832,17 @@ class Trigramer(object):
         Checks the rev_dict, sent_dict, and word_pos_dict of bigrams in trigram
         to build the same dictionaries for the trigram.
         '''
-        bgrm_rdict = self.bigramer.rev_dict
         bgrm_sdict = self.bigramer.sent_dict
-        tgrm_sdict = self.sent_dict
         bgrm_wdict = self.bigramer.word_pos_dict
-        tgrm_wdict = self.word_pos_dict
-
-        match_idx = np.in1d(bgrm_sdict[bigram1], bgrm_sdict[bigram2])
-        match_reviews = set()
 
-        tgrm_sdict[trigram] = np.array(bgrm_sdict[bigram1])[match_idx].tolist()
-        tgrm_wdict[trigram] = np.array(bgrm_wdict[bigram1])[match_idx].tolist()
+        match_idx = bgrm_sdict[bigram1].isin(bgrm_sdict[bigram2])
+        sents = bgrm_sdict[bigram1][match_idx]
 
-        for si in tgrm_sdict[trigram]:
-            match_reviews.add(corpus.sentences[si].review_idx)
-
-        self.rev_dict[trigram] = match_reviews
+        self.sent_dict[trigram] = sents
+        self.word_pos_dict[trigram] = \
+            np.array(bgrm_wdict[bigram1])[match_idx].tolist()
+        self.rev_dict[trigram] = \
+            PostingList(corpus.tokens.sent_review[sents.ids])
 
     def candidate_trigrams(self, corpus, review_pct=0.40):
         '''
@@ -474,13 +859,14 @@ class Trigramer(object):
         bigrams, trigrams = self.bigramer.bigrams, self.trigrams
         bgrm_rdict = self.bigramer.rev_dict
 
-        split_bigrams = [bigram.split(" ") for bigram in bigrams]
+        bigram_index = _word_index(bigrams, position=0)
 
-        for bigram1, split1 in zip(bigrams, split_bigrams):
-            for bigram2, split2 in zip(bigrams, split_bigrams):
-                # check if the bigrams connect to form a trigram
-                if split1[1] != split2[0]:
-                    continue
+        for bigram1 in bigrams:
+            split1 = bigram1.split(" ")
+
+            # bigrams that connect with bigram1 to form a trigram
+            for bigram2 in bigram_index.get(split1[1], []):
+                split2 = bigram2.split(" ")
 
                 bg1_cnt = len(bgrm_rdict[bigram1])
                 bg2_cnt = len(bgrm_rdict[bigram2])
@@ -7,6 +7,7 @@ polarizer.py scripts.
 from parsers import *
 from polarizer import *
 from scraper import *
+import time
 
 
 def load(url, n_reviews=300, delete=False):
@@ -23,38 +24,119 @@ def load(url, n_reviews=300, delete=False):
     Scrapes an amazon url and returns the scraped product.
     '''
     product = Loader(url)
-    product.scrape(300)
+    product.scrape(n_reviews, delete)
 
     return product
 
 
-def parse(product):
+def refresh(asins, max_pages=10):
     '''
-    INPUT: Loader
+    INPUT: list(str), int
+    OUTPUT: dict
+
+    Args:
+        asins: asin identifiers of scraped amazon products
+        max_pages: maximum number of pages of new reviews to download per
+            product
+
+    Downloads and stores only the reviews posted since each product was
+    scraped. Returns dictionary with asin as key and number of new reviews as
+    value, or None if the refresh of the product failed.
+    '''
+    new_reviews = dict()
+
+    for asin in asins:
+        try:
+            product = Loader().refresh(asin, max_pages=max_pages)
+            new_reviews[asin] = len(product.new_reviews)
+        except RuntimeError as e:
+            print 'refresh of {} failed: {}'.format(asin, e)
+            new_reviews[asin] = None
+
+    return new_reviews
+
+
+def parse(product, n_jobs=1, batch_size=None, cache=None):
+    '''
+    INPUT: Loader, int, int, DocCache
     OUTPUT: ReviewSents
 
     Args:
         doc: a scrpaed Loader object from the load function
+        n_jobs: number of worker processes used for extraction and parsing
+        batch_size: number of reviews streamed through spacy at a time
+        cache: optional DocCache of previously parsed reviews
 
     Uses spacy to tokenize sentences in review and returns custom class of
     review data for later processing
     '''
-    product.extract()
-    return ReviewSents(product)
+    product.extract(n_jobs=n_jobs)
+    return ReviewSents(product, n_jobs, batch_size, cache)
+
+
+def stream(url, n_reviews=300, n_jobs=1, batch_size=None, cache=None,
+           workers=4, queue_size=10):
+    '''
+    INPUT: str, int, int, int, DocCache, int, int
+    OUTPUT: ReviewSents, dict
 
+    Args:
+        url: url of amazon product
+        n_reviews: number of reviews to scrape
+        n_jobs: number of worker processes used for parsing
+        batch_size: number of reviews streamed through spacy at a time
+        cache: optional DocCache of previously parsed reviews
+        workers: number of review pages downloaded concurrently
+        queue_size: maximum number of downloaded pages waiting to be
+            extracted
+
+    Scrapes, extracts and parses an amazon url at the same time, so that the
+    reviews of a page are parsed while the next pages download. Returns the
+    same ReviewSents as load followed by parse, and dictionary of the seconds
+    until the first page was extracted (first_page), until its reviews were
+    parsed (first_result), until the crawl ended (crawled) and until all
+    reviews were parsed (elapsed).
+    '''
+    product = Loader(url)
+    timings = dict()
+    start = time.time()
+
+    def parsed(n_parsed):
+        if 'first_result' not in timings:
+            timings['first_result'] = time.time() - start
 
-def summarize(corpus):
+    reviews = product.stream(n_reviews, workers=workers,
+                             queue_size=queue_size)
+    corpus = ReviewSents(product, n_jobs, batch_size, cache, stream=reviews,
+                         progress=parsed)
+
+    timings['elapsed'] = time.time() - start
+    timings['first_page'] = product.stream_stats['first_page']
+    timings['crawled'] = product.stream_stats['crawled']
+
+    return corpus, timings
+
+
+def summarize(corpus, batch=False, n_jobs=1, lazy=False, progress=None):
     '''
-    INPUT: ReviewSents
+    INPUT: ReviewSents, bool, int, bool, function
     OUTPUT: Polarizer
 
     Args:
         doc: a ReviewSents object from the parse function
+        batch: whether to score sentiment with the vectorized BatchScorer
+        n_jobs: number of worker processes used for sentiment analysis
+        lazy: whether to only polarize aspects when their results are used
+        progress: optional function called with the name of each stage,
+                  'mine' and 'polarize', as it starts
 
     Master function of repo that performs aspect mining on product and
     sentiment analysis on review sentences. Outputs modeled Polarizer object.
     '''
 
+    if progress:
+        progress('mine')
+
     unigramer = Unigramer()
     unigramer.candidate_unigrams(corpus)
 
@@ -67,7 +149,10 @@ def summarize(corpus):
     bigramer.pop_bigrams(trigramer)
     unigramer.update_review_count(bigramer, trigramer)
 
+    if progress:
+        progress('polarize')
+
     polarizer = Polarizer(unigramer, bigramer, trigramer)
-    polarizer.polarize_aspects(corpus)
+    polarizer.polarize_aspects(corpus, batch=batch, n_jobs=n_jobs, lazy=lazy)
 
     return polarizer
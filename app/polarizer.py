@@ -5,13 +5,70 @@ classes from parsers.py
 '''
 
 from __future__ import division
-from afinn import Afinn
 from collections import defaultdict
-from textblob import TextBlob
+import heapq
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+from sentiment import SentimentCache, shared_scorer
 import numpy as np
-import unicodedata
 
-afinn = Afinn()
+# Polarizer, tokens and batch option used by pool workers. Set before the pool
+# is created so that worker processes inherit them when forked.
+_pool_state = dict()
+
+
+def _polarize_chunk(aspects):
+    '''
+    INPUT: list(str)
+    OUTPUT: list(tuple), tuple(int)
+
+    Args:
+        aspects: aspects to polarize
+
+    Pool worker that polarizes aspects with the Polarizer in _pool_state
+    '''
+    polarizer = _pool_state['polarizer']
+
+    return polarizer._polarize_copy(_pool_state['tokens'], aspects,
+                                    _pool_state['batch'])
+
+
+class LazyAspectDict(dict):
+    '''
+    Dictionary with aspect as key that polarizes an aspect the first time it
+    is looked up. Used for the results of a lazy Polarizer, so that only
+    aspects that are looked at get polarized. Iterating over the dictionary
+    only gives the aspects that have been polarized so far.
+    '''
+
+    def __init__(self, polarizer, default_factory=None):
+        '''
+        INPUT: Polarizer, function
+        OUTPUT: None
+
+        Args:
+            polarizer: lazy Polarizer that fills the dictionary
+            default_factory: function returning the value for keys that are
+                             not aspects. KeyError is raised if None.
+        '''
+        dict.__init__(self)
+        self.default_factory = default_factory
+        self.polarizer = polarizer
+
+    def __missing__(self, aspect):
+        if aspect in self.polarizer.aspect_freqs() and \
+                aspect not in self.polarizer.aspect_dict:
+            self.polarizer._polarize_lazy(aspect)
+
+            if aspect in self:
+                return dict.__getitem__(self, aspect)
+
+        if self.default_factory is None:
+            raise KeyError(aspect)
+
+        self[aspect] = self.default_factory()
+
+        return dict.__getitem__(self, aspect)
 
 
 class Polarizer(object):
@@ -27,11 +84,11 @@ class Polarizer(object):
         Attributes:
             asin (str):             asin identifier for Amazon product
             aspect_dict (dict):     dictionary with aspect as key and review
-                                    number as subkey. combines sentences
-                                    containing aspects from the same review
-                                    into a single text, tracks the first
-                                    occurance of the aspect within text block,
-                                    and stores customer rating of review
+                                    number as subkey. tracks the sentences
+                                    containing aspects from the same review,
+                                    the first occurance of the aspect within
+                                    the text block, and the customer rating
+                                    of review
             aspect_pct (dict):      dictionary with aspect as key and list of
                                     floats [pos, mixed, neg] representing
                                     polarity class proportion within aspect
@@ -46,11 +103,17 @@ class Polarizer(object):
             ratings (dict):         dictionary with aspect as key and customer
                                     ratings for reviews containing aspect as
                                     values
+            lazy (bool):            whether aspects are polarized when their
+                                    results are first looked up
+            n_reviews (int):        total number of reviews for product
+            sentiment (SentimentCache): stores sentence sentiment scores of
+                                    the polarized corpus
             top_asps (list):        list of lists of the top aspects for the
                                     product. First list is a string list of the
                                     aspects. Second list is the review count
                                     frequency of how often aspects in first
-                                    list appear.
+                                    list appear. None until top_aspects is
+                                    called when polarizing lazily.
             trigramer (Trigramer):  stores Trigramer class
             unigramer (Unigramer):  stores Unigramer class
         '''
@@ -59,22 +122,29 @@ class Polarizer(object):
         self.aspect_pct = dict()
         self.aspect_pol_list = defaultdict(dict)
         self.bigramer = bigramer
+        self.lazy = False
+        self.n_reviews = None
         self.name = None
         self.ratings = defaultdict(list)
+        self.sentiment = None
         self.top_asps = None
         self.trigramer = trigramer
         self.unigramer = unigramer
+        self._batch = False
+        self._freqs = None
+        self._tokens = None
 
-    def _aspect_review_dict(self, corpus, aspect):
+    def _aspect_review_dict(self, tokens, aspect):
         '''
-        INPUT: ReviewSents, str
+        INPUT: TokenStore, str
         OUTPUT: None
 
         Args:
+            tokens: TokenStore of the corpus
             aspect: aspect to create dictionary for
 
         Creates a dictionary for the aspect position, customer rating, and
-        sentences associated with the specified aspect.
+        sentence indexes associated with the specified aspect.
         '''
         prev_sent = -1
 
@@ -97,27 +167,26 @@ class Polarizer(object):
         review_dict = defaultdict(dict)
 
         for s, w in zip(sent_idx, word_pos_idx):
-            review = corpus.sentences[s].review_idx
+            review = int(tokens.sent_review[s])
 
             if review not in rev_idx:
                 continue
 
             if review not in review_dict:
-                review_dict[review]['sentences'] = ''
+                review_dict[review]['sent_idxs'] = []
                 review_dict[review]['first_aspect_idx'] = None
 
             if s == prev_sent:
                 continue
             else:
-                rating = corpus.sentences[s].review_rate
-                sentence = corpus.sentences[s].sent.string
+                rating = int(tokens.sent_rating[s])
                 self.ratings[aspect].append(rating)
 
                 review_dict[review]['rating'] = rating
-                review_dict[review]['sentences'] += sentence
+                review_dict[review]['sent_idxs'].append(int(s))
 
                 if not review_dict[review]['first_aspect_idx']:
-                    i = len(corpus.sentences[s].sent[0:w].string)
+                    i = int(tokens.idx[tokens.sent_start[s] + w])
                     review_dict[review]['first_aspect_idx'] = i
 
         self.aspect_dict[aspect] = review_dict
@@ -155,17 +224,16 @@ class Polarizer(object):
         '''
         aspect_idx = self.aspect_dict[aspect][review]['first_aspect_idx']
         rating = self.aspect_dict[aspect][review]['rating']
-        review_txt = self.aspect_dict[aspect][review]['sentences']
-        review_txt = unicodedata.normalize('NFKD', review_txt).encode('ascii',
-                                                                      'ignore')
-        pol_blob = round(TextBlob(review_txt).sentiment.polarity, 3)
+        sent_idxs = self.aspect_dict[aspect][review]['sent_idxs']
+        review_txt = ''.join(self.sentiment.text(s) for s in sent_idxs)
+        pol_blob = round(self.sentiment.blob_polarity(sent_idxs), 3)
 
         if rating == 5 and pol_blob > 0.1:
             result = 'pos'
         elif rating == 4 and pol_blob > 0.45:
             result = 'pos'
         elif rating == 4 and pol_blob > 0.2:
-            pol_afin = afinn.score(review_txt)
+            pol_afin = self.sentiment.afinn_score(sent_idxs)
             result = 'pos' if pol_afin >= 4 else 'mixed'
         elif rating == 3 and pol_blob > 0.7:
             result = 'pos'
@@ -174,12 +242,12 @@ class Polarizer(object):
         elif rating == 2 and pol_blob < 0:
             result = 'neg'
         elif rating == 2 and pol_blob <= 0.175:
-            pol_afin = afinn.score(review_txt)
+            pol_afin = self.sentiment.afinn_score(sent_idxs)
             result = 'neg' if pol_afin < 0 else 'mixed'
         elif rating == 1 and pol_blob < 0:
             result = 'neg'
         elif rating == 1 and pol_blob <= 0.2:
-            pol_afin = afinn.score(review_txt)
+            pol_afin = self.sentiment.afinn_score(sent_idxs)
             result = 'neg' if pol_afin < 0 else 'mixed'
         else:
             result = 'mixed'
@@ -189,6 +257,43 @@ class Polarizer(object):
         self.aspect_dict[aspect][review]['pol_val'] = pol_blob
         self.aspect_pol_list[aspect][result].append(output)
 
+    def _polarity_batch(self, aspect_list):
+        '''
+        INPUT: list(str)
+        OUTPUT: None
+
+        Args:
+            aspect_list: aspects to score polarity on
+
+        Batch version of _polarity_class that scores the reviews of every
+        aspect in aspect_list at once with BatchScorer. Polarity scores can
+        differ slightly from TextBlob, see BatchScorer.
+        '''
+        scorer = shared_scorer()
+        rows = [(aspect, review) for aspect in aspect_list
+                for review in self.aspect_dict[aspect]]
+        blocks = [self.aspect_dict[aspect][review]['sent_idxs']
+                  for aspect, review in rows]
+
+        words = [self.sentiment.words(sent_idxs) for sent_idxs in blocks]
+        texts = [''.join(self.sentiment.text(s) for s in sent_idxs)
+                 for sent_idxs in blocks]
+        ratings = [self.aspect_dict[aspect][review]['rating']
+                   for aspect, review in rows]
+
+        pol_blobs = [round(pol, 3) for pol in scorer.blob_polarity(words)]
+        pol_afins = scorer.afinn_score(texts)
+        results = scorer.polarity_class(ratings, pol_blobs, pol_afins)
+
+        for (aspect, review), review_txt, pol_blob, result in \
+                zip(rows, texts, pol_blobs, results):
+            review_dict = self.aspect_dict[aspect][review]
+            output = (review_txt, review_dict['first_aspect_idx'],
+                      review_dict['rating'], review, pol_blob)
+
+            review_dict['pol_val'] = pol_blob
+            self.aspect_pol_list[aspect][str(result)].append(output)
+
     def _sort_polarity(self, aspect):
         '''
         INPUT: str
@@ -228,13 +333,13 @@ class Polarizer(object):
 
         self.aspect_pct[aspect] = [pos, mixed, neg]
 
-    def _top_aspects(self):
+    def _aspect_counts(self):
         '''
         INPUT: None
-        OUTPUT: None
+        OUTPUT: list(str), list(int)
 
-        Adds a list of the top aspects and a list of how frequently they appear
-        to the Polarizer object
+        Returns a list of unigram, bigram and trigram aspects, and a list of
+        how many reviews they appear in
         '''
         ug, bg, tg = self.unigramer, self.bigramer, self.trigramer
 
@@ -251,43 +356,243 @@ class Polarizer(object):
         aspects_rev_f.extend(bigrams_rev_f)
         aspects_rev_f.extend(trigrams_rev_f)
 
-        top_asps = sorted(zip(asps, aspects_rev_f), key=lambda x: x[1],
+        return asps, aspects_rev_f
+
+    def _top_aspects(self):
+        '''
+        INPUT: None
+        OUTPUT: None
+
+        Adds a list of the top aspects and a list of how frequently they appear
+        to the Polarizer object
+        '''
+        top_asps = sorted(zip(*self._aspect_counts()), key=lambda x: x[1],
                           reverse=True)
         top_asps = [[asp[0] for asp in top_asps], [asp[1] for asp in top_asps]]
 
         self.top_asps = top_asps
 
-    def polarize_aspects(self, corpus, aspect_list=None):
+    def aspect_freqs(self):
         '''
-        INPUT: ReviewSents, list(str)
-        OUTPUT: None
+        INPUT: None
+        OUTPUT: dict
+
+        Returns dictionary with aspect as key and number of reviews containing
+        aspect as value. Does not polarize any aspects.
+        '''
+        if self._freqs is None:
+            self._freqs = dict(zip(*self._aspect_counts()))
+
+        return self._freqs
+
+    def top_aspects(self, n=None):
+        '''
+        INPUT: int
+        OUTPUT: list
 
         Args:
-            aspect_list: list of aspects to pass through pipeline
+            n: number of aspects to return, all aspects if None
 
-        Master function of class that creates dictionary of polarity scores and
-        list of review text within respective polarity class for each aspect in
-        aspect_list
+        Returns top_asps for the n aspects that appear in the most reviews.
+        Uses a partial sort that keeps the order of top_asps for ties.
         '''
-        self.asin, self.name = corpus.asin, corpus.name
+        if n is None or self.top_asps:
+            if not self.top_asps:
+                self._top_aspects()
 
-        if not aspect_list:
-            self._top_aspects()
-            aspect_list = self.top_asps[0]
+            return [self.top_asps[0][:n], self.top_asps[1][:n]]
+
+        top_asps = heapq.nlargest(n, zip(*self._aspect_counts()),
+                                  key=lambda x: x[1])
+
+        return [[asp[0] for asp in top_asps], [asp[1] for asp in top_asps]]
+
+    def _polarize(self, tokens, aspect_list, batch):
+        '''
+        INPUT: TokenStore, list(str), bool
+        OUTPUT: None
+
+        Args:
+            tokens: TokenStore of the corpus
+            aspect_list: list of aspects to polarize
+            batch: whether to score all reviews at once with BatchScorer
 
+        Runs the polarity steps for each aspect in aspect_list in order
+        '''
         for aspect in aspect_list:
-            self._aspect_review_dict(corpus, aspect)
+            self._aspect_review_dict(tokens, aspect)
 
             self.aspect_pol_list[aspect]['pos'] = []
             self.aspect_pol_list[aspect]['mixed'] = []
             self.aspect_pol_list[aspect]['neg'] = []
 
-            for review in self.aspect_dict[aspect]:
-                self._polarity_class(aspect, review)
+            if not batch:
+                for review in self.aspect_dict[aspect]:
+                    self._polarity_class(aspect, review)
+
+        if batch:
+            self._polarity_batch(aspect_list)
 
+        for aspect in aspect_list:
             self._sort_polarity(aspect)
             self._get_pol_class_pct(aspect)
 
+    def _polarize_copy(self, tokens, aspect_list, batch):
+        '''
+        INPUT: TokenStore, list(str), bool
+        OUTPUT: list(tuple), tuple(int)
+
+        Args:
+            tokens: TokenStore of the corpus
+            aspect_list: list of aspects to polarize
+            batch: whether to score all reviews at once with BatchScorer
+
+        Polarizes aspects on a new Polarizer that shares the aspect miners and
+        sentiment cache. Returns (aspect, aspect_dict, aspect_pol_list,
+        aspect_pct, ratings) entries of each aspect, and the sentiment cache
+        counters added.
+        '''
+        worker = Polarizer(self.unigramer, self.bigramer, self.trigramer)
+        worker.sentiment = self.sentiment
+
+        counts = worker.sentiment.counts()
+        worker._polarize(tokens, aspect_list, batch)
+        counts = tuple(n - m for n, m in zip(worker.sentiment.counts(),
+                                             counts))
+
+        results = [(aspect, worker.aspect_dict[aspect],
+                    dict(worker.aspect_pol_list[aspect]),
+                    worker.aspect_pct[aspect], worker.ratings.get(aspect))
+                   for aspect in aspect_list]
+
+        return results, counts
+
+    def _merge(self, results, aspect_list):
+        '''
+        INPUT: list(tuple), list(str)
+        OUTPUT: None
+
+        Args:
+            results: entries returned by _polarize_copy
+            aspect_list: order to add aspects in
+
+        Adds polarized aspects to the results of the Polarizer object
+        '''
+        results = dict((result[0], result[1:]) for result in results)
+
+        for aspect in aspect_list:
+            review_dict, pol_list, pct, ratings = results[aspect]
+
+            self.aspect_dict[aspect] = review_dict
+            self.aspect_pol_list[aspect] = pol_list
+            self.aspect_pct[aspect] = pct
+
+            if ratings is not None:
+                self.ratings[aspect] = ratings
+
+    def _polarize_lazy(self, aspect):
+        '''
+        INPUT: str
+        OUTPUT: None
+
+        Args:
+            aspect: aspect to polarize
+
+        Polarizes an aspect of a lazy Polarizer
+        '''
+        results, _ = self._polarize_copy(self._tokens, [aspect], self._batch)
+        self._merge(results, [aspect])
+
+    def _polarize_parallel(self, tokens, aspect_list, batch, n_jobs, pool):
+        '''
+        INPUT: TokenStore, list(str), bool, int, str
+        OUTPUT: None
+
+        Args:
+            tokens: TokenStore of the corpus
+            aspect_list: list of aspects to polarize
+            batch: whether to score all reviews at once with BatchScorer
+            n_jobs: number of workers
+            pool: 'process' or 'thread'
+
+        Spreads aspects across a pool of workers and merges the results in
+        the order of aspect_list. Aspects are dealt out to the workers in
+        turn because aspect_list is sorted from most to least reviews.
+        '''
+        n_chunks = min(len(aspect_list), n_jobs * 4)
+        chunks = [aspect_list[i::n_chunks] for i in xrange(n_chunks)]
+
+        _pool_state.update(polarizer=self, tokens=tokens, batch=batch)
+        workers = Pool(n_jobs) if pool == 'process' else ThreadPool(n_jobs)
+
+        try:
+            chunk_results = workers.map(_polarize_chunk, chunks)
+        finally:
+            workers.terminate()
+            _pool_state.clear()
+
+        results = []
+
+        for chunk_result, counts in chunk_results:
+            if pool == 'process':
+                # worker processes update their own copy of the cache
+                self.sentiment.add_counts(counts)
+
+            results.extend(chunk_result)
+
+        self._merge(results, aspect_list)
+
+    def polarize_aspects(self, corpus, aspect_list=None, batch=False,
+                         n_jobs=1, pool='process', min_parallel=50,
+                         lazy=False):
+        '''
+        INPUT: ReviewSents, list(str), bool, int, str, int, bool
+        OUTPUT: None
+
+        Args:
+            aspect_list: list of aspects to pass through pipeline
+            batch: whether to score all reviews at once with BatchScorer
+                   instead of TextBlob and Afinn
+            n_jobs: number of workers used to polarize aspects
+            pool: 'process' for a pool of worker processes or 'thread' for a
+                  pool of threads
+            min_parallel: aspects are polarized serially if there are fewer
+                          aspects than this
+            lazy: whether to polarize each aspect only when its results are
+                  first looked up. aspect_list, n_jobs, pool and min_parallel
+                  are not used when lazy.
+
+        Master function of class that creates dictionary of polarity scores and
+        list of review text within respective polarity class for each aspect in
+        aspect_list
+        '''
+        if pool not in ('process', 'thread'):
+            raise ValueError("pool must be 'process' or 'thread'")
+
+        self.asin, self.name = corpus.asin, corpus.name
+        self.n_reviews = corpus.n_reviews
+        self.sentiment = SentimentCache(corpus.tokens.sent_text)
+
+        if lazy:
+            self.lazy = True
+            self._batch, self._tokens = batch, corpus.tokens
+
+            self.aspect_dict = LazyAspectDict(self)
+            self.aspect_pct = LazyAspectDict(self)
+            self.aspect_pol_list = LazyAspectDict(self, dict)
+            self.ratings = LazyAspectDict(self, list)
+            return
+
+        if not aspect_list:
+            self._top_aspects()
+            aspect_list = self.top_asps[0]
+
+        if n_jobs > 1 and len(aspect_list) >= min_parallel:
+            self._polarize_parallel(corpus.tokens, aspect_list, batch, n_jobs,
+                                    pool)
+        else:
+            self._polarize(corpus.tokens, aspect_list, batch)
+
     def print_polarity(self, aspect, max_txt_len=80, lines_pos=0,
                        lines_mixed=0, lines_neg=0, printing=True):
         '''
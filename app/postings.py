@@ -0,0 +1,121 @@
+'''
+This script contains the PostingList class used by the Unigramer, Bigramer and
+Trigramer classes in parsers.py to store the review and sentence indexes that
+an aspect appears in.
+'''
+
+import numpy as np
+
+
+class PostingList(object):
+    '''
+    Sorted array of unique integer indexes with set operations. Membership
+    checks use binary search and set operations run on numpy arrays, so the
+    memory used is a fixed 4 bytes per index.
+    '''
+    __hash__ = None
+
+    def __init__(self, ids=()):
+        '''
+        INPUT: iterable(int)
+        OUTPUT: None
+
+        Args:
+            ids: indexes to store (duplicates are removed)
+
+        Attributes:
+            ids (np.array): sorted array of unique indexes
+        '''
+        if isinstance(ids, PostingList):
+            self.ids = ids.ids
+            return
+
+        if isinstance(ids, (set, frozenset)):
+            ids = list(ids)
+
+        self.ids = np.unique(np.asarray(ids, dtype=np.int32))
+
+    @classmethod
+    def _wrap(cls, ids):
+        '''
+        INPUT: np.array
+        OUTPUT: PostingList
+
+        Args:
+            ids: array that is already sorted and unique
+
+        Creates a PostingList without sorting the indexes again
+        '''
+        posting = cls.__new__(cls)
+        posting.ids = ids
+
+        return posting
+
+    def __array__(self, dtype=None):
+        return self.ids if dtype is None else self.ids.astype(dtype)
+
+    def __contains__(self, idx):
+        i = np.searchsorted(self.ids, idx)
+        return i < self.ids.shape[0] and self.ids[i] == idx
+
+    def __eq__(self, other):
+        if not isinstance(other, PostingList):
+            other = PostingList(other)
+
+        return np.array_equal(self.ids, other.ids)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, long, np.integer)):
+            return int(self.ids[key])
+
+        return PostingList._wrap(self.ids[key])
+
+    def __iter__(self):
+        return iter(self.ids.tolist())
+
+    def __len__(self):
+        return self.ids.shape[0]
+
+    def __nonzero__(self):
+        return self.ids.shape[0] > 0
+
+    def __repr__(self):
+        return 'PostingList({})'.format(self.ids.tolist())
+
+    def __and__(self, other):
+        ids = np.intersect1d(self.ids, PostingList(other).ids,
+                             assume_unique=True)
+        return PostingList._wrap(ids)
+
+    def __or__(self, other):
+        ids = np.union1d(self.ids, PostingList(other).ids)
+        return PostingList._wrap(ids)
+
+    def __sub__(self, other):
+        ids = np.setdiff1d(self.ids, PostingList(other).ids,
+                           assume_unique=True)
+        return PostingList._wrap(ids)
+
+    def isin(self, other):
+        '''
+        INPUT: PostingList
+        OUTPUT: np.array(bool)
+
+        Args:
+            other: PostingList to check against
+
+        Returns boolean array of which indexes are also in other
+        '''
+        return np.in1d(self.ids, PostingList(other).ids, assume_unique=True)
+
+    def tolist(self):
+        '''
+        INPUT: None
+        OUTPUT: list(int)
+
+        Returns indexes as a list
+        '''
+        return self.ids.tolist()
@@ -0,0 +1,265 @@
+'''
+This script contains the storage of review records in the review_data
+collection of MongoDB, used by the Loader class in scraper.py, sample_data.py
+and app.py. One pooled MongoClient is shared within each process and reviews
+are written with ordered bulk upserts, so that storing a product costs one
+round trip to the server per batch instead of one per review. Single reviews
+are looked up through the (asin, review_idx) index and a least recently used
+cache of the reviews shown on the full review page.
+'''
+
+from collections import OrderedDict
+from pymongo import MongoClient, UpdateOne
+import os
+import threading
+import time
+
+# compound index used to look up a single review
+INDEX_KEYS = [('asin', 1), ('review_idx', 1)]
+
+# fields of a review shown on the full review page
+REVIEW_FIELDS = ['author', 'headline', 'rating', 'review']
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def shared_mongo():
+    '''
+    INPUT: None
+    OUTPUT: MongoClient
+
+    Returns a MongoClient shared within the process. A MongoClient keeps its
+    own connection pool and can be used from many threads, but not across a
+    fork, so a process forked after the client was made gets a new one.
+    '''
+    global _client, _client_pid
+
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = MongoClient()
+            _client_pid = os.getpid()
+
+    return _client
+
+
+def review_id(asin, review_idx):
+    '''
+    INPUT: str, int
+    OUTPUT: str
+
+    Returns the _id of a review document
+    '''
+    return '{}_{}'.format(asin, review_idx)
+
+
+class ReviewStore(object):
+    '''
+    Writes review documents to the review_data collection in ordered bulk
+    upserts of batch_size documents, and looks up single reviews. Documents
+    are buffered by add and sent when the buffer is full or on flush. Looked
+    up reviews are kept in a least recently used cache of cache_size reviews.
+    '''
+
+    def __init__(self, collection=None, batch_size=100, cache_size=1000):
+        '''
+        INPUT: pymongo.collection.Collection, int, int
+        OUTPUT: None
+
+        Args:
+            collection: collection to store reviews in, defaults to the
+                        review_data collection of the ars database
+            batch_size: number of documents written per round trip
+            cache_size: maximum number of looked up reviews kept in memory
+
+        Attributes:
+            batch_size (int):        number of documents written per batch
+            batches (int):           number of batches written
+            cache_size (int):        maximum number of cached reviews
+            collection (Collection): collection reviews are stored in
+            documents (int):         number of documents written
+            elapsed (float):         total seconds spent writing batches
+            evictions (int):         number of reviews removed from cache
+            hits (int):              number of lookups found in cache
+            max_latency (float):     seconds of the slowest batch
+            misses (int):            number of lookups not found in cache
+        '''
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+
+        if collection is None:
+            collection = shared_mongo()['ars']['review_data']
+
+        self.batch_size = batch_size
+        self.batches = 0
+        self.cache_size = cache_size
+        self.collection = collection
+        self.documents = 0
+        self.elapsed = 0.
+        self.evictions = 0
+        self.hits = 0
+        self.max_latency = 0.
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._pending = []
+
+    def ensure_index(self):
+        '''
+        INPUT: None
+        OUTPUT: str
+
+        Creates the (asin, review_idx) index if it does not exist and checks
+        that the collection has it. Returns the name of the index.
+        '''
+        name = self.collection.create_index(INDEX_KEYS)
+        indexes = self.collection.index_information()
+
+        fields = [field for field, _ in indexes.get(name, {}).get('key', [])]
+
+        if fields != [field for field, _ in INDEX_KEYS]:
+            raise RuntimeError("{} has no (asin, review_idx) index"
+                               .format(self.collection.name))
+
+        return name
+
+    def add(self, doc):
+        '''
+        INPUT: dict
+        OUTPUT: None
+
+        Args:
+            doc: review document with asin and review_idx keys
+
+        Buffers a review document and writes the buffer once it holds
+        batch_size documents
+        '''
+        self._pending.append(doc)
+
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def put_many(self, docs):
+        '''
+        INPUT: iterable(dict)
+        OUTPUT: None
+
+        Args:
+            docs: review documents with asin and review_idx keys
+
+        Writes review documents in batches, including the last partial batch
+        '''
+        for doc in docs:
+            self.add(doc)
+
+        self.flush()
+
+    def flush(self):
+        '''
+        INPUT: None
+        OUTPUT: None
+
+        Writes the buffered documents in one ordered bulk upsert
+        '''
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        self.invalidate(doc['asin'] for doc in batch)
+
+        requests = [UpdateOne({'_id': review_id(doc['asin'],
+                                                doc['review_idx'])},
+                              {'$set': doc}, upsert=True)
+                    for doc in batch]
+
+        start = time.time()
+        self.collection.bulk_write(requests, ordered=True)
+        latency = time.time() - start
+
+        self.batches += 1
+        self.documents += len(batch)
+        self.elapsed += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def get(self, asin, review_idx):
+        '''
+        INPUT: str, int
+        OUTPUT: dict
+
+        Args:
+            asin: asin identifier for Amazon product
+            review_idx: index of the review within the product
+
+        Returns dictionary with the author, headline, rating and review of a
+        review, or None if there is no such review. Only those fields are
+        fetched, through the (asin, review_idx) index.
+        '''
+        key = (asin, review_idx)
+
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache[key] = self._cache.pop(key)
+                self.hits += 1
+                return self._cache[key]
+
+            self.misses += 1
+
+        projection = dict((field, True) for field in REVIEW_FIELDS)
+        projection['_id'] = False
+        review = self.collection.find_one(
+            {'asin': asin, 'review_idx': review_idx}, projection)
+
+        if review is None or not self.cache_size:
+            return review
+
+        with self._cache_lock:
+            self._cache[key] = review
+
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+                self.evictions += 1
+
+        return review
+
+    def invalidate(self, asins):
+        '''
+        INPUT: iterable(str)
+        OUTPUT: None
+
+        Args:
+            asins: asin identifiers of products whose reviews were rewritten
+
+        Removes the cached reviews of products
+        '''
+        asins = set(asins)
+
+        with self._cache_lock:
+            for key in [key for key in self._cache if key[0] in asins]:
+                del self._cache[key]
+
+    def cache_stats(self):
+        '''
+        INPUT: None
+        OUTPUT: dict
+
+        Returns dictionary of lookup cache counters
+        '''
+        lookups = self.hits + self.misses
+
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / float(lookups) if lookups else 0.,
+                'evictions': self.evictions, 'reviews': len(self._cache)}
+
+    def stats(self):
+        '''
+        INPUT: None
+        OUTPUT: dict
+
+        Returns dictionary of write counters and latencies
+        '''
+        return {'batches': self.batches, 'documents': self.documents,
+                'elapsed': self.elapsed,
+                'mean_latency': self.elapsed / self.batches
+                if self.batches else 0.,
+                'max_latency': self.max_latency}
@@ -1,26 +1,27 @@
 '''
 Adds sample data from the sample_results.html page to MongoDB.
 '''
-from pymongo import MongoClient
+from review_store import ReviewStore
 import cPickle
 
 
-def store_sample_data():
+def store_sample_data(batch_size=100):
     '''
-    Opens up the sample_data.pkl file and stores data into MongoDB
+    Opens up the sample_data.pkl file and stores data into MongoDB in bulk
+    upserts of batch_size reviews. Returns the write stats of the ReviewStore.
     '''
-    client = MongoClient()
-    db = client['ars']
-    tab = db['review_data']
+    store = ReviewStore(batch_size=batch_size)
 
     with open('../data/sample_data.pkl', 'rb') as f:
         sample_data = cPickle.load(f)
 
     for asin in sample_data:
         for i, (auth, head, rate, revw) in enumerate(zip(*sample_data[asin])):
-            _id = '{}_{}'.format(asin, i)
-
             data = {'asin': asin, 'review_idx': i, 'rating': rate,
                     'review': revw, 'author': auth, 'headline': head}
 
-            tab.update_one({'_id': _id}, {'$set': data}, upsert=True)
+            store.add(data)
+
+    store.flush()
+
+    return store.stats()
@@ -4,14 +4,37 @@ HTML files offline, stores review data into mongodb, and creates Loader objects
 for use with the SentCustomProperties class of functions in parsers.py
 '''
 
+from amazon_crawler import crawl, crawl_delta
 from bs4 import BeautifulSoup
-from pymongo import MongoClient
-import math
+from crawl_manifest import CrawlManifest
+from extractors import get_extractor
+from multiprocessing import Pool
+from page_store import PageStore
+from review_store import ReviewStore
+from Queue import Queue
+import hashlib
 import os
 import re
+import threading
 import time
 
 
+def _extract_page(item):
+    '''
+    INPUT: tuple(str, str, unicode)
+    OUTPUT: tuple(str, list(dict))
+
+    Args:
+        item: label of the page, name of the extraction engine and html of
+              the page
+
+    Pool worker that extracts the reviews of one page. Returns the label of
+    the page and its review records.
+    '''
+    label, engine, html = item
+    return label, get_extractor(engine)(html)
+
+
 class Loader(object):
     '''
     Class for scraping a review site on Amazon. Stores html files locally
@@ -25,17 +48,28 @@ class Loader(object):
         Attributes:
             authors (list): list of strings or review authors
             asin (str): asin identifier for Amazon product
+            crawl_result (dict): result of the last crawl of the product from
+                                 amazon_crawler.crawl
             headlines (list): list of strings of review headlines
             name (str): custom name for Amazon product
+            new_reviews (list): review documents added by the last refresh
             ratings (list): list of ints of review ratings
             reviews (list): list of strings of review text
+            stream_stats (dict): timings of the last stream of the product,
+                                 see stream
             url (str): url of the amazon link to scrape (required for scraping)
+            write_stats (dict): write counters and latencies of the last
+                                extraction from ReviewStore.stats
         '''
         self.asin = None
+        self.crawl_result = None
         self.name = name
+        self.new_reviews = None
         self.ratings = None
         self.reviews = None
+        self.stream_stats = None
         self.url = url
+        self.write_stats = None
 
     def _get_id(self, url):
         '''
@@ -63,6 +97,12 @@ class Loader(object):
         Deletes folder with preexisting review html data for asin
         '''
         path = os.getcwd() + '/reviews/com/{}/'.format(self.asin)
+
+        if os.path.isdir(path + 'delta'):
+            for file_ in os.listdir(path + 'delta'):
+                os.remove(path + 'delta/' + file_)
+            os.rmdir(path + 'delta')
+
         pages = [file_ for file_ in os.listdir(path)]
 
         try:
@@ -76,30 +116,198 @@ class Loader(object):
         except:
             print 'No folder to delete!'
 
-    def _get_html_count(self, folder):
+    def fingerprint(self, asin=None):
         '''
         INPUT: str
-        OUTPUT: int
+        OUTPUT: str
 
         Args:
-            folder: path of folder to check count of html files
+            asin: asin identifier for Amazon product
 
-        Returns a count of the number of html files inside specified folder
+        Returns a hash of the html files and page stores scraped for the
+        product, or None if the product has not been scraped. The hash changes
+        whenever pages are added, removed or scraped again, including pages
+        of delta crawls.
         '''
-        return len([htm for htm in os.listdir(folder) if htm[-4:] == 'html'])
+        if asin:
+            self.asin = asin
 
-    def scrape(self, n_reviews=300, delete=False, retries=0):
+        path = os.getcwd() + '/reviews/com/{}/'.format(self.asin)
+
+        if not os.path.isdir(path):
+            return None
+
+        stores = [PageStore.data_name, PageStore.index_name]
+        pages = sorted(file_ for file_ in os.listdir(path)
+                       if file_[-5:] == '.html' or file_ in stores)
+        pages += ['delta/' + file_ for file_ in stores
+                  if os.path.exists(path + 'delta/' + file_)]
+        sha = hashlib.sha1()
+
+        for page in pages:
+            sha.update(page)
+
+            with open(path + page, 'rb') as f:
+                sha.update(f.read())
+
+        return sha.hexdigest()
+
+    def _read_pages(self, path):
         '''
-        INPUT: int, bool, int
-        OUTPUT: None
+        INPUT: str
+        OUTPUT: generator
+
+        Args:
+            path: folder of the review pages of the product
+
+        Yields a label and the html of every scraped review page. Pages of
+        the page store and the html files of crawls made without it come
+        first in page order, followed by the pages of delta crawls in the
+        order they were crawled.
+        '''
+        store = PageStore(path)
+        stored = dict(store.items()) if len(store) else dict()
+        files = dict((int(file_[:-5].split('_')[-1]), file_)
+                     for file_ in os.listdir(path) if file_[-5:] == '.html')
+
+        for page in sorted(set(stored) | set(files)):
+            if page in stored:
+                yield 'page {}'.format(page), stored[page]
+                continue
+
+            with open(path + files[page], 'r') as f:
+                yield files[page], f.read()
+
+        delta = PageStore(path + 'delta/')
+
+        if len(delta):
+            for page, html in delta.items():
+                yield 'delta page {}'.format(page), html
+
+    def _read_page(self, path, page):
+        '''
+        INPUT: str, int
+        OUTPUT: tuple(str, unicode)
+
+        Args:
+            path: folder of the review pages of the product
+            page: page number
+
+        Returns the label and the html of a scraped review page, with the
+        labels of _read_pages
+        '''
+        f = path + '{}_{}.html'.format(self.asin, page)
+
+        if os.path.exists(f):
+            with open(f, 'r') as html:
+                return os.path.basename(f), html.read()
+
+        return 'page {}'.format(page), PageStore(path).get(page)
+
+    def _product_name(self, path):
+        '''
+        INPUT: str
+        OUTPUT: str
+
+        Args:
+            path: folder of the review pages of the product
+
+        Returns the name of the product from its page store, or from its
+        first html page for crawls made without the page store
+        '''
+        if PageStore.exists(path) and PageStore(path).name:
+            return PageStore(path).name
+
+        try:
+            with open(path + '{}_1.html'.format(self.asin), 'r') as html:
+                soup = BeautifulSoup(html, 'html.parser')
+
+            return soup.select('.a-link-normal')[0].text
+        except:
+            raise RuntimeError("Invalid HTML code")
+
+    def _extract_pages(self, pages, n_jobs):
+        '''
+        INPUT: generator, int
+        OUTPUT: generator
+
+        Args:
+            pages: (label, engine, html) of every page in page order
+            n_jobs: number of worker processes used for extraction
+
+        Yields the label and review records of every page in the order of
+        pages
+        '''
+        if n_jobs == 1:
+            for item in pages:
+                yield _extract_page(item)
+            return
+
+        pages = list(pages)
+        pool = Pool(n_jobs)
+
+        try:
+            for label, records in pool.imap(
+                    _extract_page, pages,
+                    max(1, len(pages) // (n_jobs * 4))):
+                yield label, records
+        finally:
+            pool.terminate()
+
+    def _records(self, path, engine='soup', n_jobs=1):
+        '''
+        INPUT: str, str, int
+        OUTPUT: generator
+
+        Args:
+            path: folder of the review pages of the product
+            engine: name of the extraction engine in extractors.py
+            n_jobs: number of worker processes used for extraction
+
+        Yields the label and review records of every page from _read_pages,
+        or None in place of the records of a page without reviews. Reviews
+        already seen on earlier pages, because the listing moved while it was
+        crawled or because a delta crawl reached stored reviews, are dropped
+        so that every review is counted once.
+        '''
+        pages = ((label, engine, html)
+                 for label, html in self._read_pages(path))
+        seen = set()
+
+        for label, records in self._extract_pages(pages, n_jobs):
+            if not records:
+                yield label, None
+                continue
+
+            records = [record for record in records
+                       if record['review_id'] not in seen or
+                       record['review_id'] is None]
+            seen.update(record['review_id'] for record in records)
+
+            yield label, records
+
+    def scrape(self, n_reviews=300, delete=False, workers=4, progress=None,
+               timeout=600):
+        '''
+        INPUT: int, bool, int, function, float
+        OUTPUT: dict
 
         Args:
             n_reviews: number of reviews to scrape
             delete: option to force delete folder containing cached reviews
-            retries: current count of scraper function retries
+            workers: number of review pages downloaded concurrently
+            progress: function called with a dictionary describing each
+                      downloaded page, see amazon_crawler.crawl
+            timeout: maximum seconds to wait for a crawl of the product that
+                     is running in the background
 
         Scrapes n most helpful amazon reviews and extracts reviews.
-        If already scraped, extracts reviews.
+        If already scraped, extracts reviews. Whether earlier scraping is
+        complete is read from the CrawlManifest in the review folder, and an
+        incomplete crawl is resumed. Stored pages are kept when the crawls
+        keep failing, and RuntimeError is only raised if pages needed for
+        n_reviews are still missing. Returns the result of the last crawl
+        from amazon_crawler.crawl, or None if no crawl was needed.
         '''
         try:
             self._get_id(self.url)
@@ -111,143 +319,327 @@ class Loader(object):
         if delete:
             self._delete()
 
-        if 'amazon_crawler.py' in os.listdir(os.getcwd()):
-            cmd = 'python amazon_crawler.py'
-        elif 'amazon_crawler.py' in os.listdir(os.getcwd() + '/scripts'):
-            cmd = 'python scripts/amazon_crawler.py'
-        else:
-            raise RuntimeError("Put amazon_crawler.py in same folder as "
-                               "current working directory or inside scripts"
-                               "folder.")
-
-        if not os.path.isdir(folder):
-            # Run Amazon scraper
-            # Credit to Andrea Esuli
-            # https://github.com/aesuli/amadown2py
-            try:
-                os.system('{} -d com {} -m {} -o reviews'
-                          .format(cmd, self.asin, n_reviews))
-                last_page = self._get_html_count(folder)
-            except NameError:
-                raise RuntimeError("Invalid ASIN")
-        else:
-            # Check to see if number of html files is sufficient
-            new_files = True
-            rev_cnt_tag = "a-size-medium totalReviewCount"
+        self.crawl_result = None
+        manifest = CrawlManifest.load(folder)
+        retries = 0
 
-            with open('{}/{}_1.html'.format(folder, self.asin), 'r') as f:
-                soup = BeautifulSoup(f, 'html.parser')
+        if manifest and manifest.running():
+            # Wait for background scraping to complete
+            manifest = CrawlManifest.wait(folder, timeout)
 
-            tag = soup.find("span", {"class": rev_cnt_tag})
-            reviews = int(tag.text.replace(',', ''))
-            expected_pages = min(int(math.ceil(n_reviews / 10.)),
-                                 int(math.ceil(reviews / 10.)))
+        while not manifest or not manifest.ready(n_reviews):
+            if retries > 5:
+                if manifest and not manifest.missing_pages(n_reviews):
+                    break
 
-            last_page = self._get_html_count(folder)
+                raise RuntimeError("Scraping Failed! {} pages needed for {} "
+                                   "reviews are missing".format(
+                                       len(manifest.missing_pages(n_reviews))
+                                       if manifest else 'All', n_reviews))
 
-            while last_page != expected_pages and new_files:
-                # Wait for background scraping to complete
-                time.sleep(10)
-                old_count = last_page
-                last_page = self._get_html_count(folder)
-
-                if old_count == last_page:
-                    # No background scraping
-                    new_files = False
-
-            if last_page != expected_pages and not new_files:
-                # Not enough files, delete files and force rescrape in the
-                # next while loop
-                last_page = 1
+            # Run Amazon scraper, pages that are already stored are skipped
+            # Credit to Andrea Esuli
+            # https://github.com/aesuli/amadown2py
+            result = crawl([self.asin], domain='com', out='reviews',
+                           maxreviews=n_reviews, workers=workers,
+                           progress=progress)[self.asin]
+            self.crawl_result = result
+            retries += 1
 
-        if retries > 0:
-            return retries, last_page
+            if result['codes'].get(1) == 404:
+                raise RuntimeError("Invalid ASIN")
 
-        while last_page == 1 and retries < 5:
-            retries += 1
-            retries, last_page = self.scrape(n_reviews, delete=True,
-                                             retries=retries)
+            manifest = CrawlManifest.load(folder)
 
-        if last_page == 1 and retries == 5:
-            self._delete()
-            raise RuntimeError("Scraping Failed!")
+        return self.crawl_result
 
-    def extract(self, asin=None):
+    def extract(self, asin=None, engine='soup', n_jobs=1, batch_size=100,
+                store=None):
         '''
-        INPUT: str
+        INPUT: str, str, int, int, ReviewStore
         OUTPUT: None
 
         Args:
             asin: asin identifier for Amazon product (only input as argument
                   if scraping is done seperately from extraction)
+            engine: name of the extraction engine in extractors.py, the
+                    reference BeautifulSoup engine 'soup' or the faster
+                    'regex'
+            n_jobs: number of worker processes used for extraction
+            batch_size: number of reviews written to MongoDB per round trip
+            store: ReviewStore to write the reviews to, defaults to one
+                   writing to the review_data collection
 
         Extracts the star rating, review text, author name, and review headline
         from directory of amazon html files and stores to MongoDB. Full lists
         of rating and review data are stored as lists in the Loader object.
+        Pages are read in page order, so review_idx numbers the reviews in the
+        order Amazon lists them whatever the number of workers. Reviews found
+        by refresh are numbered after them.
         '''
-        client = MongoClient()
-        db = client['ars']
-        tab = db['review_data']
+        # fail before reading any page if the engine is unknown
+        get_extractor(engine)
+        store = store or ReviewStore(batch_size=batch_size)
         index = 0
 
         if asin:
             self.asin = asin
 
-        if not self.name:
-            f = os.getcwd() + '/reviews/com/{0}/{0}_1.html'.format(self.asin)
+        path = os.getcwd() + '/reviews/com/{}/'.format(self.asin)
+        self.name = self.name or self._product_name(path)
 
-            with open(f, 'r') as html:
-                soup = BeautifulSoup(html, 'html.parser')
+        ratings, reviews = [], []
 
-            try:
-                self.name = soup.select('.a-link-normal')[0].text
-            except:
-                raise RuntimeError("Invalid HTML code")
+        for page, records in self._records(path, engine, n_jobs):
+            if records is None:
+                print '{} is an invalid page format for scraping' \
+                    .format(page)
+                continue
+
+            for record in records:
+                ratings.append(record['rating'])
+                reviews.append(record['review'])
+
+                data = {'asin': self.asin, 'review_idx': index}
+                data.update(record)
+
+                store.add(data)
+
+                index += 1
+
+        store.flush()
+
+        self.ratings, self.reviews = ratings, reviews
+        self.write_stats = store.stats()
+        return self
+
+    def stream(self, n_reviews=300, delete=False, engine='soup', workers=4,
+               batch_size=100, queue_size=10, progress=None, timeout=600,
+               store=None):
+        '''
+        INPUT: int, bool, str, int, int, int, function, float, ReviewStore
+        OUTPUT: generator
+
+        Args:
+            n_reviews: number of reviews to scrape
+            delete: option to force delete folder containing cached reviews
+            engine: name of the extraction engine in extractors.py
+            workers: number of review pages downloaded concurrently
+            batch_size: number of reviews written to MongoDB per round trip
+            queue_size: maximum number of downloaded pages waiting to be
+                        extracted before the crawl waits for extraction
+            progress: function called with the progress events of the crawl
+            timeout: maximum seconds to wait for a crawl of the product that
+                     is running in the background
+            store: ReviewStore to write the reviews to, defaults to one
+                   writing to the review_data collection
+
+        Scrapes and extracts the product at the same time. The crawl of scrape
+        runs in a background thread, and every page is extracted as soon as
+        it and the pages before it are downloaded, so that the reviews of
+        page N can be parsed while page N + 1 downloads. Yields the rating
+        and the review text of every review in the order of extract, and
+        stores the reviews to MongoDB. Once the stream is exhausted, the
+        Loader holds the same data as after scrape and extract, and
+        stream_stats holds the seconds until the first page was extracted
+        and until the crawl ended.
+        '''
+        extract_reviews = get_extractor(engine)
+        store = store or ReviewStore(batch_size=batch_size)
+
+        try:
+            self._get_id(self.url)
+        except:
+            raise RuntimeError("Cannot find asin from the url.")
 
         path = os.getcwd() + '/reviews/com/{}/'.format(self.asin)
-        pages = [file_ for file_ in os.listdir(path) if file_[-5:] == '.html']
-        ratings, reviews = [], []
+        start = time.time()
+        pages = Queue(queue_size)
+        closed = threading.Event()
+        errors = []
+        stats = {'crawled': None, 'elapsed': None, 'first_page': None,
+                 'pages': 0, 'reviews': 0}
+
+        def crawled(event):
+            if progress:
+                progress(event)
+            if event['event'] in ('fetched', 'skipped') and \
+                    not closed.is_set():
+                pages.put(event['page'])
+
+        def crawler():
+            try:
+                self.scrape(n_reviews, delete, workers, crawled, timeout)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                stats['crawled'] = time.time() - start
+                pages.put(None)
 
-        for page in pages:
-            with open(path + page, 'r') as f:
-                soup = BeautifulSoup(f, 'html.parser')
-                tags = soup.findAll("div", {"class": "a-section review"})
+        thread = threading.Thread(target=crawler)
+        thread.daemon = True
+        thread.start()
 
-                if not tags:
-                    print '{} is an invalid page format for scraping' \
-                        .format(page)
-                    continue
+        ratings, reviews, done, seen = [], [], set(), set()
 
-                for tag in tags:
-                    _id = "{}_{}".format(self.asin, index)
-                    r_class = "a-size-base review-text"
-                    a_class = "a-size-base a-link-normal author"
-                    h_class = "a-size-base a-link-normal review-title " \
-                        "a-color-base a-text-bold"
+        def records(label, page_records):
+            # same filter as _records, so extract numbers the reviews the same
+            done.add(label)
 
-                    rating = int(tag.find('i').text[0])
-                    review = tag.findAll("span", {"class": r_class})[0].text
+            if not page_records:
+                print '{} is an invalid page format for scraping' \
+                    .format(label)
+                return []
 
-                    try:
-                        author = tag.findAll("a", {"class": a_class})[0].text
-                    except:
-                        author = "Anonymous"
-                    try:
-                        headline = tag.findAll("a", {"class": h_class})[0].text
-                    except:
-                        headline = "No headline"
+            page_records = [record for record in page_records
+                            if record['review_id'] not in seen or
+                            record['review_id'] is None]
+            seen.update(record['review_id'] for record in page_records)
 
-                    ratings.append(rating)
-                    reviews.append(review)
+            for record in page_records:
+                data = {'asin': self.asin, 'review_idx': len(reviews)}
+                data.update(record)
+                store.add(data)
 
-                    data = {'asin': self.asin, 'review_idx': index,
-                            'rating': rating, 'review': review,
-                            'author': author, 'headline': headline}
+                ratings.append(record['rating'])
+                reviews.append(record['review'])
 
-                    tab.update_one({'_id': _id}, {'$set': data},
-                                   upsert=True)
+            stats['pages'] += 1
+
+            if stats['first_page'] is None:
+                stats['first_page'] = time.time() - start
+
+            return page_records
+
+        try:
+            ready, next_page = set(), 1
 
-                    index += 1
+            # pages are downloaded out of order, extract them in page order
+            for page in iter(pages.get, None):
+                ready.add(page)
 
+                while next_page in ready:
+                    label, html = self._read_page(path, next_page)
+                    next_page += 1
+
+                    for record in records(label, extract_reviews(html)):
+                        yield record['rating'], record['review']
+
+            thread.join()
+
+            if errors:
+                raise errors[0]
+
+            # pages of earlier crawls that the crawl did not report
+            for label, page_records in self._records(path, engine):
+                if label in done:
+                    continue
+
+                for record in records(label, page_records):
+                    yield record['rating'], record['review']
+        finally:
+            # a crawl that is still running must not wait for a full queue
+            closed.set()
+
+            while not pages.empty():
+                pages.get_nowait()
+
+        store.flush()
+
+        stats['elapsed'] = time.time() - start
+        stats['reviews'] = len(reviews)
+
+        self.name = self.name or self._product_name(path)
         self.ratings, self.reviews = ratings, reviews
+        self.stream_stats = stats
+        self.write_stats = store.stats()
+
+    def refresh(self, asin=None, engine='soup', max_pages=10,
+                batch_size=100, progress=None, store=None):
+        '''
+        INPUT: str, str, int, int, function, ReviewStore
+        OUTPUT: Loader
+
+        Args:
+            asin: asin identifier for Amazon product (only input as argument
+                  if scraping is done seperately from extraction)
+            engine: name of the extraction engine in extractors.py
+            max_pages: maximum number of pages of new reviews to download,
+                       None for all
+            batch_size: number of reviews written to MongoDB per round trip
+            progress: function called with the progress events of the crawl
+            store: ReviewStore to write the new reviews to, defaults to one
+                   writing to the review_data collection
+
+        Downloads only the reviews posted since the product was scraped. The
+        most recent review pages are crawled until a page reaches a review
+        that is already stored or the newest review seen by the last refresh.
+        Only the new reviews are written to MongoDB, numbered after the
+        stored reviews, and kept in new_reviews. Stored reviews are read from
+        the scraped pages, so the product must have been scraped before.
+        '''
+        extract_reviews = get_extractor(engine)
+
+        if asin:
+            self.asin = asin
+
+        folder = os.getcwd() + '/reviews/com/' + self.asin
+        manifest = CrawlManifest.load(folder)
+
+        if manifest and manifest.running():
+            # Wait for background scraping to complete
+            manifest = CrawlManifest.wait(folder)
+
+        if not manifest or not manifest.completed_pages:
+            raise RuntimeError("Product has not been scraped")
+
+        known, n_known = set(), 0
+
+        for _, records in self._records(folder + '/', engine):
+            for record in records or []:
+                known.add(record['review_id'])
+                n_known += 1
+
+        newest = manifest.newest_review
+
+        def reached(htmlpage):
+            ids = set(record['review_id']
+                      for record in extract_reviews(htmlpage)) - set([None])
+            return newest in ids or bool(ids & known)
+
+        result = crawl_delta(self.asin, reached, domain='com', out='reviews',
+                             maxpages=max_pages, progress=progress)
+        self.crawl_result = result
+
+        if result['status'] != 'complete':
+            raise RuntimeError("Refresh Failed!")
+
+        delta = PageStore(folder + '/delta/')
+        docs = []
+
+        # same filter as _records, so extract numbers the reviews the same
+        for page in result['stored']:
+            records = [record for record in extract_reviews(delta.get(page))
+                       if record['review_id'] not in known or
+                       record['review_id'] is None]
+            known.update(record['review_id'] for record in records)
+
+            for record in records:
+                data = {'asin': self.asin, 'review_idx': n_known + len(docs)}
+                data.update(record)
+                docs.append(data)
+
+        store = store or ReviewStore(batch_size=batch_size)
+        store.put_many(docs)
+
+        if result['stored']:
+            records = extract_reviews(delta.get(result['stored'][0]))
+
+            if records and records[0]['review_id']:
+                manifest = CrawlManifest.load(folder)
+                manifest.newest_review = records[0]['review_id']
+                manifest.save()
+
+        self.new_reviews = docs
+        self.write_stats = store.stats()
         return self
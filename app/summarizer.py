@@ -28,17 +28,17 @@ def common_features(polarizer1, polarizer2, min_pct=0.03, n=10, printing=True):
     Results of output are sorted by f1 score like calculation using the
     frequencies the aspect appears in product1 and product2
     '''
-    unigramer1, unigramer2 = polarizer1.unigramer, polarizer2.unigramer
+    top_asps1, top_asps2 = polarizer1.top_aspects(), polarizer2.top_aspects()
 
-    df1 = pd.concat([pd.Series(polarizer1.top_asps[0], name='aspect'),
-                     pd.Series(polarizer1.top_asps[1], name='freq')], axis=1)
-    df2 = pd.concat([pd.Series(polarizer2.top_asps[0], name='aspect'),
-                     pd.Series(polarizer2.top_asps[1], name='freq')], axis=1)
+    df1 = pd.concat([pd.Series(top_asps1[0], name='aspect'),
+                     pd.Series(top_asps1[1], name='freq')], axis=1)
+    df2 = pd.concat([pd.Series(top_asps2[0], name='aspect'),
+                     pd.Series(top_asps2[1], name='freq')], axis=1)
 
     comm_aspects = pd.merge(df1, df2, on='aspect', suffixes=('1', '2'))
 
-    comm_aspects['pct1'] = comm_aspects['freq1'] / unigramer1.n_reviews
-    comm_aspects['pct2'] = comm_aspects['freq2'] / unigramer2.n_reviews
+    comm_aspects['pct1'] = comm_aspects['freq1'] / polarizer1.n_reviews
+    comm_aspects['pct2'] = comm_aspects['freq2'] / polarizer2.n_reviews
 
     comm_aspects = comm_aspects[(comm_aspects['pct1'] >= min_pct) &
                                 (comm_aspects['pct2'] >= min_pct)]
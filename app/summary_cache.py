@@ -0,0 +1,262 @@
+'''
+This script contains a cache of finished Polarizer results stored in the ars
+MongoDB database. Summaries are keyed by asin and a fingerprint of the scraped
+review pages from the Loader class in scraper.py, so that a product is only
+run through the pipeline again when its reviews change.
+'''
+
+from review_store import shared_mongo
+
+# increase when the stored document format changes
+SCHEMA_VERSION = 1
+
+
+class PolarizerSummary(object):
+    '''
+    Compact copy of the Polarizer results that are used by app_preparer.py
+    and summarizer.py. Review snippets are stored as indexes into a shared
+    list of sentence texts.
+    '''
+
+    def __init__(self, polarizer=None, n=10, min_pct=0.03):
+        '''
+        INPUT: Polarizer, int, float
+        OUTPUT: None
+
+        Args:
+            polarizer: Polarizer to summarize, or None for an empty summary
+            n: number of top aspects to keep results for
+            min_pct: results are also kept for aspects appearing in at least
+                     this share of reviews, the aspects that common_features
+                     in summarizer.py can match
+
+        Attributes:
+            asin (str):             asin identifier for Amazon product
+            aspect_pct (dict):      same as Polarizer.aspect_pct
+            aspect_pol_list (dict): same as Polarizer.aspect_pol_list
+            n_reviews (int):        total number of reviews for product
+            name (str):             name of product
+            ratings (dict):         same as Polarizer.ratings
+            sentences (list):       text of the sentences used in snippets
+            snippets (dict):        dictionary with aspect as key and polarity
+                                    class as subkey. values are lists of
+                                    (sentence ids, aspect_idx, rating,
+                                    review_idx, pol_blob)
+            top_asps (list):        same as Polarizer.top_asps
+        '''
+        self.asin = None
+        self.aspect_pct = dict()
+        self.aspect_pol_list = dict()
+        self.n_reviews = None
+        self.name = None
+        self.ratings = dict()
+        self.sentences = []
+        self.snippets = dict()
+        self.top_asps = [[], []]
+
+        if polarizer:
+            self._summarize(polarizer, n, min_pct)
+
+    def _summarize(self, polarizer, n, min_pct):
+        '''
+        INPUT: Polarizer, int, float
+        OUTPUT: None
+
+        Copies the results of the top aspects of polarizer
+        '''
+        self.asin, self.name = polarizer.asin, polarizer.name
+        self.n_reviews = polarizer.n_reviews
+        self.top_asps = polarizer.top_aspects()
+        sent_ids = dict()
+
+        for i, (aspect, freq) in enumerate(zip(*self.top_asps)):
+            if i >= n and freq < min_pct * self.n_reviews:
+                continue
+
+            review_dict = polarizer.aspect_dict[aspect]
+            pol_list = polarizer.aspect_pol_list[aspect]
+            self.snippets[aspect] = dict()
+
+            for category, rows in pol_list.iteritems():
+                self.snippets[aspect][category] = []
+
+                for _, aspect_idx, rating, review, pol_blob in rows:
+                    ids = []
+
+                    for s in review_dict[review]['sent_idxs']:
+                        if s not in sent_ids:
+                            sent_ids[s] = len(self.sentences)
+                            self.sentences.append(polarizer.sentiment.text(s))
+
+                        ids.append(sent_ids[s])
+
+                    self.snippets[aspect][category].append(
+                        [ids, int(aspect_idx), int(rating), int(review),
+                         float(pol_blob)])
+
+            self.aspect_pct[aspect] = [float(x)
+                                       for x in polarizer.aspect_pct[aspect]]
+            self.aspect_pol_list[aspect] = pol_list
+            self.ratings[aspect] = [int(x) for x in polarizer.ratings[aspect]]
+
+    def aspect_freqs(self):
+        '''
+        INPUT: None
+        OUTPUT: dict
+
+        Returns dictionary with aspect as key and number of reviews containing
+        aspect as value
+        '''
+        return dict(zip(*self.top_asps))
+
+    def top_aspects(self, n=None):
+        '''
+        INPUT: int
+        OUTPUT: list
+
+        Args:
+            n: number of aspects to return, all aspects if None
+
+        Returns top_asps for the n aspects that appear in the most reviews
+        '''
+        return [self.top_asps[0][:n], self.top_asps[1][:n]]
+
+    def to_doc(self, fingerprint):
+        '''
+        INPUT: str
+        OUTPUT: dict
+
+        Args:
+            fingerprint: fingerprint of the review pages that were summarized
+
+        Returns MongoDB document of the summary. Aspects are stored in lists
+        since they can contain characters that are not allowed in keys.
+        '''
+        aspects = [[aspect, self.aspect_pct[aspect], self.ratings[aspect],
+                    self.snippets[aspect]]
+                   for aspect in self.top_asps[0] if aspect in self.snippets]
+
+        return {'_id': self.asin, 'asin': self.asin, 'aspects': aspects,
+                'fingerprint': fingerprint, 'n_reviews': self.n_reviews,
+                'name': self.name, 'sentences': self.sentences,
+                'top_asps': [list(self.top_asps[0]),
+                             [int(x) for x in self.top_asps[1]]],
+                'version': SCHEMA_VERSION}
+
+    @classmethod
+    def from_doc(cls, doc):
+        '''
+        INPUT: dict
+        OUTPUT: PolarizerSummary
+
+        Args:
+            doc: document returned by to_doc
+
+        Creates a summary from a stored document
+        '''
+        summary = cls()
+        summary.asin, summary.name = doc['asin'], doc['name']
+        summary.n_reviews = doc['n_reviews']
+        summary.sentences = doc['sentences']
+        summary.top_asps = doc['top_asps']
+
+        for aspect, pct, ratings, snippets in doc['aspects']:
+            summary.aspect_pct[aspect] = pct
+            summary.ratings[aspect] = ratings
+            summary.snippets[aspect] = snippets
+            summary.aspect_pol_list[aspect] = dict(
+                (category, [(''.join(summary.sentences[i] for i in ids),
+                             aspect_idx, rating, review, pol_blob)
+                            for ids, aspect_idx, rating, review, pol_blob
+                            in rows])
+                for category, rows in snippets.iteritems())
+
+        return summary
+
+
+class SummaryCache(object):
+    '''
+    Stores PolarizerSummary objects in MongoDB, one document per asin
+    '''
+
+    def __init__(self, collection=None):
+        '''
+        INPUT: pymongo.collection.Collection
+        OUTPUT: None
+
+        Args:
+            collection: collection to store summaries in, defaults to the
+                        summaries collection of the ars database
+
+        Attributes:
+            collection (Collection): collection summaries are stored in
+            hits (int):              number of lookups found in cache
+            misses (int):            number of lookups not found in cache
+        '''
+        if collection is None:
+            collection = shared_mongo()['ars']['summaries']
+
+        self.collection = collection
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, asin, fingerprint):
+        '''
+        INPUT: str, str
+        OUTPUT: PolarizerSummary
+
+        Args:
+            asin: asin identifier for Amazon product
+            fingerprint: fingerprint of the current review pages from
+                         Loader.fingerprint
+
+        Returns the stored summary for asin, or None if there is no summary
+        for the current review pages
+        '''
+        doc = None
+
+        if fingerprint:
+            doc = self.collection.find_one({'_id': asin,
+                                            'fingerprint': fingerprint,
+                                            'version': SCHEMA_VERSION})
+
+        if not doc:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+
+        return PolarizerSummary.from_doc(doc)
+
+    def put(self, polarizer, fingerprint):
+        '''
+        INPUT: Polarizer, str
+        OUTPUT: PolarizerSummary
+
+        Args:
+            polarizer: Polarizer returned from pipeline.summarize
+            fingerprint: fingerprint of the review pages that were summarized
+
+        Stores a summary of polarizer, replacing any older summary of the same
+        product, and returns the summary
+        '''
+        summary = PolarizerSummary(polarizer)
+
+        if fingerprint:
+            self.collection.replace_one({'_id': summary.asin},
+                                        summary.to_doc(fingerprint),
+                                        upsert=True)
+
+        return summary
+
+    def stats(self):
+        '''
+        INPUT: None
+        OUTPUT: dict
+
+        Returns dictionary of cache counters
+        '''
+        lookups = self.hits + self.misses
+
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / float(lookups) if lookups else 0.}
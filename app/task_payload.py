@@ -0,0 +1,198 @@
+'''
+This script contains the payloads that the Celery tasks of app.py return to
+the Flask app through the Redis result backend. Instead of pickled Loader and
+Polarizer objects, tasks return only what app_preparer.collect needs: the
+asin and name of a scraped product and the PolarizerSummary document of
+summary_cache.py for a summarized product. The page data that collect makes
+from them is returned for a results page. Payloads are packed with msgpack,
+compressed with zlib when they are large, and tagged with a version so that a
+worker and an app running different code fail loudly instead of misreading
+each other.
+'''
+
+from summary_cache import PolarizerSummary
+import msgpack
+import time
+import zlib
+
+# increase when the payload format changes
+PAYLOAD_VERSION = 1
+
+# first byte of a payload, telling whether the packed data is compressed
+_PACKED, _COMPRESSED = 'm', 'z'
+
+
+class PayloadCodec(object):
+    '''
+    Encodes and decodes versioned task payloads, and counts their sizes and
+    the time spent packing and unpacking them
+    '''
+
+    def __init__(self, compress_min=1024, level=6):
+        '''
+        INPUT: int, int
+        OUTPUT: None
+
+        Args:
+            compress_min: payloads of at least this many packed bytes are
+                          compressed, None to never compress
+            level: zlib compression level
+
+        Attributes:
+            compress_min (int):   minimum packed bytes of compressed payloads
+            decode_time (float):  total seconds spent decoding payloads
+            decoded (int):        number of payloads decoded
+            encode_time (float):  total seconds spent encoding payloads
+            encoded (int):        number of payloads encoded
+            level (int):          zlib compression level
+            packed_bytes (int):   total bytes of encoded payloads before
+                                  compression
+            payload_bytes (int):  total bytes of encoded payloads
+        '''
+        self.compress_min = compress_min
+        self.decode_time = 0.
+        self.decoded = 0
+        self.encode_time = 0.
+        self.encoded = 0
+        self.level = level
+        self.packed_bytes = 0
+        self.payload_bytes = 0
+
+    def encode(self, kind, data):
+        '''
+        INPUT: str, dict
+        OUTPUT: str
+
+        Args:
+            kind: kind of payload, checked when the payload is decoded
+            data: dictionary of msgpack serializable values
+
+        Returns the payload of data
+        '''
+        start = time.time()
+        packed = msgpack.packb({'version': PAYLOAD_VERSION, 'kind': kind,
+                                'data': data}, use_bin_type=True)
+
+        if self.compress_min is not None and len(packed) >= self.compress_min:
+            payload = _COMPRESSED + zlib.compress(packed, self.level)
+        else:
+            payload = _PACKED + packed
+
+        self.encode_time += time.time() - start
+        self.encoded += 1
+        self.packed_bytes += len(packed)
+        self.payload_bytes += len(payload)
+
+        return payload
+
+    def decode(self, payload, kind):
+        '''
+        INPUT: str, str
+        OUTPUT: dict
+
+        Args:
+            payload: payload returned by encode
+            kind: expected kind of payload
+
+        Returns the data of a payload. Raises ValueError if the payload has
+        another version or kind.
+        '''
+        start = time.time()
+
+        if payload[:1] == _COMPRESSED:
+            packed = zlib.decompress(payload[1:])
+        elif payload[:1] == _PACKED:
+            packed = payload[1:]
+        else:
+            raise ValueError("Not a task payload")
+
+        message = msgpack.unpackb(packed, raw=False)
+
+        if message.get('version') != PAYLOAD_VERSION:
+            raise ValueError("Payload version {} is not {}".format(
+                message.get('version'), PAYLOAD_VERSION))
+
+        if message.get('kind') != kind:
+            raise ValueError("Expected {} payload, got {}".format(
+                kind, message.get('kind')))
+
+        self.decode_time += time.time() - start
+        self.decoded += 1
+
+        return message['data']
+
+    def encode_product(self, product):
+        '''
+        INPUT: Loader
+        OUTPUT: str
+
+        Returns the payload of a scraped product, with its asin and name
+        '''
+        return self.encode('product', {'asin': product.asin,
+                                       'name': product.name})
+
+    def decode_product(self, payload):
+        '''
+        INPUT: str
+        OUTPUT: dict
+
+        Returns dictionary with the asin and name of a scraped product
+        '''
+        return self.decode(payload, 'product')
+
+    def encode_summary(self, summary):
+        '''
+        INPUT: PolarizerSummary
+        OUTPUT: str
+
+        Returns the payload of a summarized product, the document that
+        SummaryCache stores
+        '''
+        return self.encode('summary', summary.to_doc(None))
+
+    def decode_summary(self, payload):
+        '''
+        INPUT: str
+        OUTPUT: PolarizerSummary
+
+        Returns the summary of a summarized product
+        '''
+        return PolarizerSummary.from_doc(self.decode(payload, 'summary'))
+
+    def encode_results(self, asins, result):
+        '''
+        INPUT: list(str), list
+        OUTPUT: str
+
+        Args:
+            asins: asin identifiers of the summarized products
+            result: page data returned by app_preparer.collect, or None if
+                    the products have no aspects in common
+
+        Returns the payload of the results page of one or two products
+        '''
+        return self.encode('results', {'asins': asins, 'result': result})
+
+    def decode_results(self, payload):
+        '''
+        INPUT: str
+        OUTPUT: dict
+
+        Returns dictionary with the asins and the page data of a results page
+        '''
+        return self.decode(payload, 'results')
+
+    def stats(self):
+        '''
+        INPUT: None
+        OUTPUT: dict
+
+        Returns dictionary of payload counters, sizes and times
+        '''
+        return {'encoded': self.encoded, 'decoded': self.decoded,
+                'packed_bytes': self.packed_bytes,
+                'payload_bytes': self.payload_bytes,
+                'mean_bytes': self.payload_bytes / float(self.encoded)
+                if self.encoded else 0.,
+                'encode_time': self.encode_time,
+                'decode_time': self.decode_time}
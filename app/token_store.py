@@ -0,0 +1,139 @@
+'''
+This script contains a columnar store of the tokens in a ReviewSents object
+from parsers.py. Token attributes are kept as integer numpy arrays so that
+aspect mining can run on arrays instead of spacy Token objects, and so that a
+parsed corpus can be pickled and sent between processes without spacy.
+'''
+
+import numpy as np
+
+
+class TokenStore(object):
+    '''
+    Stores every token of a corpus as one row across a set of numpy arrays.
+    String attributes are stored as ids into lists of unique strings.
+    '''
+
+    def __init__(self, sentences):
+        '''
+        INPUT: list(SentCustomProperties)
+        OUTPUT: None
+
+        Attributes:
+            dep (np.array):         dependency id of each token
+            deps (list):            dependency label of each dependency id
+            head (np.array):        offset from each token to its head token
+            idx (np.array):         character offset of each token within its
+                                    sentence
+            lemma (np.array):       lemma id of each token
+            lemma_ids (dict):       dictionary with lemma as key and lemma id
+                                    as value
+            lemmas (list):          lemma of each lemma id
+            pos (np.array):         index of each token within its sentence
+            prob (np.array):        spacy log probability of each lemma id
+            review (np.array):      review index of each token
+            sent (np.array):        sentence index of each token
+            sent_rating (np.array): customer rating of each sentence
+            sent_review (np.array): review index of each sentence
+            sent_start (np.array):  index of first token of each sentence, with
+                                    the total token count appended
+            sent_text (list):       text of each sentence
+            tag (np.array):         part of speech tag id of each token
+            tags (list):            part of speech tag of each tag id
+        '''
+        lemma_ids, tag_ids, dep_ids = dict(), dict(), dict()
+        probs = []
+        lemma, tag, dep, head, idx, pos, sent, review = \
+            [], [], [], [], [], [], [], []
+        sent_start = [0]
+
+        for sentence in sentences:
+            offset = sentence.sent[0].idx
+
+            for i, token in enumerate(sentence.sent):
+                if token.lemma_ not in lemma_ids:
+                    lemma_ids[token.lemma_] = len(lemma_ids)
+                    probs.append(token.vocab[token.lemma].prob)
+
+                lemma.append(lemma_ids[token.lemma_])
+                tag.append(tag_ids.setdefault(token.tag_, len(tag_ids)))
+                dep.append(dep_ids.setdefault(token.dep_, len(dep_ids)))
+                head.append(token.head.i - token.i)
+                idx.append(token.idx - offset)
+                pos.append(i)
+                sent.append(sentence.sent_idx)
+                review.append(sentence.review_idx)
+
+            sent_start.append(len(lemma))
+
+        self.dep = np.array(dep, dtype=np.int16)
+        self.deps = self._id_list(dep_ids)
+        self.head = np.array(head, dtype=np.int16)
+        self.idx = np.array(idx, dtype=np.int32)
+        self.lemma = np.array(lemma, dtype=np.int32)
+        self.lemma_ids = lemma_ids
+        self.lemmas = self._id_list(lemma_ids)
+        self.pos = np.array(pos, dtype=np.int16)
+        self.prob = np.array(probs, dtype=np.float32)
+        self.review = np.array(review, dtype=np.int32)
+        self.sent = np.array(sent, dtype=np.int32)
+        self.sent_rating = np.array([s.review_rate for s in sentences],
+                                    dtype=np.int8)
+        self.sent_review = np.array([s.review_idx for s in sentences],
+                                    dtype=np.int32)
+        self.sent_start = np.array(sent_start, dtype=np.int32)
+        self.sent_text = [s.sent.string for s in sentences]
+        self.tag = np.array(tag, dtype=np.int16)
+        self.tags = self._id_list(tag_ids)
+
+    def __len__(self):
+        '''
+        Returns number of tokens in store
+        '''
+        return self.lemma.shape[0]
+
+    def _id_list(self, ids):
+        '''
+        INPUT: dict
+        OUTPUT: list
+
+        Args:
+            ids: dictionary with string as key and id as value
+
+        Returns list of strings ordered by id
+        '''
+        strings = [None] * len(ids)
+
+        for string, i in ids.iteritems():
+            strings[i] = string
+
+        return strings
+
+    def mask(self, attr, values):
+        '''
+        INPUT: str, iterable(str)
+        OUTPUT: np.array(bool)
+
+        Args:
+            attr: one of 'lemma', 'tag', 'dep'
+            values: strings to match
+
+        Returns boolean array of tokens whose attribute is in values
+        '''
+        strings = getattr(self, attr + 's')
+        values = set(values)
+        lookup = np.array([s in values for s in strings] + [False])
+
+        return lookup[getattr(self, attr)]
+
+    def sent_tokens(self, sent_idx):
+        '''
+        INPUT: int
+        OUTPUT: slice
+
+        Args:
+            sent_idx: sentence index within corpus
+
+        Returns slice of token rows belonging to a sentence
+        '''
+        return slice(self.sent_start[sent_idx], self.sent_start[sent_idx + 1])
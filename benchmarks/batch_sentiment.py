@@ -0,0 +1,116 @@
+'''
+Checks the BatchScorer class in sentiment.py against the TextBlob and Afinn
+packages on the reviews in data/labeled_random_reviews.csv, and benchmarks
+the time taken by both. Reports how many TextBlob polarities are within the
+tolerance, how many Afinn scores match exactly, and how many polarity classes
+from the rating rules of Polarizer._polarity_class agree.
+
+Usage: python benchmarks/batch_sentiment.py [-t 0.05] [-r 10]
+'''
+
+from __future__ import division
+import argparse
+import csv
+import numpy as np
+import os
+import sys
+import time
+import unicodedata
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+from sentiment import BatchScorer, afinn, pattern_sentiment
+from textblob import TextBlob
+
+
+def load_reviews():
+    '''
+    INPUT: None
+    OUTPUT: list(str), np.array
+
+    Returns ascii review texts and customer ratings from
+    labeled_random_reviews.csv
+    '''
+    texts, ratings = [], []
+
+    with open(os.path.join(ROOT, 'data', 'labeled_random_reviews.csv')) as f:
+        for row in csv.DictReader(f):
+            txt = unicodedata.normalize('NFKD', row['Review'].decode('utf-8'))
+            texts.append(txt.encode('ascii', 'ignore'))
+            ratings.append(int(row['Rating']))
+
+    return texts, np.array(ratings)
+
+
+def package_scores(texts):
+    '''
+    INPUT: list(str)
+    OUTPUT: np.array, np.array
+
+    Scores texts one at a time with the TextBlob and Afinn packages
+    '''
+    pol_blob = [round(TextBlob(txt).sentiment.polarity, 3) for txt in texts]
+    pol_afin = [afinn.score(txt) for txt in texts]
+
+    return np.array(pol_blob), np.array(pol_afin)
+
+
+def batch_scores(scorer, texts):
+    '''
+    INPUT: BatchScorer, list(str)
+    OUTPUT: np.array, np.array
+
+    Scores texts as one batch with BatchScorer
+    '''
+    word_lists = [" ".join(pattern_sentiment.tokenizer(txt)).lower().split()
+                  for txt in texts]
+    pol_blob = np.array([round(pol, 3)
+                         for pol in scorer.blob_polarity(word_lists)])
+    pol_afin = scorer.afinn_score(texts)
+
+    return pol_blob, pol_afin
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-t', '--tolerance', type=float, default=0.05,
+                        help='allowed difference in TextBlob polarity')
+    parser.add_argument('-r', '--repeats', type=int, default=10,
+                        help='number of times the reviews are scored')
+    args = parser.parse_args()
+
+    texts, ratings = load_reviews()
+    texts = texts * args.repeats
+    ratings = np.tile(ratings, args.repeats)
+
+    scorer = BatchScorer()
+    package_scores(texts[:10])   # loads the lexicons
+
+    start = time.time()
+    blob_ref, afin_ref = package_scores(texts)
+    ref_time = time.time() - start
+
+    start = time.time()
+    blob, afin = batch_scores(scorer, texts)
+    batch_time = time.time() - start
+
+    diff = np.abs(blob - blob_ref)
+    class_ref = scorer.polarity_class(ratings, blob_ref, afin_ref)
+    class_batch = scorer.polarity_class(ratings, blob, afin)
+
+    print 'texts scored:           {}'.format(len(texts))
+    print 'package time:           {:.3f}s'.format(ref_time)
+    print 'batch time:             {:.3f}s'.format(batch_time)
+    print 'TextBlob exact:         {:.1%}'.format(np.mean(diff == 0))
+    print 'TextBlob within {}:   {:.1%}'.format(args.tolerance,
+                                                 np.mean(diff <=
+                                                         args.tolerance))
+    print 'TextBlob max diff:      {:.3f}'.format(diff.max())
+    print 'Afinn exact:            {:.1%}'.format(np.mean(afin == afin_ref))
+    print 'polarity class match:   {:.1%}'.format(np.mean(class_ref ==
+                                                          class_batch))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+'''
+Benchmarks the review page throughput of amazon_crawler.crawl for different
+numbers of worker threads against the local stub server in stub_server.py.
+Pages are built from the reviews in data/sample_data.pkl. Checks that every
+crawl saves exactly the pages that were served.
+
+Usage: python benchmarks/crawl_throughput.py [-w 1 4 8] [-l 0.2] [-e 0.05]
+'''
+
+from __future__ import division
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+from amazon_crawler import HostThrottle, crawl
+from http_client import HttpClient
+from page_store import PageStore, trim
+from stub_server import StubServer, sample_pages
+
+
+def saved_pages_match(pages, out):
+    '''
+    INPUT: dict, str
+    OUTPUT: bool
+
+    Checks that the page stores saved under out hold the review lists of
+    the pages served
+    '''
+    for asin, htmls in pages.iteritems():
+        store = PageStore(os.path.join(out, 'com', asin))
+        stored = list(store.items())
+
+        if [page for page, _ in stored] != range(1, len(htmls) + 1):
+            return False
+        if any(region != trim(html)[0]
+               for (_, region), html in zip(stored, htmls)):
+            return False
+
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-w', '--workers', nargs='+', type=int,
+                        default=[1, 4, 8], help='worker counts to benchmark')
+    parser.add_argument('-l', '--latency', type=float, default=0.2,
+                        help='seconds the stub server delays each page')
+    parser.add_argument('-e', '--error_rate', type=float, default=0.,
+                        help='share of requests failing with 503')
+    parser.add_argument('-p', '--pause', type=float, default=0.,
+                        help='minimum seconds between requests to the host')
+    parser.add_argument('-s', '--step', type=float, default=0.05,
+                        help='seconds the pause grows by on 503 errors')
+    args = parser.parse_args()
+
+    pages = sample_pages()
+    n_pages = sum(len(htmls) for htmls in pages.itervalues())
+
+    print '{:>8} {:>8} {:>10} {:>10} {:>8} {:>8} {:>8}'.format(
+        'workers', 'pages', 'seconds', 'pages/s', 'requests', '503s',
+        'match')
+
+    for n_jobs in args.workers:
+        stub = StubServer(pages, latency=args.latency,
+                          error_rate=args.error_rate).start()
+        out = tempfile.mkdtemp()
+        throttle = HostThrottle(args.pause, jitter=0., step=args.step)
+        client = HttpClient(pool_size=n_jobs)
+
+        try:
+            start = time.time()
+            results = crawl(sorted(pages), out=out, workers=n_jobs,
+                            base_url=stub.base_url, throttle=throttle,
+                            client=client)
+            elapsed = time.time() - start
+        finally:
+            client.close()
+            stub.stop()
+
+        fetched = sum(len(result['fetched'])
+                      for result in results.itervalues())
+        match = fetched == n_pages and saved_pages_match(pages, out)
+        shutil.rmtree(out)
+
+        print '{:>8} {:>8} {:>9.2f}s {:>10.1f} {:>8} {:>8} {:>8}'.format(
+            n_jobs, fetched, elapsed, fetched / elapsed, stub.requests,
+            stub.errors, str(match))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+'''
+Benchmarks refreshing a scraped product with a full crawl of all its review
+pages against the delta crawl of crawl_delta in amazon_crawler.py, which
+downloads the most recent pages only until it reaches stored reviews, as
+Loader.refresh in scraper.py does. The product is first crawled from the
+local stub server in stub_server.py without its -n newest sample reviews,
+which are then added to the top of the listing. Reports the pages fetched
+and the reviews each refresh writes to MongoDB, and checks that both end up
+with the same reviews.
+
+Usage: python benchmarks/delta_crawl.py [-n 25] [-l 0.05] [-w 4]
+'''
+
+from __future__ import division
+import argparse
+import cPickle
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+from amazon_crawler import HostThrottle, crawl, crawl_delta, delta_path
+from extractors import regex_reviews
+from http_client import HttpClient
+from page_store import PageStore
+from stub_server import StubServer, review_pages
+
+ASIN = 'B00J7B8T5Q'
+
+
+def listing(sample_data, ids, skip):
+    '''
+    INPUT: tuple, list(str), int
+    OUTPUT: list(unicode)
+
+    Returns the review pages of the sample product without its skip newest
+    reviews
+    '''
+    columns = [list(column)[skip:] for column in sample_data]
+    return review_pages(ASIN, ASIN, *columns, ids=ids[skip:])
+
+
+def review_ids(folder):
+    '''
+    INPUT: str
+    OUTPUT: list(str)
+
+    Returns the review ids on the stored pages of folder, in page order
+    '''
+    store = PageStore(folder)
+    return [record['review_id'] for _, html in store.items()
+            for record in regex_reviews(html)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--new', type=int, default=25,
+                        help='number of reviews posted since the last crawl')
+    parser.add_argument('-l', '--latency', type=float, default=0.05,
+                        help='seconds the stub server delays each page')
+    parser.add_argument('-w', '--workers', type=int, default=4,
+                        help='number of crawler threads of the full crawl')
+    args = parser.parse_args()
+
+    with open(os.path.join(ROOT, 'data', 'sample_data.pkl'), 'rb') as f:
+        sample_data = cPickle.load(f)[ASIN]
+
+    ids = ['R{:06d}'.format(i) for i in range(len(sample_data[3]))]
+    stub = StubServer({ASIN: listing(sample_data, ids, args.new)},
+                      latency=args.latency).start()
+    throttle = HostThrottle(0, jitter=0)
+    client = HttpClient(pool_size=args.workers)
+    out = tempfile.mkdtemp()
+
+    crawl([ASIN], out=os.path.join(out, 'delta'), base_url=stub.base_url,
+          throttle=throttle, client=client, workers=args.workers)
+    stub.pages[ASIN] = listing(sample_data, ids, 0)
+
+    print '{:>8} {:>7} {:>9} {:>8} {:>8}'.format(
+        'refresh', 'pages', 'seconds', 'written', 'match')
+
+    start = time.time()
+    result = crawl([ASIN], out=os.path.join(out, 'full'),
+                   base_url=stub.base_url, throttle=throttle, client=client,
+                   workers=args.workers)[ASIN]
+    seconds = time.time() - start
+    full = review_ids(os.path.join(out, 'full', 'com', ASIN))
+
+    print '{:>8} {:>7} {:>9.2f} {:>8} {:>8}'.format(
+        'full', len(result['fetched']), seconds, len(full), 'True')
+
+    folder = os.path.join(out, 'delta', 'com', ASIN)
+    known = set(review_ids(folder))
+
+    def reached(htmlpage):
+        return any(record['review_id'] in known
+                   for record in regex_reviews(htmlpage))
+
+    start = time.time()
+    result = crawl_delta(ASIN, reached, out=os.path.join(out, 'delta'),
+                         base_url=stub.base_url, throttle=throttle,
+                         client=client)
+    seconds = time.time() - start
+    new = [review_id for review_id in
+           review_ids(delta_path(os.path.join(out, 'delta', 'com'), ASIN))
+           if review_id not in known]
+
+    print '{:>8} {:>7} {:>9.2f} {:>8} {:>8}'.format(
+        'delta', len(result['fetched']), seconds, len(new),
+        str(sorted(list(known) + new) == sorted(full) and
+            len(new) == args.new))
+
+    client.close()
+    stub.stop()
+    shutil.rmtree(out)
+
+
+if __name__ == '__main__':
+    main()
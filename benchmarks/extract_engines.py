@@ -0,0 +1,147 @@
+'''
+Benchmarks the review extraction engines in extractors.py used by
+Loader.extract in scraper.py. Pages are built from data/sample_data.pkl by
+stub_server.py, as full html pages and as the review lists kept by
+page_store.py, or read from folders of saved review pages. Some built pages
+drop the author or headline of a review and add line breaks and entities to
+the review text. Reports pages/sec of every engine and checks that its
+records are the same as those of the reference soup engine.
+
+Usage: python benchmarks/extract_engines.py [-r 3] [-d reviews/com/B00J7B8T5Q]
+'''
+
+from __future__ import division
+import argparse
+import codecs
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+from extractors import EXTRACTORS
+from page_store import PageStore, trim
+from stub_server import sample_pages
+
+authorre = re.compile(r'<a class="a-size-base a-link-normal author"[^>]*>'
+                      r'(.*?)</a>', re.S)
+headlinere = re.compile(r'<a class="a-size-base a-link-normal review-title '
+                        r'[^>]*>.*?</a>', re.S)
+
+
+def edge_cases(html, page):
+    '''
+    INPUT: unicode, int
+    OUTPUT: unicode
+
+    Drops the first author link of every third page and the first headline of
+    every fifth page, and adds a line break and entities to the review texts
+    '''
+    if page % 3 == 0:
+        html = authorre.sub(r'\1', html, count=1)
+    if page % 5 == 0:
+        html = headlinere.sub(u'', html, count=1)
+
+    return html.replace(u'review-text">', u'review-text">Caf&eacute; &amp; '
+                        u'&#8220;tea&#8221;<br/>')
+
+
+def built_pages():
+    '''
+    INPUT: None
+    OUTPUT: dict
+
+    Returns dictionary with version ('html' or 'store') as key and list of
+    pages built from the sample data as value
+    '''
+    pages = {'html': [], 'store': []}
+
+    for asin, htmls in sorted(sample_pages().items()):
+        for page, html in enumerate(htmls, 1):
+            html = edge_cases(html, page)
+            pages['html'].append(html)
+            pages['store'].append(trim(html)[0])
+
+    return pages
+
+
+def saved_pages(folder):
+    '''
+    INPUT: str
+    OUTPUT: list(unicode)
+
+    Reads the review pages saved in folder, from the page store and from the
+    html files of crawls made without it
+    '''
+    store = PageStore(folder)
+    htmls = [html for _, html in store.items()] if len(store) else []
+
+    for file_ in sorted(os.listdir(folder)):
+        if file_[-5:] != '.html' or \
+                int(file_[:-5].split('_')[-1]) in store:
+            continue
+
+        with codecs.open(os.path.join(folder, file_), encoding='utf8') as f:
+            htmls.append(f.read())
+
+    return htmls
+
+
+def run(extract, htmls, repeat):
+    '''
+    INPUT: function, list(unicode), int
+    OUTPUT: float, list(dict)
+
+    Returns the best seconds over repeat runs of extract on every page, and
+    the records of the last run
+    '''
+    best = None
+
+    for _ in xrange(repeat):
+        start = time.time()
+        records = [extract(html) for html in htmls]
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best, records
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='runs per engine, the best is reported')
+    parser.add_argument('-d', '--dirs', nargs='*', default=[],
+                        help='folders of saved review pages to use instead '
+                             'of the built pages')
+    args = parser.parse_args()
+
+    if args.dirs:
+        pages = dict((folder, saved_pages(folder)) for folder in args.dirs)
+    else:
+        pages = built_pages()
+
+    print '{:>28} {:>8} {:>7} {:>10} {:>9} {:>8} {:>6}'.format(
+        'pages', 'engine', 'count', 'pages/sec', 'reviews', 'speedup',
+        'match')
+
+    for version in sorted(pages):
+        htmls = pages[version]
+        seconds, reference = run(EXTRACTORS['soup'], htmls, args.repeat)
+
+        for engine in ['soup'] + sorted(set(EXTRACTORS) - set(['soup'])):
+            if engine != 'soup':
+                seconds_, records = run(EXTRACTORS[engine], htmls,
+                                        args.repeat)
+            else:
+                seconds_, records = seconds, reference
+
+            print '{:>28} {:>8} {:>7} {:>10.1f} {:>9} {:>7.1f}x {:>6}' \
+                .format(version[-28:], engine, len(htmls),
+                        len(htmls) / seconds_, sum(map(len, records)),
+                        seconds / seconds_, str(records == reference))
+
+
+if __name__ == '__main__':
+    main()
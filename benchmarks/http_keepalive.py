@@ -0,0 +1,70 @@
+'''
+Benchmarks the per-page latency of amazon_crawler.crawl with and without
+keep-alive connections in the HttpClient class of http_client.py, against the
+local stub server in stub_server.py. New connections to the stub server are
+delayed to stand in for the TCP and TLS handshakes with Amazon.
+
+Usage: python benchmarks/http_keepalive.py [-w 4] [-l 0.05] [-c 0.1]
+'''
+
+from __future__ import division
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+from amazon_crawler import HostThrottle, crawl
+from http_client import HttpClient
+from stub_server import StubServer, sample_pages
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-w', '--workers', type=int, default=4,
+                        help='number of crawler threads')
+    parser.add_argument('-l', '--latency', type=float, default=0.05,
+                        help='seconds the stub server delays each page')
+    parser.add_argument('-c', '--connect_latency', type=float, default=0.1,
+                        help='seconds the stub server delays new connections')
+    args = parser.parse_args()
+
+    pages = sample_pages()
+
+    print '{:>11} {:>8} {:>12} {:>10} {:>12} {:>12}'.format(
+        'keep-alive', 'pages', 'latency/page', 'pages/s', 'connections',
+        'reuse rate')
+
+    for keep_alive in [False, True]:
+        stub = StubServer(pages, latency=args.latency,
+                          connect_latency=args.connect_latency).start()
+        client = HttpClient(pool_size=args.workers, keep_alive=keep_alive)
+        out = tempfile.mkdtemp()
+
+        try:
+            start = time.time()
+            results = crawl(sorted(pages), out=out, workers=args.workers,
+                            base_url=stub.base_url,
+                            throttle=HostThrottle(0., jitter=0.),
+                            client=client)
+            elapsed = time.time() - start
+        finally:
+            client.close()
+            stub.stop()
+            shutil.rmtree(out)
+
+        fetched = sum(len(result['fetched'])
+                      for result in results.itervalues())
+        stats = client.stats()
+
+        print '{:>11} {:>8} {:>11.3f}s {:>10.1f} {:>12} {:>12.1%}'.format(
+            str(keep_alive), fetched, stats['mean_latency'],
+            fetched / elapsed, stub.connections, stats['reuse_rate'])
+
+
+if __name__ == '__main__':
+    main()
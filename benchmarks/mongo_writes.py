@@ -0,0 +1,159 @@
+'''
+Benchmarks writing the reviews of data/sample_data.pkl to MongoDB with one
+update_one per review, as Loader.extract used to, against the ordered bulk
+upserts of the ReviewStore class in review_store.py. By default the reviews
+go to an in-memory collection that delays every call to stand in for the
+round trip to a remote server. With --uri they go to a scratch database on a
+real server, which is dropped afterwards.
+
+Usage: python benchmarks/mongo_writes.py [-b 1 10 100 500] [-l 0.005]
+       [--uri mongodb://host:27017]
+'''
+
+from __future__ import division
+import argparse
+import cPickle
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+from review_store import ReviewStore, review_id
+
+
+class RemoteCollection(object):
+    '''
+    In-memory stand-in for a collection on a remote server. Every call waits
+    latency seconds, the round trip that dominates writes to a remote server.
+    '''
+
+    def __init__(self, latency):
+        self.docs = dict()
+        self.latency = latency
+        self.round_trips = 0
+
+    def _call(self):
+        self.round_trips += 1
+        time.sleep(self.latency)
+
+    def _upsert(self, _id, values):
+        self.docs.setdefault(_id, {'_id': _id}).update(values)
+
+    def update_one(self, filter_, update, upsert=False):
+        self._call()
+        self._upsert(filter_['_id'], update['$set'])
+
+    def bulk_write(self, requests, ordered=True):
+        self._call()
+
+        for request in requests:
+            self._upsert(request._filter['_id'], request._doc['$set'])
+
+    def find(self):
+        return self.docs.values()
+
+    def drop(self):
+        self.docs.clear()
+
+
+def sample_docs():
+    '''
+    INPUT: None
+    OUTPUT: list(dict)
+
+    Returns the review documents of data/sample_data.pkl
+    '''
+    with open(os.path.join(ROOT, 'data', 'sample_data.pkl'), 'rb') as f:
+        sample_data = cPickle.load(f)
+
+    docs = []
+
+    for asin in sorted(sample_data):
+        for i, (auth, head, rate, revw) in enumerate(zip(*sample_data[asin])):
+            docs.append({'asin': asin, 'review_idx': i, 'rating': rate,
+                         'review': revw, 'author': auth, 'headline': head})
+
+    return docs
+
+
+def write_each(collection, docs):
+    '''
+    INPUT: Collection, list(dict)
+    OUTPUT: dict
+
+    Writes every document with its own update_one, the way Loader.extract
+    used to, and returns its number of round trips and latency
+    '''
+    elapsed = 0.
+
+    for doc in docs:
+        start = time.time()
+        collection.update_one({'_id': review_id(doc['asin'],
+                                                doc['review_idx'])},
+                              {'$set': doc}, upsert=True)
+        elapsed += time.time() - start
+
+    return {'batches': len(docs), 'mean_latency': elapsed / len(docs)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-b', '--batch_sizes', type=int, nargs='+',
+                        default=[1, 10, 100, 500],
+                        help='documents per bulk upsert')
+    parser.add_argument('-l', '--latency', type=float, default=0.005,
+                        help='seconds of round trip of the stand-in '
+                             'collection')
+    parser.add_argument('--uri', help='MongoDB server to write to instead '
+                                      'of the stand-in collection')
+    args = parser.parse_args()
+
+    docs = sample_docs()
+
+    if args.uri:
+        from pymongo import MongoClient
+        client = MongoClient(args.uri)
+        collection = client['ars_benchmark']['review_data']
+    else:
+        client = None
+        collection = RemoteCollection(args.latency)
+
+    print '{:>12} {:>9} {:>8} {:>9} {:>13} {:>8}'.format(
+        'writer', 'seconds', 'docs/s', 'batches', 'batch latency', 'match')
+
+    runs = [('update_one', None)] + [('bulk {}'.format(size), size)
+                                     for size in args.batch_sizes]
+    reference = None
+
+    for name, batch_size in runs:
+        collection.drop()
+        start = time.time()
+
+        if batch_size is None:
+            stats = write_each(collection, docs)
+        else:
+            store = ReviewStore(collection, batch_size)
+            store.put_many(docs)
+            stats = store.stats()
+
+        seconds = time.time() - start
+        stored = sorted((doc['_id'], doc['review'], doc['rating'])
+                        for doc in collection.find())
+
+        if reference is None:
+            reference = stored
+
+        print '{:>12} {:>9.3f} {:>8.0f} {:>9} {:>12.2f}ms {:>8}'.format(
+            name, seconds, len(docs) / seconds, stats['batches'],
+            stats['mean_latency'] * 1000,
+            str(stored == reference and len(stored) == len(docs)))
+
+    if client:
+        client.drop_database('ars_benchmark')
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
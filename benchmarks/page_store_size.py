@@ -0,0 +1,144 @@
+'''
+Benchmarks disk usage and read time of the PageStore class in page_store.py
+against full html files, for review pages built from data/sample_data.pkl by
+stub_server.py. Pages are padded with navigation markup to the size of real
+review pages. Checks that the reviews parsed from both are the same.
+
+Usage: python benchmarks/page_store_size.py [-n 250000]
+'''
+
+from __future__ import division
+import argparse
+import codecs
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+from bs4 import BeautifulSoup
+from page_store import PageStore
+from stub_server import sample_pages
+
+
+def parse_reviews(html):
+    '''
+    INPUT: unicode
+    OUTPUT: list(unicode)
+
+    Returns the review texts of a page, parsed like Loader.extract
+    '''
+    soup = BeautifulSoup(html, 'html.parser')
+    r_class = "a-size-base review-text"
+
+    return [tag.findAll("span", {"class": r_class})[0].text
+            for tag in soup.findAll("div", {"class": "a-section review"})]
+
+
+def folder_size(folder):
+    '''
+    INPUT: str
+    OUTPUT: int
+
+    Returns bytes used by the files in folder
+    '''
+    return sum(os.path.getsize(os.path.join(folder, file_))
+               for file_ in os.listdir(folder))
+
+
+def read_html(folder):
+    '''
+    INPUT: str
+    OUTPUT: list(unicode)
+
+    Reads the full html files of a product in page order
+    '''
+    files = sorted(os.listdir(folder),
+                   key=lambda file_: int(file_[:-5].split('_')[-1]))
+    htmls = []
+
+    for file_ in files:
+        with codecs.open(os.path.join(folder, file_), encoding='utf8') as f:
+            htmls.append(f.read())
+
+    return htmls
+
+
+def read_store(folder):
+    '''
+    INPUT: str
+    OUTPUT: list(unicode)
+
+    Reads the stored review lists of a product in page order
+    '''
+    return [html for _, html in PageStore(folder).items()]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--nav_size', type=int, default=250000,
+                        help='characters of navigation markup per page')
+    args = parser.parse_args()
+
+    pages = sample_pages()
+    out = tempfile.mkdtemp()
+    results = dict()
+
+    for asin, htmls in pages.iteritems():
+        padding = u'<div class="nav">{}</div>'.format(
+            u''.join(u'<a href="/nav/{0}">Category {0}</a>'.format(i)
+                     for i in xrange(args.nav_size // 40)))
+        htmls = [html.replace(u'<body>', u'<body>' + padding)
+                 for html in htmls]
+
+        for version in ['html', 'store']:
+            folder = os.path.join(out, version, asin)
+            os.makedirs(folder)
+
+            if version == 'html':
+                for page, html in enumerate(htmls, 1):
+                    with codecs.open(os.path.join(folder, '{}_{}.html'
+                                                  .format(asin, page)),
+                                     mode='w', encoding='utf8') as f:
+                        f.write(html)
+            else:
+                store = PageStore(folder, asin)
+                for page, html in enumerate(htmls, 1):
+                    store.put(page, html)
+
+    for version, read in [('html', read_html), ('store', read_store)]:
+        size, read_time, parse_time, reviews = 0, 0., 0., []
+
+        for asin in sorted(pages):
+            folder = os.path.join(out, version, asin)
+            size += folder_size(folder)
+
+            start = time.time()
+            htmls = read(folder)
+            read_time += time.time() - start
+
+            start = time.time()
+            for html in htmls:
+                reviews.extend(parse_reviews(html))
+            parse_time += time.time() - start
+
+        results[version] = (size, read_time, parse_time, reviews)
+
+    shutil.rmtree(out)
+
+    print '{:>8} {:>12} {:>10} {:>10} {:>8} {:>8}'.format(
+        'version', 'disk', 'read', 'parse', 'reviews', 'match')
+
+    for version in ['html', 'store']:
+        size, read_time, parse_time, reviews = results[version]
+        match = reviews == results['html'][3]
+        print '{:>8} {:>10.1f}KB {:>9.3f}s {:>9.3f}s {:>8} {:>8}'.format(
+            version, size / 1024, read_time, parse_time, len(reviews),
+            str(match))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+'''
+Benchmarks spacy parsing throughput of the ReviewSents class in parsers.py
+for different numbers of worker processes. Reviews are taken from the
+data/sample_data.pkl file. Checks that every parsing mode gives the same
+sentences as the serial parser.
+
+Usage: python benchmarks/parse_throughput.py [-w 1 2 4] [-b 25]
+'''
+
+import argparse
+import cPickle
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+from parsers import ReviewSents
+from scraper import Loader
+
+
+def load_products():
+    '''
+    INPUT: None
+    OUTPUT: list(Loader)
+
+    Creates Loader objects from the reviews stored in sample_data.pkl
+    '''
+    with open(os.path.join(ROOT, 'data', 'sample_data.pkl'), 'rb') as f:
+        sample_data = cPickle.load(f)
+
+    products = []
+
+    for asin in sorted(sample_data):
+        _, _, ratings, reviews = sample_data[asin]
+        product = Loader(name=asin)
+        product.asin, product.ratings = asin, ratings
+        product.reviews = [review.decode('utf-8') for review in reviews]
+        products.append(product)
+
+    return products
+
+
+def signature(corpus):
+    '''
+    INPUT: ReviewSents
+    OUTPUT: list(tuple)
+
+    Summarizes the parsed sentences of a corpus for comparing parsing modes
+    '''
+    return [(s.review_idx, s.sent_idx, s.start_idx, s.sent.string)
+            for s in corpus.sentences]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-w', '--workers', nargs='+', type=int,
+                        default=[1, 2, 4], help='worker counts to benchmark')
+    parser.add_argument('-b', '--batch_size', type=int, default=25,
+                        help='reviews per spacy batch')
+    args = parser.parse_args()
+
+    products = load_products()
+    n_reviews = sum(len(product.reviews) for product in products)
+
+    start = time.time()
+    expected = [signature(ReviewSents(product)) for product in products]
+    elapsed = time.time() - start
+
+    print '{:>8} {:>8} {:>12} {:>8}'.format('workers', 'batch', 'reviews/s',
+                                            'match')
+    print '{:>8} {:>8} {:>12.1f} {:>8}'.format(1, '-', n_reviews / elapsed,
+                                               'ref')
+
+    for n_jobs in args.workers:
+        start = time.time()
+        corpora = [ReviewSents(product, n_jobs=n_jobs,
+                               batch_size=args.batch_size)
+                   for product in products]
+        elapsed = time.time() - start
+
+        match = expected == [signature(corpus) for corpus in corpora]
+        print '{:>8} {:>8} {:>12.1f} {:>8}'.format(n_jobs, args.batch_size,
+                                                   n_reviews / elapsed, match)
+
+
+if __name__ == '__main__':
+    main()
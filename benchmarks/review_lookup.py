@@ -0,0 +1,193 @@
+'''
+Benchmarks the single review lookups of the /full_review route in app.py:
+the previous unindexed find of the whole document against the ReviewStore
+class in review_store.py, which fetches only the shown fields through the
+(asin, review_idx) index and keeps recently viewed reviews in memory. Clicks
+follow a Zipf distribution over the reviews of data/sample_data.pkl, copied
+to -p products. By default the reviews are in an in-memory collection that
+delays every call to stand in for a remote server and scans every document
+when there is no index. With --uri they go to a scratch database on a real
+server, which is dropped afterwards.
+
+Usage: python benchmarks/review_lookup.py [-p 200] [-n 5000] [-c 100 1000]
+       [-l 0.002] [--uri mongodb://host:27017]
+'''
+
+from __future__ import division
+import argparse
+import numpy as np
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+from mongo_writes import RemoteCollection, sample_docs
+from review_store import INDEX_KEYS, ReviewStore
+
+
+class IndexedCollection(RemoteCollection):
+    '''
+    In-memory stand-in for a collection on a remote server that scans every
+    document to answer a query, unless it has the (asin, review_idx) index
+    '''
+
+    def __init__(self, latency):
+        RemoteCollection.__init__(self, latency)
+        self.index = None
+        self.name = 'review_data'
+
+    def create_index(self, keys):
+        self.index = dict(((doc['asin'], doc['review_idx']), doc)
+                          for doc in self.docs.values())
+        return 'asin_1_review_idx_1'
+
+    def index_information(self):
+        indexes = {'_id_': {'key': [('_id', 1)]}}
+
+        if self.index is not None:
+            indexes['asin_1_review_idx_1'] = {'key': INDEX_KEYS}
+
+        return indexes
+
+    def drop_indexes(self):
+        self.index = None
+
+    def find(self, filter_=None, projection=None):
+        self._call()
+
+        if not filter_:
+            return self.docs.values()
+
+        if self.index is not None:
+            key = (filter_['asin'], filter_['review_idx'])
+            docs = [self.index[key]] if key in self.index else []
+        else:
+            docs = [doc for doc in self.docs.values()
+                    if all(doc[field] == value
+                           for field, value in filter_.items())]
+
+        if projection:
+            docs = [dict((field, doc[field]) for field in projection
+                         if projection[field] and field in doc)
+                    for doc in docs]
+
+        return docs
+
+    def find_one(self, filter_, projection=None):
+        docs = self.find(filter_, projection)
+        return docs[0] if docs else None
+
+
+def product_docs(n_products):
+    '''
+    INPUT: int
+    OUTPUT: list(dict)
+
+    Returns the sample review documents copied to n_products products
+    '''
+    samples = sample_docs()
+    docs = []
+
+    for product in xrange(n_products):
+        for doc in samples:
+            doc = dict(doc)
+            doc['asin'] = '{}{:04d}'.format(doc['asin'][:6], product)
+            doc['_id'] = '{}_{}'.format(doc['asin'], doc['review_idx'])
+            docs.append(doc)
+
+    return docs
+
+
+def clicks(docs, n_clicks, seed=0):
+    '''
+    INPUT: list(dict), int, int
+    OUTPUT: list(tuple(str, int))
+
+    Returns (asin, review_idx) of n_clicks snippet clicks, where a few
+    reviews of a few products get most of the clicks
+    '''
+    keys = sorted((doc['asin'], doc['review_idx']) for doc in docs)
+    order = np.random.RandomState(seed).permutation(len(keys))
+    ranks = np.random.RandomState(seed).zipf(1.2, n_clicks * 2)
+    ranks = ranks[ranks <= len(keys)][:n_clicks] - 1
+
+    return [keys[order[rank]] for rank in ranks]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-p', '--products', type=int, default=200,
+                        help='number of products in the collection')
+    parser.add_argument('-n', '--clicks', type=int, default=5000,
+                        help='number of review lookups')
+    parser.add_argument('-c', '--cache_sizes', type=int, nargs='+',
+                        default=[100, 1000], help='reviews kept in memory')
+    parser.add_argument('-l', '--latency', type=float, default=0.002,
+                        help='seconds of round trip of the stand-in '
+                             'collection')
+    parser.add_argument('--uri', help='MongoDB server to read from instead '
+                                      'of the stand-in collection')
+    args = parser.parse_args()
+
+    docs = product_docs(args.products)
+    lookups = clicks(docs, args.clicks)
+
+    if args.uri:
+        from pymongo import MongoClient
+        client = MongoClient(args.uri)
+        collection = client['ars_benchmark']['review_data']
+        collection.drop()
+        collection.insert_many(docs)
+    else:
+        client = None
+        collection = IndexedCollection(args.latency)
+        collection.docs = dict((doc['_id'], doc) for doc in docs)
+
+    print '{} reviews, {} clicks on {} distinct reviews'.format(
+        len(docs), len(lookups), len(set(lookups)))
+    print '{:>14} {:>10} {:>9} {:>9} {:>8} {:>8}'.format(
+        'lookup', 'lookups/s', 'latency', 'hit rate', 'fields', 'match')
+
+    collection.drop_indexes()
+    reference = []
+    start = time.time()
+
+    for asin, review_idx in lookups:
+        reference.append(collection.find({'asin': asin,
+                                          'review_idx': review_idx})[0])
+
+    seconds = time.time() - start
+    print '{:>14} {:>10.0f} {:>7.2f}ms {:>9} {:>8} {:>8}'.format(
+        'unindexed', len(lookups) / seconds, seconds / len(lookups) * 1000,
+        '-', len(reference[0]), 'True')
+
+    for cache_size in [0] + args.cache_sizes:
+        store = ReviewStore(collection, cache_size=cache_size)
+        store.ensure_index()
+        results = []
+        start = time.time()
+
+        for asin, review_idx in lookups:
+            results.append(store.get(asin, review_idx))
+
+        seconds = time.time() - start
+        match = all(all(result[field] == doc[field] for field in result)
+                    for result, doc in zip(results, reference))
+
+        print '{:>14} {:>10.0f} {:>7.2f}ms {:>9.2f} {:>8} {:>8}'.format(
+            'cache {}'.format(cache_size), len(lookups) / seconds,
+            seconds / len(lookups) * 1000, store.cache_stats()['hit_rate'],
+            len(results[0]), str(match))
+
+    if client:
+        plan = collection.find({'asin': lookups[0][0],
+                                'review_idx': lookups[0][1]}).explain()
+        print 'query plan: {}'.format(plan['queryPlanner']['winningPlan'])
+        client.drop_database('ars_benchmark')
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+'''
+Benchmarks the time to the first parsed reviews and the end-to-end latency
+of a product that was never scraped, for scraping, extracting and parsing
+one after the other (scrape, extract and ReviewSents, as load and parse in
+pipeline.py do) against the streaming pipeline of Loader.stream in scraper.py
+feeding ReviewSents, where the reviews of a page are parsed while the next
+pages download. The product is crawled from the local stub server in
+stub_server.py, which delays every page by -l seconds. Reviews are written
+to an in-memory stand-in collection, or to a scratch database on a real
+server with --uri, which is dropped afterwards. Checks that both give the
+same sentences.
+
+Usage: python benchmarks/stream_pipeline.py [-n 300] [-l 0.2] [-w 4] [-j 1]
+       [-b 10] [--uri mongodb://host:27017]
+'''
+
+from __future__ import division
+import argparse
+import functools
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+from amazon_crawler import HostThrottle, crawl
+from mongo_writes import RemoteCollection
+from parse_throughput import signature
+from parsers import ReviewSents
+from review_store import ReviewStore
+from stub_server import StubServer, sample_pages
+import scraper
+
+ASIN = 'B00J7B8T5Q'
+
+
+def sequential(url, n_reviews, workers, n_jobs, batch_size, store):
+    '''
+    INPUT: str, int, int, int, int, ReviewStore
+    OUTPUT: ReviewSents, dict
+
+    Scrapes, extracts and parses the product one step after the other
+    '''
+    timings = dict()
+    start = time.time()
+
+    product = scraper.Loader(url)
+    product.scrape(n_reviews, workers=workers)
+    timings['crawled'] = time.time() - start
+
+    product.extract(store=store)
+    timings['first_page'] = time.time() - start
+
+    corpus = ReviewSents(product, n_jobs, batch_size)
+    timings['first_result'] = timings['elapsed'] = time.time() - start
+
+    return corpus, timings
+
+
+def streamed(url, n_reviews, workers, n_jobs, batch_size, store):
+    '''
+    INPUT: str, int, int, int, int, ReviewStore
+    OUTPUT: ReviewSents, dict
+
+    Scrapes, extracts and parses the product in one stream, as pipeline.stream
+    does
+    '''
+    timings = dict()
+    start = time.time()
+
+    def parsed(n_parsed):
+        if 'first_result' not in timings:
+            timings['first_result'] = time.time() - start
+
+    product = scraper.Loader(url)
+    reviews = product.stream(n_reviews, workers=workers, store=store)
+    corpus = ReviewSents(product, n_jobs, batch_size, stream=reviews,
+                         progress=parsed)
+
+    timings['elapsed'] = time.time() - start
+    timings['first_page'] = product.stream_stats['first_page']
+    timings['crawled'] = product.stream_stats['crawled']
+
+    return corpus, timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--reviews', type=int, default=300,
+                        help='number of reviews to scrape')
+    parser.add_argument('-l', '--latency', type=float, default=0.2,
+                        help='seconds the stub server delays each page')
+    parser.add_argument('-w', '--workers', type=int, default=4,
+                        help='number of crawler threads')
+    parser.add_argument('-j', '--n_jobs', type=int, default=1,
+                        help='number of parser processes')
+    parser.add_argument('-b', '--batch_size', type=int, default=10,
+                        help='number of reviews parsed at a time')
+    parser.add_argument('--uri', help='MongoDB server to write to instead '
+                                      'of the stand-in collection')
+    args = parser.parse_args()
+
+    stub = StubServer(sample_pages(), latency=args.latency).start()
+    # point the crawls of Loader at the stub server
+    scraper.crawl = functools.partial(crawl, base_url=stub.base_url,
+                                      throttle=HostThrottle(0, jitter=0))
+
+    if args.uri:
+        from pymongo import MongoClient
+        client = MongoClient(args.uri)
+        collection = client['ars_benchmark']['review_data']
+    else:
+        client = None
+        collection = RemoteCollection(0.005)
+
+    url = 'https://www.amazon.com/dp/{}/'.format(ASIN)
+    cwd = os.getcwd()
+    reference = None
+
+    print '{:>10} {:>11} {:>13} {:>9} {:>9} {:>8} {:>6}'.format(
+        'pipeline', 'first page', 'first result', 'crawled', 'elapsed',
+        'reviews', 'match')
+
+    for name, run in [('sequential', sequential), ('stream', streamed)]:
+        # every run scrapes the product from scratch
+        out = tempfile.mkdtemp()
+        os.chdir(out)
+
+        corpus, timings = run(url, args.reviews, args.workers, args.n_jobs,
+                              args.batch_size,
+                              ReviewStore(collection, args.batch_size))
+
+        os.chdir(cwd)
+        shutil.rmtree(out)
+
+        if reference is None:
+            reference = signature(corpus)
+
+        print '{:>10} {:>10.2f}s {:>12.2f}s {:>8.2f}s {:>8.2f}s {:>8} ' \
+            '{:>6}'.format(name, timings['first_page'],
+                           timings['first_result'], timings['crawled'],
+                           timings['elapsed'], corpus.n_reviews,
+                           str(signature(corpus) == reference))
+
+    if client:
+        client.drop_database('ars_benchmark')
+        client.close()
+
+    stub.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+'''
+Local HTTP server that stands in for the Amazon review pages fetched by
+amazon_crawler.py. Pages are built from the reviews in data/sample_data.pkl
+with the markup read by Loader.extract in scraper.py and by amazon_parser.py.
+Responses can be delayed and can randomly fail with 503 to test the crawler
+back-off, and new connections can be delayed to stand in for the handshakes
+with a remote host.
+
+Usage: imported by the crawler benchmarks
+'''
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from urlparse import parse_qs, urlparse
+import cgi
+import cPickle
+import numpy as np
+import os
+import re
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGE = u'''<html><head><title>Amazon.com: Customer reviews: {name}</title>
+<script>var nav = "navigation scripts and ads";</script></head>
+<body><div class="nav-bar">{nav}</div>
+<div class="product-title"><a class="a-link-normal" href="/dp/{asin}">{name}\
+</a></div>
+<span class="a-size-medium totalReviewCount">{total}</span>
+<a href="/product-reviews/{asin}/ref=cm_cr_arp_d_hist_5">5 star</a>
+<div id="cm_cr-review_list" class="a-section a-spacing-none">
+{reviews}
+</div>
+<ul class="a-pagination">{pager}</ul>
+<div class="a-form-actions a-spacing-top-extra-large"></div>
+<div class="nav-footer">{nav}</div>
+</body></html>
+'''
+
+REVIEW = u'''<div id="{review_id}" class="a-section review">\
+<div class="a-row"><a class="a-link-normal" title="{rating}.0 out of 5 stars" \
+href="/review/{review_id}"><i class="a-icon a-icon-star a-star-{rating} \
+review-rating"><span class="a-icon-alt">{rating}.0 out of 5 stars</span></i>\
+</a><a class="a-size-base a-link-normal review-title a-color-base a-text-bold"\
+ href="/review/{review_id}">{headline}</a></div><div class="a-row">\
+<span class="a-size-base a-color-secondary review-byline">By <a class="a-size-\
+base a-link-normal author" href="/gp/pdp/profile/A{idx:06d}/">{author}</a>\
+</span><span class="a-size-base a-color-secondary review-date">on January 1, \
+2016</span></div><div class="a-row review-data"><span class="a-size-base \
+review-text">{review}</span></div><div class="a-row"></div><div class="a-row">\
+</div><span class="cr-vote"></span><a class="report-abuse-link"></a></div>'''
+
+PAGER = u'<li><a href="/product-reviews/{asin}/ref=cm_cr_arp_d_paging_btm_\
+{page}?pageNumber={page}">{page}</a></li>'
+
+CAPTCHA = u'''<html><body><form action="/errors/validateCaptcha">
+<img src="https://images-amazon.com/captcha/abc/Captcha_abc.jpg">
+</form></body></html>
+'''
+
+
+def _text(value):
+    '''
+    INPUT: str
+    OUTPUT: unicode
+
+    Returns html escaped unicode text
+    '''
+    if isinstance(value, str):
+        value = value.decode('utf-8')
+
+    return cgi.escape(value)
+
+
+def review_pages(asin, name, authors, headlines, ratings, reviews,
+                 per_page=10, nav_size=20000, ids=None):
+    '''
+    INPUT: str, str, list(str), list(str), list(int), list(str), int, int,
+           list(str)
+    OUTPUT: list(unicode)
+
+    Args:
+        asin: asin identifier for Amazon product
+        name: name of product
+        authors: author of each review
+        headlines: headline of each review
+        ratings: star rating of each review
+        reviews: text of each review
+        per_page: number of reviews per page
+        nav_size: characters of navigation markup around the reviews, which
+                  makes the pages about as large as real review pages
+        ids: review id of each review, defaults to R followed by the asin
+             and the position of the review
+
+    Returns the html of the review pages of a product. Every page links to
+    the next two pages and to the last page, like the Amazon pager.
+    '''
+    n_pages = max(1, int(np.ceil(len(reviews) / float(per_page))))
+    nav = u'<a href="/nav">link</a>' * (nav_size // 48)
+    pages = []
+
+    for page in range(1, n_pages + 1):
+        blocks = []
+
+        for idx in range((page - 1) * per_page,
+                         min(page * per_page, len(reviews))):
+            blocks.append(REVIEW.format(
+                asin=asin, idx=idx, rating=ratings[idx],
+                review_id=ids[idx] if ids else 'R{}{}'.format(asin, idx),
+                headline=_text(headlines[idx]), author=_text(authors[idx]),
+                review=_text(reviews[idx])))
+
+        links = sorted(set([p for p in [page + 1, page + 2, n_pages]
+                            if 1 < p <= n_pages]))
+        pager = u''.join(PAGER.format(asin=asin, page=p) for p in links)
+
+        pages.append(PAGE.format(asin=asin, name=_text(name),
+                                 total=len(reviews),
+                                 reviews=u'\n'.join(blocks), pager=pager,
+                                 nav=nav))
+
+    return pages
+
+
+def sample_pages(n_products=None, per_page=10):
+    '''
+    INPUT: int, int
+    OUTPUT: dict
+
+    Returns dictionary with asin as key and review pages built from
+    sample_data.pkl as value. The asin is used as product name.
+    '''
+    with open(os.path.join(ROOT, 'data', 'sample_data.pkl'), 'rb') as f:
+        sample_data = cPickle.load(f)
+
+    pages = dict()
+
+    for asin in sorted(sample_data)[:n_products]:
+        pages[asin] = review_pages(asin, asin, *sample_data[asin],
+                                   per_page=per_page)
+
+    return pages
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    pathre = re.compile('/product-reviews/([A-Z0-9]+)/')
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.stub.connect()
+
+    def do_GET(self):
+        stub = self.server.stub
+        match = self.pathre.match(self.path)
+        query = parse_qs(urlparse(self.path).query)
+        status, body = stub.respond(
+            match.group(1) if match else None,
+            int(query.get('pageNumber', ['1'])[0]))
+        body = body.encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(object):
+    '''
+    Serves review pages on a local port in a background thread
+    '''
+
+    def __init__(self, pages, latency=0., error_rate=0., captcha=(), seed=0,
+                 connect_latency=0.):
+        '''
+        INPUT: dict, float, float, iterable, int, float
+        OUTPUT: None
+
+        Args:
+            pages: dictionary with asin as key and list of page html as value
+            latency: seconds each response is delayed
+            error_rate: share of requests answered with a 503 error
+            captcha: (asin, page) pairs answered with a captcha page
+            seed: seed of the random error injection
+            connect_latency: seconds each new connection is delayed
+
+        Attributes:
+            base_url (str):     url to pass to amazon_crawler.crawl
+            connections (int):  number of connections accepted
+            errors (int):       number of 503 responses sent
+            requests (int):     number of requests received
+        '''
+        self.pages = pages
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.connections = 0
+        self.error_rate = error_rate
+        self.captcha = set(captcha)
+        self.errors = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._rnd = np.random.RandomState(seed)
+        self._server = None
+
+    def connect(self):
+        '''
+        INPUT: None
+        OUTPUT: None
+
+        Counts and delays a new connection
+        '''
+        with self._lock:
+            self.connections += 1
+
+        time.sleep(self.connect_latency)
+
+    def respond(self, asin, page):
+        '''
+        INPUT: str, int
+        OUTPUT: int, unicode
+
+        Returns the status code and body for a page request
+        '''
+        with self._lock:
+            self.requests += 1
+            error = self._rnd.random_sample() < self.error_rate
+            self.errors += error
+
+        time.sleep(self.latency)
+
+        if error:
+            return 503, u'Service Unavailable'
+        if (asin, page) in self.captcha:
+            return 200, CAPTCHA
+        if asin not in self.pages or not 1 <= page <= len(self.pages[asin]):
+            return 404, u'Not Found'
+
+        return 200, self.pages[asin][page - 1]
+
+    def start(self):
+        '''
+        INPUT: None
+        OUTPUT: StubServer
+
+        Starts serving on a free local port
+        '''
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.stub = self
+        self.base_url = 'http://127.0.0.1:{}'.format(
+            self._server.server_address[1])
+
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        return self
+
+    def stop(self):
+        '''
+        INPUT: None
+        OUTPUT: None
+
+        Stops the server
+        '''
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,117 @@
+'''
+Benchmarks the results that the Celery tasks of app.py send through the Redis
+result backend: the pickled Loader and Polarizer objects the scraper and
+aspectize tasks used to return, a pickled PolarizerSummary, and the
+versioned msgpack payloads of the PayloadCodec class in task_payload.py with
+and without zlib compression. Products are the reviews of
+data/sample_data.pkl, parsed and summarized with pipeline.py. Reports the
+size of every payload and the time to serialize and deserialize it, and
+checks that the payloads give back the same summary.
+
+Usage: python benchmarks/task_payloads.py [-r 20] [-j 1]
+'''
+
+from __future__ import division
+import argparse
+import cPickle
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+from parse_throughput import load_products
+from parsers import ReviewSents
+from pipeline import summarize
+from summary_cache import PolarizerSummary
+from task_payload import PayloadCodec
+
+
+def timed(function, value, repeats):
+    '''
+    INPUT: function, object, int
+    OUTPUT: object, float
+
+    Returns the result of function on value and its mean seconds over
+    repeats calls
+    '''
+    start = time.time()
+
+    for _ in xrange(repeats):
+        result = function(value)
+
+    return result, (time.time() - start) / repeats
+
+
+def formats(product, polarizer, summary):
+    '''
+    INPUT: Loader, Polarizer, PolarizerSummary
+    OUTPUT: list(tuple)
+
+    Returns (name, value, dumps, loads) of every way to pass the results of
+    the scraper and aspectize tasks, where loads gives back a product asin,
+    a summary or the Polarizer itself
+    '''
+    def pickled(value):
+        return cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL)
+
+    def unpickled(attribute):
+        return lambda payload: getattr(cPickle.loads(payload), attribute)
+
+    packed, compressed = PayloadCodec(None), PayloadCodec(0)
+
+    return [
+        ('pickle Loader', product, pickled, unpickled('asin')),
+        ('msgpack product', product, packed.encode_product,
+         lambda payload: packed.decode_product(payload)['asin']),
+        ('pickle Polarizer', polarizer, pickled, cPickle.loads),
+        ('pickle summary', summary, pickled, cPickle.loads),
+        ('msgpack', summary, packed.encode_summary, packed.decode_summary),
+        ('msgpack+zlib', summary, compressed.encode_summary,
+         compressed.decode_summary)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-r', '--repeats', type=int, default=20,
+                        help='number of times every payload is serialized')
+    parser.add_argument('-j', '--n_jobs', type=int, default=1,
+                        help='number of parser processes')
+    args = parser.parse_args()
+
+    print '{:>11} {:>17} {:>10} {:>10} {:>10} {:>6}'.format(
+        'product', 'payload', 'bytes', 'dumps', 'loads', 'match')
+
+    for product in load_products():
+        corpus = ReviewSents(product, args.n_jobs)
+        polarizer = summarize(corpus)
+        summary = PolarizerSummary(polarizer)
+        reference = summary.to_doc(None)
+
+        for name, value, dumps, loads in formats(product, polarizer,
+                                                 summary):
+            try:
+                payload, dump_time = timed(dumps, value, args.repeats)
+            except (cPickle.PicklingError, TypeError) as e:
+                print '{:>11} {:>17} {}'.format(product.asin, name, e)
+                continue
+
+            result, load_time = timed(loads, payload, args.repeats)
+
+            if isinstance(result, PolarizerSummary):
+                match = result.to_doc(None) == reference
+            else:
+                match = result == product.asin
+
+            if name == 'pickle Polarizer':
+                # the pickled Polarizer is used as is, not as a summary
+                match = '-'
+
+            print '{:>11} {:>17} {:>10} {:>8.2f}ms {:>8.2f}ms {:>6}'.format(
+                product.asin, name, len(payload), dump_time * 1000,
+                load_time * 1000, str(match))
+
+
+if __name__ == '__main__':
+    main()
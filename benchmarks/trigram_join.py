@@ -0,0 +1,220 @@
+'''
+Benchmarks the trigram join, bigram popping and unigram review count update
+steps of the Trigramer, Bigramer and Unigramer classes in parsers.py against
+the all-pairs scans they replaced. Uses a synthetic corpus of candidate
+bigrams so that the number of bigrams can be scaled up freely. Checks that
+both versions give the same results.
+
+Usage: python benchmarks/trigram_join.py [-b 500 2000 5000]
+'''
+
+from __future__ import division
+import argparse
+import copy
+import numpy as np
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+from parsers import Bigramer, Trigramer, Unigramer
+from postings import PostingList
+
+
+class SyntheticTokens(object):
+    '''
+    Stands in for the parts of TokenStore used by the trigram steps
+    '''
+
+    def __init__(self, sent_review):
+        self.sent_review = sent_review
+
+
+class SyntheticCorpus(object):
+    '''
+    Stands in for the parts of ReviewSents used by the trigram steps
+    '''
+
+    def __init__(self, n_sent, n_reviews, seed=0):
+        rnd = np.random.RandomState(seed)
+        sent_review = np.sort(rnd.randint(0, n_reviews, n_sent))
+
+        self.n_reviews, self.n_sent = n_reviews, n_sent
+        self.tokens = SyntheticTokens(sent_review)
+
+
+def synthetic_miners(n_bigrams, n_words, corpus, seed=0):
+    '''
+    INPUT: int, int, SyntheticCorpus, int
+    OUTPUT: Unigramer, Bigramer
+
+    Creates Unigramer and Bigramer objects with random candidate bigrams.
+    Words like w1 and w12 are substrings of other words, which checks that
+    update_review_count matches unigrams to n-grams as the reference does.
+    '''
+    rnd = np.random.RandomState(seed)
+    words = ['w{}'.format(i) for i in xrange(n_words)]
+    sent_review = corpus.tokens.sent_review
+
+    unigramer = Unigramer()
+    bigramer = Bigramer(unigramer)
+
+    while len(bigramer.bigrams) < n_bigrams:
+        word1, word2 = rnd.choice(words, 2, replace=False)
+        bigram = word1 + ' ' + word2
+
+        sents = np.unique(rnd.randint(0, corpus.n_sent, rnd.randint(2, 40)))
+        bigramer.bigrams.add(bigram)
+        bigramer.bigram_words.update([word1, word2])
+        bigramer.sent_dict[bigram] = PostingList(sents)
+        bigramer.word_pos_dict[bigram] = rnd.randint(0, 20, len(sents)) \
+            .tolist()
+        bigramer.rev_dict[bigram] = PostingList(sent_review[sents])
+
+    unigramer.unigrams = set(words[:n_words // 2])
+
+    for word in unigramer.unigrams:
+        sents = np.unique(rnd.randint(0, corpus.n_sent, 30))
+        unigramer.rev_dict[word] = PostingList(sent_review[sents])
+
+    return unigramer, bigramer
+
+
+def reference_trigrams(trigramer, corpus, review_pct=0.40):
+    '''
+    All-pairs version of Trigramer.candidate_trigrams
+    '''
+    bigrams, trigrams = trigramer.bigramer.bigrams, trigramer.trigrams
+    bgrm_rdict = trigramer.bigramer.rev_dict
+    bgrm_sdict = trigramer.bigramer.sent_dict
+    bgrm_wdict = trigramer.bigramer.word_pos_dict
+
+    split_bigrams = [bigram.split(" ") for bigram in bigrams]
+
+    for bigram1, split1 in zip(bigrams, split_bigrams):
+        for bigram2, split2 in zip(bigrams, split_bigrams):
+            if split1[1] != split2[0]:
+                continue
+
+            bg12_min_cnt = min(len(bgrm_rdict[bigram1]),
+                               len(bgrm_rdict[bigram2]))
+            bg_common_cnt = len(bgrm_rdict[bigram1] & bgrm_rdict[bigram2])
+
+            if bg_common_cnt / bg12_min_cnt < review_pct:
+                continue
+
+            trigram = " ".join([split1[0], split1[1], split2[1]])
+            trigrams.add(trigram)
+
+            sents1 = bgrm_sdict[bigram1].tolist()
+            match_idx = np.in1d(sents1, bgrm_sdict[bigram2].tolist())
+            sents = np.array(sents1)[match_idx].tolist()
+            trigramer.sent_dict[trigram] = sents
+            trigramer.word_pos_dict[trigram] = \
+                np.array(bgrm_wdict[bigram1])[match_idx].tolist()
+            trigramer.rev_dict[trigram] = \
+                set(int(corpus.tokens.sent_review[si]) for si in sents)
+
+    return trigrams
+
+
+def reference_pop(bigramer, trigramer):
+    '''
+    All-pairs version of Bigramer.pop_bigrams
+    '''
+    bigrams = sorted(list(bigramer.bigrams))
+    split_bigrams = [bigram.split(" ") for bigram in bigrams]
+
+    for trigram in trigramer.trigrams:
+        trigram = trigram.split(" ")
+        for bigram, split in zip(bigrams, split_bigrams):
+            if split[0] in trigram and split[1] in trigram:
+                bigramer.bigrams -= set([bigram])
+
+
+def reference_update(unigramer, bigramer, trigramer):
+    '''
+    All-pairs version of Unigramer.update_review_count
+    '''
+    update_queue = unigramer.unigrams & bigramer.bigram_words
+
+    for unigram in update_queue:
+        for bigram in bigramer.bigrams:
+            if unigram in bigram:
+                unigramer.rev_dict[unigram] -= bigramer.rev_dict[bigram]
+
+        for trigram in trigramer.trigrams:
+            if unigram in trigram:
+                unigramer.rev_dict[unigram] -= trigramer.rev_dict[trigram]
+
+
+def run(unigramer, bigramer, corpus, reference):
+    '''
+    INPUT: Unigramer, Bigramer, SyntheticCorpus, bool
+    OUTPUT: list(float), tuple
+
+    Runs the three steps and returns their timings and results
+    '''
+    trigramer = Trigramer(bigramer)
+    timings = []
+
+    start = time.time()
+    if reference:
+        reference_trigrams(trigramer, corpus)
+    else:
+        trigramer.candidate_trigrams(corpus)
+    timings.append(time.time() - start)
+
+    start = time.time()
+    if reference:
+        reference_pop(bigramer, trigramer)
+    else:
+        bigramer.pop_bigrams(trigramer)
+    timings.append(time.time() - start)
+
+    start = time.time()
+    if reference:
+        reference_update(unigramer, bigramer, trigramer)
+    else:
+        unigramer.update_review_count(bigramer, trigramer)
+    timings.append(time.time() - start)
+
+    result = (trigramer.trigrams, dict(trigramer.sent_dict),
+              dict(trigramer.word_pos_dict), dict(trigramer.rev_dict),
+              bigramer.bigrams, dict(unigramer.rev_dict))
+
+    return timings, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-b', '--bigrams', nargs='+', type=int,
+                        default=[500, 2000, 5000],
+                        help='numbers of candidate bigrams to benchmark')
+    args = parser.parse_args()
+
+    corpus = SyntheticCorpus(n_sent=20000, n_reviews=2000)
+
+    print '{:>8} {:>10} {:>10} {:>10} {:>10} {:>8}'.format(
+        'bigrams', 'version', 'trigrams', 'pop', 'update', 'match')
+
+    for n_bigrams in args.bigrams:
+        unigramer, bigramer = synthetic_miners(n_bigrams, n_bigrams // 2,
+                                               corpus)
+        results = []
+
+        for version in ['all-pairs', 'indexed']:
+            miners = copy.deepcopy((unigramer, bigramer))
+            timings, result = run(miners[0], miners[1], corpus,
+                                  version == 'all-pairs')
+            results.append(result)
+
+            match = 'ref' if len(results) == 1 else str(results[0] == result)
+            print '{:>8} {:>10} {:>9.3f}s {:>9.3f}s {:>9.3f}s {:>8}'.format(
+                n_bigrams, version, timings[0], timings[1], timings[2], match)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+'''
+Puts the app and benchmarks folders on the import path, as the scripts in
+benchmarks/ do, so that tests import the app modules by name.
+
+Also contains a small stand-in for the spacy parser used by parsers.py. It
+splits reviews into words and sentences with regular expressions and gives
+every token a tag, dependency, head and probability picked from a checksum
+of its lemma, so that parsing and aspect mining can be checked against the
+old code paths without the spacy English model.
+'''
+
+import cPickle
+import os
+import pytest
+import re
+import sys
+import zlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+sys.path.insert(0, os.path.join(ROOT, 'app'))
+
+# reviews containing this text make the stand-in parser fail
+FAIL = u'PARSER FAILS HERE'
+
+STOPWORDS = set([u'a', u'an', u'and', u'i', u'is', u'it', u'of', u'the',
+                 u'this', u'to', u'was'])
+TAGS = ['NN', 'NN', 'NNS', 'JJ', 'VB', 'RB', 'IN']
+DEPS = ['amod', 'amod', 'nsubj', 'dobj', 'compound', 'advmod', 'prep',
+        'det']
+
+tokenre = re.compile(r'(\w+|[^\w\s])(\s*)', re.U)
+
+
+def _checksum(*values):
+    '''
+    INPUT: unicode
+    OUTPUT: int
+
+    Returns a checksum of values that is the same in every process
+    '''
+    return zlib.crc32(u' '.join(values).encode('utf-8')) & 0xffffffff
+
+
+class FakeLexeme(object):
+    def __init__(self, prob):
+        self.prob = prob
+
+
+class FakeVocab(object):
+    '''
+    Gives stopwords and short words a high probability, like common words in
+    the spacy vocab
+    '''
+
+    def __getitem__(self, lemma):
+        if lemma in STOPWORDS or len(lemma) < 3:
+            return FakeLexeme(-5.)
+
+        return FakeLexeme(-10.)
+
+
+class FakeToken(object):
+    def __init__(self, i, idx, text, space):
+        self.i = i
+        self.idx = idx
+        self.lemma_ = self.lemma = text.lower()
+        self.string = text + space
+        self.vocab = VOCAB
+        self.head = self
+
+        if not text[0].isalnum():
+            self.tag_, self.dep_ = '.', 'punct'
+        elif self.lemma_ in STOPWORDS:
+            self.tag_, self.dep_ = 'DT', 'det'
+        else:
+            self.tag_ = TAGS[_checksum(self.lemma_) % len(TAGS)]
+            self.dep_ = DEPS[_checksum(self.lemma_, 'dep') % len(DEPS)]
+
+
+class FakeSpan(list):
+    @property
+    def string(self):
+        return u''.join(token.string for token in self)
+
+
+class FakeDoc(object):
+    '''
+    Parsed review of the stand-in parser, serialized as its text
+    '''
+
+    def __init__(self, vocab, text=None):
+        self.vocab = vocab
+        self.text = text
+
+    @property
+    def sents(self):
+        sents, sent = [], FakeSpan()
+
+        for i, match in enumerate(tokenre.finditer(self.text)):
+            token = FakeToken(i, match.start(), match.group(1),
+                              match.group(2))
+            sent.append(token)
+
+            if token.lemma_ in u'.!?':
+                sents.append(sent)
+                sent = FakeSpan()
+
+        if sent:
+            sents.append(sent)
+
+        for sent in sents:
+            for token in sent:
+                head = _checksum(token.lemma_, 'head') % len(sent)
+                token.head = sent[head]
+
+        return sents
+
+    def to_bytes(self):
+        return cPickle.dumps(self.text, 2)
+
+    def from_bytes(self, data):
+        self.text = cPickle.loads(data)
+        return self
+
+
+class FakeParser(object):
+    vocab = None
+
+    def __call__(self, text):
+        if FAIL in text:
+            raise AssertionError(text)
+
+        return FakeDoc(self.vocab, text)
+
+    def pipe(self, texts, batch_size=1, n_threads=1):
+        # spacy fails on the whole batch if it fails on one review
+        return [self(text) for text in texts]
+
+
+VOCAB = FakeVocab()
+FakeParser.vocab = VOCAB
+
+
+class Product(object):
+    '''
+    Stand-in for an extracted Loader
+    '''
+
+    def __init__(self, asin, ratings, reviews, name=None):
+        self.asin = asin
+        self.name = name or asin
+        self.ratings = ratings
+        self.reviews = reviews
+
+
+def sample_product(n_reviews=60, asin='B00J7B8T5Q'):
+    '''
+    INPUT: int, str
+    OUTPUT: Product
+
+    Returns the first n_reviews reviews of a product in sample_data.pkl
+    '''
+    with open(os.path.join(ROOT, 'data', 'sample_data.pkl'), 'rb') as f:
+        _, _, ratings, reviews = cPickle.load(f)[asin]
+
+    return Product(asin, ratings[:n_reviews],
+                   [review.decode('utf-8') for review in reviews[:n_reviews]])
+
+
+@pytest.fixture
+def fake_parser(monkeypatch):
+    '''
+    Makes parsers.py parse with FakeParser
+    '''
+    pytest.importorskip('spacy.en')
+    pytest.importorskip('textblob')
+    import parsers
+
+    monkeypatch.setattr(parsers, 'parser', FakeParser())
+    monkeypatch.setattr(parsers, 'Doc', FakeDoc)
+
+    return parsers
+
+
+@pytest.fixture
+def corpus(fake_parser):
+    '''
+    ReviewSents of sample reviews parsed with FakeParser
+    '''
+    return fake_parser.ReviewSents(sample_product())
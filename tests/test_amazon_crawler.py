@@ -0,0 +1,135 @@
+'''
+Checks the crawls of amazon_crawler.py against the stub server of
+stub_server.py.
+'''
+
+import pytest
+
+pytest.importorskip('requests')
+
+from crawl_throughput import saved_pages_match
+from http_client import HttpClient
+from stub_server import StubServer, review_pages, sample_pages
+import amazon_crawler
+import codecs
+import os
+
+
+@pytest.fixture(scope='module')
+def stub():
+    '''
+    Stub server with the review pages of one sample product
+    '''
+    stub = StubServer(sample_pages(n_products=1)).start()
+    yield stub
+    stub.stop()
+
+
+def crawl(stub, out, client, workers=4, step=1, **kwargs):
+    '''
+    INPUT: StubServer, str, HttpClient, int, float
+    OUTPUT: dict
+
+    Crawls every product of stub into out without pauses, except for the
+    pauses of step seconds added on 503 errors
+    '''
+    return amazon_crawler.crawl(
+        sorted(stub.pages), out=out, workers=workers,
+        base_url=stub.base_url, client=client,
+        throttle=amazon_crawler.HostThrottle(0, jitter=0, step=step),
+        **kwargs)
+
+
+def test_shared_throttle_per_host():
+    throttle = amazon_crawler.shared_throttle('www.amazon.test', pause=3)
+
+    assert amazon_crawler.shared_throttle('www.amazon.test') is throttle
+    assert throttle.pause('www.amazon.test') == 3
+    assert amazon_crawler.shared_throttle('www.amazon.other') is not throttle
+
+
+def test_crawls_use_shared_throttle(tmpdir, monkeypatch):
+    pages = {'B000000000': review_pages('B000000000', 'Product', ['a'],
+                                        ['h'], [5], ['review'], nav_size=0)}
+    stub = StubServer(pages).start()
+    waits = []
+
+    try:
+        host = stub.base_url.split('//')[1]
+        throttle = amazon_crawler.shared_throttle(host, pause=0)
+        throttle.jitter = 0
+        monkeypatch.setattr(throttle, 'wait', waits.append)
+
+        for _ in range(2):
+            amazon_crawler.crawl(['B000000000'], out=str(tmpdir), force=True,
+                                 base_url=stub.base_url)
+    finally:
+        stub.stop()
+
+    assert waits == [host, host]
+
+
+@pytest.mark.parametrize('keep_alive', [False, True])
+def test_keep_alive_reuses_connections(stub, tmpdir, keep_alive):
+    client = HttpClient(pool_size=4, keep_alive=keep_alive)
+
+    try:
+        result, = crawl(stub, str(tmpdir), client).values()
+    finally:
+        client.close()
+
+    stats = client.stats()
+
+    assert result['status'] == 'complete'
+    assert stats['requests'] == len(result['fetched'])
+
+    if keep_alive:
+        assert stats['connections'] <= 4
+    else:
+        assert stats['connections'] == stats['requests']
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_workers_store_same_pages(stub, tmpdir, workers):
+    client = HttpClient(pool_size=workers)
+
+    try:
+        result, = crawl(stub, str(tmpdir), client, workers).values()
+    finally:
+        client.close()
+
+    assert result['status'] == 'complete'
+    assert sorted(result['fetched']) == range(1, len(result['codes']) + 1)
+    assert saved_pages_match(stub.pages, str(tmpdir))
+
+
+def test_retries_503_pages(tmpdir):
+    stub = StubServer(sample_pages(n_products=1), error_rate=0.3).start()
+    client = HttpClient(pool_size=4)
+
+    try:
+        result, = crawl(stub, str(tmpdir), client, step=0.01).values()
+    finally:
+        client.close()
+        stub.stop()
+
+    assert stub.errors > 0
+    assert result['status'] == 'complete'
+    assert saved_pages_match(stub.pages, str(tmpdir))
+
+
+def test_raw_pages_match_served_html(stub, tmpdir):
+    client = HttpClient(pool_size=4)
+
+    try:
+        crawl(stub, str(tmpdir), client, raw=True)
+    finally:
+        client.close()
+
+    for asin, htmls in stub.pages.iteritems():
+        for page, html in enumerate(htmls, 1):
+            path = amazon_crawler.page_path(
+                os.path.join(str(tmpdir), 'com'), asin, page)
+
+            with codecs.open(path, encoding='utf8') as f:
+                assert f.read() == html
@@ -0,0 +1,235 @@
+'''
+Checks the Celery workflows of app.py: the task ids start_job keeps in the
+session, and the status and results pages made from the states of those
+tasks. Workflows are sent to an in-memory broker without a worker, and task
+states are written to an in-memory result backend by hand. The MongoDB
+client of review_store.py is replaced with in-memory collections.
+'''
+
+import os
+import pytest
+
+pytest.importorskip('celery')
+pytest.importorskip('flask')
+pytest.importorskip('pymongo')
+pytest.importorskip('spacy.en')
+
+from celery.signals import before_task_publish
+from review_lookup import IndexedCollection
+import review_store
+
+URLS = ['https://www.amazon.com/dp/B00J7B8T5Q/',
+        'https://www.amazon.com/dp/B004NBXVFS/']
+
+
+class Collection(IndexedCollection):
+    '''
+    Stand-in for a collection that also answers queries by _id
+    '''
+
+    def __init__(self):
+        IndexedCollection.__init__(self, 0)
+
+    def find(self, filter_=None, projection=None):
+        if filter_ and '_id' in filter_:
+            return [doc for doc in self.docs.values()
+                    if doc['_id'] == filter_['_id']]
+
+        return IndexedCollection.find(self, filter_, projection)
+
+
+class Database(dict):
+    '''
+    Stand-in for a MongoDB database, making collections on use
+    '''
+
+    def __missing__(self, name):
+        self[name] = Collection()
+        return self[name]
+
+
+class Client(dict):
+    '''
+    Stand-in for a MongoClient, making databases on use
+    '''
+
+    def __missing__(self, name):
+        self[name] = Database()
+        return self[name]
+
+
+client = Client()
+
+
+@pytest.fixture(scope='module')
+def app():
+    '''
+    app.py with the in-memory MongoDB client, broker and result backend
+    '''
+    # the sample products are stored, so app.py does not store them again
+    for asin in ['B004NBXVFS', 'B00J7B8T5Q']:
+        client['ars']['review_data'].docs[asin + '_0'] = {
+            '_id': asin + '_0', 'asin': asin, 'review_idx': 0}
+
+    saved = review_store._client, review_store._client_pid
+    review_store._client, review_store._client_pid = client, os.getpid()
+
+    try:
+        import app
+    finally:
+        review_store._client, review_store._client_pid = saved
+
+    app.celery.conf.update(broker_url='memory://',
+                           result_backend='cache+memory://')
+    app.app.config['TESTING'] = True
+
+    return app
+
+
+@pytest.fixture
+def published():
+    '''
+    Dictionary with the name of every task sent to the broker as key and
+    the ids of its tasks as value, including the tasks that are sent later
+    by the tasks before them in a chain or chord
+    '''
+    tasks = dict()
+
+    def add(name, id_):
+        tasks.setdefault(name.split('.')[-1], set()).add(id_)
+
+    def signature(sig):
+        add(sig.task, sig.options['task_id'])
+
+        if sig.options.get('chord'):
+            signature(sig.options['chord'])
+
+    def publish(sender=None, body=None, headers=None, **kwargs):
+        add(sender, headers['id'])
+
+        for sig in body[2]['chain'] or []:
+            signature(sig)
+
+    before_task_publish.connect(publish, weak=False)
+    yield tasks
+    before_task_publish.disconnect(publish)
+
+
+@pytest.fixture
+def web(app, monkeypatch):
+    '''
+    Test client of the Flask app whose pages show the name of their template
+    '''
+    monkeypatch.setattr(app, 'render_template', lambda name, **kwargs: name)
+
+    return app.app.test_client()
+
+
+def job(web):
+    '''
+    INPUT: FlaskClient
+    OUTPUT: list(str)
+
+    Returns the task ids start_job kept in the session
+    '''
+    with web.session_transaction() as session:
+        return session['job']
+
+
+def summarize(web):
+    '''
+    INPUT: FlaskClient
+    OUTPUT: list(str)
+
+    Starts the summary of a product and returns the ids of its tasks
+    '''
+    response = web.post('/summarize_scraped', data={'url1': URLS[0]})
+    assert response.status_code == 302
+
+    return job(web)
+
+
+def test_summarize_job_ids(web, published):
+    ids = summarize(web)
+
+    assert ids[0] in published['collector']
+    assert set(ids) == published['collector'] | published['aspectize'] | \
+        published['scraper']
+    assert [len(published[name])
+            for name in ['scraper', 'aspectize', 'collector']] == [1, 1, 1]
+
+
+def test_compare_job_ids(web, published):
+    response = web.post('/compare_scraped',
+                        data={'url1': URLS[0], 'url2': URLS[1]})
+    assert response.status_code == 302
+
+    ids = job(web)
+
+    assert len(ids) == 5
+    assert ids[0] in published['collector']
+    assert set(ids) == published['collector'] | published['aspectize'] | \
+        published['scraper']
+    assert [len(published[name])
+            for name in ['scraper', 'aspectize', 'collector']] == [2, 2, 1]
+
+
+@pytest.mark.parametrize('failed', range(5))
+def test_failure_anywhere_fails(app, web, failed):
+    web.post('/compare_scraped', data={'url1': URLS[0], 'url2': URLS[1]})
+    ids = job(web)
+
+    # ids list later tasks first, the tasks before ids[failed] never run
+    for id_ in ids[failed + 1:]:
+        app.celery.backend.mark_as_done(id_, None)
+    app.celery.backend.mark_as_failure(ids[failed],
+                                       RuntimeError("Scraping failed"))
+
+    assert web.get('/compare_results').data == 'failed.html'
+    assert web.get('/status').get_json()['failed']
+
+
+def test_running_job_waits(app, web):
+    ids = summarize(web)
+    meta = {'stage': 'parse', 'asin': 'B00J7B8T5Q', 'parsed': 40}
+
+    app.celery.backend.mark_as_done(ids[2], None)
+    app.celery.backend.store_result(ids[1], meta, 'PROGRESS')
+
+    status = web.get('/status').get_json()
+
+    assert web.get('/summarize_results').data == 'waiting.html'
+    assert status['stages'] == [meta]
+    assert (status['done'], status['tasks']) == (1, 3)
+    assert not status['ready'] and not status['failed']
+
+
+def test_finished_job_results(app, web):
+    ids = summarize(web)
+    result = [[u'battery life'], [[0.5, 0.25]], [u'battery life'], [4.5],
+              u'<p>snippets</p>', [u'review'], [u'img'], [u'$10'],
+              [u'Product'], [URLS[0]]]
+
+    for id_ in ids[1:]:
+        app.celery.backend.mark_as_done(id_, None)
+    app.celery.backend.mark_as_done(
+        ids[0], app.payload_codec.encode_results(['B00J7B8T5Q'], result))
+
+    with app.app.test_request_context():
+        app.session['job'] = ids
+        assert app.job_results() == {'asins': ['B00J7B8T5Q'],
+                                     'result': result}
+
+    assert web.get('/status').get_json()['ready']
+    assert web.get('/summarize_results').data == 'summarize_results.html'
+
+
+def test_finished_job_without_matches(app, web):
+    ids = summarize(web)
+
+    for id_ in ids[1:]:
+        app.celery.backend.mark_as_done(id_, None)
+    app.celery.backend.mark_as_done(
+        ids[0], app.payload_codec.encode_results(['B00J7B8T5Q'], None))
+
+    assert web.get('/summarize_results').data == 'no_matches.html'
@@ -0,0 +1,46 @@
+'''
+Checks that CrawlManifest round-trips through manifest.json and tells which
+pages needed for a number of reviews are stored.
+'''
+
+from crawl_manifest import CrawlManifest
+
+
+def manifest(folder, status, completed, last_page=12):
+    '''
+    INPUT: str, str, list(int), int
+    OUTPUT: CrawlManifest
+
+    Returns a saved manifest of a crawl with the given pages stored
+    '''
+    manifest = CrawlManifest(str(folder), 'B000000000', 300)
+    manifest.completed_pages = completed
+    manifest.last_page = last_page
+    manifest.finish(status)
+
+    return manifest
+
+
+def test_round_trip(tmpdir):
+    saved = manifest(tmpdir, 'complete', [1, 2, 3])
+    loaded = CrawlManifest.load(str(tmpdir))
+
+    assert loaded.__dict__ == saved.__dict__
+    assert CrawlManifest.load(str(tmpdir.join('missing'))) is None
+
+
+def test_missing_pages(tmpdir):
+    partial = manifest(tmpdir, 'failed', [1, 2, 4])
+
+    assert partial.missing_pages(20) == []
+    assert partial.missing_pages(45) == [3, 5]
+    assert partial.missing_pages() == [3] + range(5, 13)
+    assert not partial.ready(20)
+
+
+def test_ready(tmpdir):
+    complete = manifest(tmpdir, 'complete', range(1, 4), last_page=3)
+
+    assert complete.ready(300)
+    assert complete.ready()
+    assert not complete.running()
@@ -0,0 +1,65 @@
+'''
+Checks that DocCache gives back parsed reviews and keeps a folder shared by
+several caches within max_bytes.
+'''
+
+from conftest import FakeParser, sample_product
+import os
+import pytest
+
+pytest.importorskip('spacy')
+
+from doc_cache import DocCache
+
+
+class NoParser(FakeParser):
+    def __call__(self, text):
+        raise RuntimeError("review parsed again")
+
+
+def folder_size(folder):
+    '''
+    INPUT: str
+    OUTPUT: int
+
+    Returns the total size of the cached documents in folder
+    '''
+    return sum(os.path.getsize(os.path.join(folder, file_))
+               for file_ in os.listdir(folder) if file_.endswith('.doc'))
+
+
+def test_round_trip(tmpdir):
+    cache = DocCache(str(tmpdir))
+    key = cache.key(u'Caf\xe9 review')
+
+    assert cache.get(key) is None
+    cache.put(key, 'doc bytes')
+    assert cache.get(key) == 'doc bytes'
+    assert DocCache(str(tmpdir)).get(key) == 'doc bytes'
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_parsed_reviews_are_reused(tmpdir, fake_parser, monkeypatch):
+    product = sample_product(20)
+    cache = DocCache(str(tmpdir))
+    reference = fake_parser.ReviewSents(product, cache=cache)
+
+    # every review is read from the cache, none is parsed again
+    monkeypatch.setattr(fake_parser, 'parser', NoParser())
+    corpus = fake_parser.ReviewSents(product, cache=DocCache(str(tmpdir)))
+
+    assert [s.sent.string for s in corpus.sentences] == \
+        [s.sent.string for s in reference.sentences]
+
+
+def test_shared_folder_stays_within_max_bytes(tmpdir):
+    caches = [DocCache(str(tmpdir), max_bytes=1000, scan_every=5)
+              for _ in range(3)]
+
+    for i in range(60):
+        cache = caches[i % 3]
+        cache.put(cache.key(unicode(i)), 'x' * 100)
+
+    assert folder_size(str(tmpdir)) <= 1000 + 2 * 5 * 100
+    caches[0]._evict()
+    assert folder_size(str(tmpdir)) <= 1000
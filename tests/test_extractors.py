@@ -0,0 +1,60 @@
+'''
+Checks that the regex engine of extractors.py finds the same reviews as the
+reference soup engine, on the sample review pages of stub_server.py and on
+pages whose review text has nested spans and entities.
+'''
+
+from extractors import get_extractor, regex_reviews, soup_reviews
+from stub_server import review_pages, sample_pages
+import pytest
+
+NESTED = [
+    u'Works great.<br/><span class="a-text-bold">Update:</span> still '
+    u'going <span><span>strong</span></span> after a year.',
+    u'Short <span class="a-expander-prompt">Read more</span> &amp; done',
+    u'Empty <span/> span and <SPAN>upper case</SPAN> tags.',
+    u'Plain review without markup.']
+
+
+def nested_pages():
+    '''
+    INPUT: None
+    OUTPUT: list(unicode)
+
+    Returns review pages whose review texts are the html fragments in NESTED
+    '''
+    n = len(NESTED)
+    placeholders = [u'REVIEW{}'.format(idx) for idx in range(n)]
+    pages = review_pages('B000000000', 'Product', ['Author'] * n,
+                         ['Headline'] * n, [5, 4, 3, 2], placeholders,
+                         per_page=3, nav_size=0)
+
+    for placeholder, fragment in reversed(zip(placeholders, NESTED)):
+        pages = [page.replace(placeholder, fragment) for page in pages]
+
+    return pages
+
+
+def test_sample_pages_match():
+    for pages in sample_pages(n_products=2).values():
+        for html in pages:
+            assert regex_reviews(html) == soup_reviews(html)
+
+
+def test_nested_spans_match():
+    for html in nested_pages():
+        assert regex_reviews(html) == soup_reviews(html)
+
+
+def test_nested_spans_keep_whole_review():
+    reviews = [record['review'] for html in nested_pages()
+               for record in regex_reviews(html)]
+
+    assert reviews[0] == u'Works great.Update: still going strong after ' \
+        u'a year.'
+    assert reviews[1] == u'Short Read more & done'
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        get_extractor('lxml')
@@ -0,0 +1,146 @@
+'''
+Checks that PageStore gives back the review list regions of the pages it
+stored, after compaction and after reopening it from disk, also when several
+stores or processes write the same product, and that the extractors find the
+same reviews in the regions as in the full pages.
+'''
+
+from multiprocessing import Process
+import pytest
+
+pytest.importorskip('bs4')
+
+from extractors import regex_reviews, soup_reviews
+from page_store import PageStore, trim
+from stub_server import sample_pages
+
+ASIN = 'B00J7B8T5Q'
+
+
+@pytest.fixture(scope='module')
+def htmls():
+    '''
+    Review pages of one sample product
+    '''
+    return sample_pages()[ASIN]
+
+
+def fill(folder, htmls, **kwargs):
+    '''
+    INPUT: str, list(unicode)
+    OUTPUT: PageStore
+
+    Returns a store of the pages in htmls, numbered from 1
+    '''
+    store = PageStore(folder, ASIN, **kwargs)
+
+    for page, html in enumerate(htmls, 1):
+        store.put(page, html)
+
+    return store
+
+
+def test_round_trip(tmpdir, htmls):
+    store = fill(str(tmpdir), htmls)
+
+    assert len(store) == len(htmls)
+    assert store.name is not None
+    assert store.review_count is not None
+
+    for page, html in enumerate(htmls, 1):
+        region, trimmed = trim(html)
+        assert trimmed
+        assert store.get(page) == region
+
+    assert list(store.items()) == [(page, trim(html)[0])
+                                   for page, html in enumerate(htmls, 1)]
+
+
+def test_reopen(tmpdir, htmls):
+    store = fill(str(tmpdir), htmls)
+    reopened = PageStore(str(tmpdir))
+
+    assert PageStore.exists(str(tmpdir))
+    assert reopened.asin == ASIN
+    assert reopened.name == store.name
+    assert reopened.review_count == store.review_count
+    assert list(reopened.items()) == list(store.items())
+
+
+def test_overwrite_compacts(tmpdir, htmls):
+    store = fill(str(tmpdir), htmls)
+    size = store.size()
+
+    # without compaction pages.z would hold five versions of every page
+    for _ in range(3):
+        fill(str(tmpdir), htmls)
+
+    store = fill(str(tmpdir), htmls)
+
+    assert store.size() < 2 * size
+    assert list(store.items()) == list(PageStore(str(tmpdir)).items())
+    assert [region for _, region in store.items()] == \
+        [trim(html)[0] for html in htmls]
+
+
+def test_extractors_on_regions(tmpdir, htmls):
+    store = fill(str(tmpdir), htmls)
+
+    for page, html in enumerate(htmls, 1):
+        region = store.get(page)
+
+        assert soup_reviews(region) == soup_reviews(html)
+        assert regex_reviews(region) == regex_reviews(html)
+        assert soup_reviews(region)
+
+
+def test_stores_of_one_folder_keep_each_others_pages(tmpdir, htmls):
+    first, second = PageStore(str(tmpdir), ASIN), PageStore(str(tmpdir))
+
+    for page, html in enumerate(htmls, 1):
+        (first if page % 2 else second).put(page, html)
+
+    assert list(PageStore(str(tmpdir)).items()) == \
+        [(page, trim(html)[0]) for page, html in enumerate(htmls, 1)]
+
+
+def test_reads_after_compaction_by_another_store(tmpdir, htmls):
+    reader = fill(str(tmpdir), htmls)
+
+    # storing every page twice more compacts pages.z
+    for _ in range(2):
+        fill(str(tmpdir), htmls)
+
+    assert [reader.get(page) for page in range(1, len(htmls) + 1)] == \
+        [trim(html)[0] for html in htmls]
+
+
+def test_append_numbers_after_other_stores(tmpdir, htmls):
+    first, second = PageStore(str(tmpdir), ASIN), PageStore(str(tmpdir))
+
+    assert [store.append(html) for store, html in
+            zip([first, second, first, second], htmls)] == [1, 2, 3, 4]
+    assert [region for _, region in second.items()] == \
+        [trim(html)[0] for html in htmls[:4]]
+
+
+def put_pages(folder, htmls, pages):
+    for _ in range(3):
+        for page in pages:
+            PageStore(folder, ASIN).put(page, htmls[page - 1])
+
+
+def test_processes_writing_one_product(tmpdir, htmls):
+    processes = [Process(target=put_pages,
+                         args=(str(tmpdir), htmls,
+                               range(start, len(htmls) + 1, 4)))
+                 for start in range(1, 5)]
+
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert [process.exitcode for process in processes] == [0] * 4
+    assert list(PageStore(str(tmpdir)).items()) == \
+        [(page, trim(html)[0]) for page, html in enumerate(htmls, 1)]
@@ -0,0 +1,292 @@
+'''
+Checks the parsing and aspect mining steps of parsers.py against the code
+paths they replaced.
+'''
+
+from __future__ import division
+from collections import Counter, defaultdict
+from conftest import FAIL, sample_product
+import numpy as np
+import pytest
+
+pytest.importorskip('spacy.en')
+pytest.importorskip('textblob')
+
+from parse_throughput import signature
+from parsers import Bigramer, Trigramer, Unigramer
+from postings import PostingList
+from wordsets import com_dep, com_tag, noun_tag, nonaspects
+import trigram_join
+
+
+@pytest.mark.parametrize('n_jobs, batch_size', [(1, 7), (2, None), (2, 5)])
+def test_batched_parsing_matches_one_at_a_time(fake_parser, n_jobs,
+                                               batch_size):
+    product = sample_product(30)
+    product.reviews[3] = FAIL
+    reference = fake_parser.ReviewSents(product)
+    corpus = fake_parser.ReviewSents(product, n_jobs, batch_size)
+
+    assert reference.n_reviews == corpus.n_reviews == 29
+    assert signature(corpus) == signature(reference)
+    assert 3 not in [s.review_idx for s in corpus.sentences]
+
+
+def miners():
+    '''
+    INPUT: None
+    OUTPUT: Unigramer, Bigramer, Trigramer
+
+    Returns miners whose unigrams 'ear' and 'battery' are substrings of words
+    of other n-grams
+    '''
+    unigramer = Unigramer()
+    unigramer.unigrams = set(['ear', 'battery', 'sound'])
+    unigramer.rev_dict['ear'] = PostingList(range(10))
+    unigramer.rev_dict['battery'] = PostingList(range(10))
+    unigramer.rev_dict['sound'] = PostingList(range(10))
+
+    bigramer = Bigramer(unigramer)
+    bigramer.bigrams = set(['ear pad', 'year warranty', 'battery life',
+                            'sound quality'])
+    bigramer.bigram_words = set(['ear', 'pad', 'year', 'warranty',
+                                 'battery', 'life', 'sound', 'quality'])
+    bigramer.rev_dict['ear pad'] = PostingList([0, 1])
+    bigramer.rev_dict['year warranty'] = PostingList([2])
+    bigramer.rev_dict['battery life'] = PostingList([3, 4])
+    bigramer.rev_dict['sound quality'] = PostingList([5])
+
+    trigramer = Trigramer(bigramer)
+    trigramer.trigrams = set(['batteryless ear pad'])
+    trigramer.rev_dict['batteryless ear pad'] = PostingList([6])
+
+    return unigramer, bigramer, trigramer
+
+
+def test_update_review_count_matches_substrings():
+    unigramer, bigramer, trigramer = miners()
+    unigramer.update_review_count(bigramer, trigramer)
+
+    # 'ear' is also a substring of 'year warranty', as in the all-pairs scan
+    assert unigramer.rev_dict['ear'].tolist() == [3, 4, 5, 7, 8, 9]
+    assert unigramer.rev_dict['battery'].tolist() == [0, 1, 2, 5, 7, 8, 9]
+    assert unigramer.rev_dict['sound'].tolist() == [0, 1, 2, 3, 4, 6, 7, 8,
+                                                    9]
+
+
+def test_update_review_count_without_trigrams():
+    unigramer, bigramer, _ = miners()
+    unigramer.update_review_count(bigramer)
+
+    assert unigramer.rev_dict['ear'].tolist() == [3, 4, 5, 6, 7, 8, 9]
+
+
+def old_candidate_unigrams(corpus, min_pct=0.01, amod_pct=0.094):
+    '''
+    INPUT: ReviewSents, float, float
+    OUTPUT: set, dict, dict, dict, dict
+
+    Unigramer.candidate_unigrams as it was before TokenStore, counting
+    sentences with CountVectorizer. Returns the unigrams, cnt_dict, rev_dict,
+    sent_dict and word_pos_dict.
+    '''
+    text = pytest.importorskip('sklearn.feature_extraction.text')
+    cnt_dict, dep_dict = defaultdict(int), defaultdict(list)
+    rev_dict, sent_dict = defaultdict(set), defaultdict(list)
+    word_pos_dict = defaultdict(list)
+    count_X = []
+
+    for sent in corpus.sentences:
+        wordset = set()
+
+        for token in sent.sent:
+            cnt_dict[token.lemma_] += 1
+            dep_dict[token.head.lemma_].append(token.dep_)
+            root = token.vocab[token.lemma].prob
+
+            if token.tag_ in noun_tag and (root < -7.5 and
+                                           token.lemma_ not in nonaspects):
+                wordset.add(token.lemma_)
+                rev_dict[token.lemma_].add(sent.review_idx)
+
+                if sent.sent_idx not in sent_dict[token.lemma_]:
+                    word_pos_dict[token.lemma_].append(token.i -
+                                                       sent.start_idx)
+                    sent_dict[token.lemma_].append(sent.sent_idx)
+
+        count_X.append(" ".join(wordset))
+
+    cnt_vec = text.CountVectorizer()
+    freq = cnt_vec.fit_transform(count_X)
+    total_count = freq.toarray().sum(axis=0)
+    features = np.array(cnt_vec.get_feature_names())
+    unigrams = set(features[total_count >= min_pct * corpus.n_sent])
+
+    for word in unigrams.copy():
+        if np.mean(np.array(dep_dict[word]) == 'amod') < amod_pct:
+            unigrams.remove(word)
+
+    return unigrams, cnt_dict, rev_dict, sent_dict, word_pos_dict
+
+
+def lists(dictionary):
+    '''
+    INPUT: dict
+    OUTPUT: dict
+
+    Returns dictionary with the values of dictionary as sorted lists, so that
+    sets and PostingLists compare equal
+    '''
+    return dict((key, sorted(value)) for key, value in dictionary.items()
+                if len(value))
+
+
+@pytest.mark.parametrize('min_pct', [0.005, 0.01, 0.03])
+def test_candidate_unigrams_match_count_vectorizer(corpus, min_pct):
+    unigrams, cnt_dict, rev_dict, sent_dict, word_pos_dict = \
+        old_candidate_unigrams(corpus, min_pct)
+
+    unigramer = Unigramer()
+
+    assert unigramer.candidate_unigrams(corpus, min_pct) == unigrams
+    assert unigrams
+    assert dict(unigramer.cnt_dict) == dict(cnt_dict)
+    assert lists(unigramer.rev_dict) == lists(rev_dict)
+    assert lists(unigramer.sent_dict) == lists(sent_dict)
+    assert dict(unigramer.word_pos_dict) == dict(word_pos_dict)
+
+
+class OldBigramer(object):
+    '''
+    Bigramer.candidate_bigrams as it was before TokenStore, looking at the
+    tokens within 3 words of every noun one at a time
+    '''
+
+    def __init__(self, unigramer):
+        self.avg_dist = defaultdict(float)
+        self.bigrams = set()
+        self.bigram_words = set()
+        self.distances = defaultdict(list)
+        self.ordering = defaultdict(list)
+        self.pmi = defaultdict(float)
+        self.rev_dict = defaultdict(set)
+        self.sent_dict = defaultdict(list)
+        self.unigramer = unigramer
+        self.word_pos_dict = defaultdict(list)
+
+    def _reverse_key(self, key, new_key):
+        for name in ['avg_dist', 'distances', 'pmi', 'rev_dict', 'sent_dict',
+                     'word_pos_dict']:
+            values = getattr(self, name)
+            values[new_key] = values.pop(key)
+
+        self.ordering[new_key] = self.ordering.pop(key)[::-1]
+
+    def _get_compactness_feat(self, corpus):
+        for sent in corpus.sentences:
+            output = set()
+
+            for i, token in enumerate(sent.sent):
+                if token.tag_ not in noun_tag or token.lemma_ in nonaspects:
+                    continue
+
+                for j in xrange(max(0, i - 3), min(i + 4, sent.words)):
+                    item = sent.sent[j]
+                    root = item.vocab[item.lemma].prob
+
+                    if j == i or not (root < -7.5 and
+                                      item.dep_ not in com_dep and
+                                      item.tag_ not in com_tag and
+                                      item.lemma_ not in nonaspects):
+                        continue
+
+                    bigrm = " ".join(sorted([item.lemma_, token.lemma_]))
+                    dist = item.i - token.i
+                    word_sort = item.lemma_ < token.lemma_
+
+                    if not self.ordering[bigrm]:
+                        self.ordering[bigrm] = [0, 0]
+
+                    self.distances[bigrm].append(abs(dist))
+                    self.rev_dict[bigrm].add(sent.review_idx)
+                    self.ordering[bigrm][word_sort == (dist > 0)] += 1
+
+                    if sent.sent_idx not in self.sent_dict[bigrm]:
+                        self.word_pos_dict[bigrm].append(token.i -
+                                                         sent.start_idx)
+                        self.sent_dict[bigrm].append(sent.sent_idx)
+
+                    output.add(bigrm)
+
+            for element in output:
+                yield element
+
+    def candidate_bigrams(self, corpus, min_pct=0.005, pmi_pct=0.0003,
+                          max_avg_dist=2):
+        cnt_dict = self.unigramer.cnt_dict
+        feats = Counter(self._get_compactness_feat(corpus))
+
+        for (key, val) in feats.iteritems():
+            order = sorted(key.split(" "),
+                           reverse=self.ordering[key][1] >
+                           self.ordering[key][0])
+            new_key = " ".join(order)
+
+            pmi = val / (cnt_dict[order[0]] * cnt_dict[order[1]])
+            avg_dist = round(np.mean(self.distances[key]), 2)
+
+            if pmi >= pmi_pct and (avg_dist < max_avg_dist and
+                                   val >= max(2, min_pct * corpus.n_sent)):
+                self.avg_dist[key] = avg_dist
+                self.pmi[key] = pmi
+
+                self.bigrams.add(new_key)
+                self.bigram_words.update(set(order))
+
+                if key != new_key:
+                    self._reverse_key(key, new_key)
+
+        return self.bigrams
+
+
+@pytest.mark.parametrize('min_pct', [0.001, 0.005, 0.02])
+def test_candidate_bigrams_match_token_loop(corpus, min_pct):
+    unigramer = Unigramer()
+    unigramer.candidate_unigrams(corpus)
+    reference = OldBigramer(unigramer)
+    bigramer = Bigramer(unigramer)
+
+    assert bigramer.candidate_bigrams(corpus, min_pct) == \
+        reference.candidate_bigrams(corpus, min_pct)
+    assert bigramer.bigrams
+    assert bigramer.bigram_words == reference.bigram_words
+
+    for name in ['avg_dist', 'distances', 'ordering', 'pmi',
+                 'word_pos_dict']:
+        assert dict(getattr(bigramer, name)) == \
+            dict(getattr(reference, name)), name
+
+    assert lists(bigramer.rev_dict) == lists(reference.rev_dict)
+    assert lists(bigramer.sent_dict) == lists(reference.sent_dict)
+
+
+def test_trigrams_match_all_pairs(corpus):
+    results = []
+
+    for reference in [True, False]:
+        unigramer = Unigramer()
+        unigramer.candidate_unigrams(corpus)
+        bigramer = Bigramer(unigramer)
+        bigramer.candidate_bigrams(corpus)
+        results.append(trigram_join.run(unigramer, bigramer, corpus,
+                                        reference)[1])
+
+    reference, result = results
+
+    assert result[0]
+    assert result[0] == reference[0]
+    assert lists(result[1]) == lists(reference[1])
+    assert result[2] == reference[2]
+    assert lists(result[3]) == lists(reference[3])
+    assert result[4] == reference[4]
+    assert lists(result[5]) == lists(reference[5])
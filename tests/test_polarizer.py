@@ -0,0 +1,88 @@
+'''
+Checks that the parallel and lazy ways of polarizing aspects in polarizer.py
+give the same results as polarizing every aspect serially.
+'''
+
+import cPickle
+import pytest
+
+pytest.importorskip('spacy.en')
+pytest.importorskip('textblob')
+
+from parsers import Bigramer, Trigramer, Unigramer
+from polarizer import Polarizer
+
+
+def mine(corpus):
+    '''
+    INPUT: ReviewSents
+    OUTPUT: Unigramer, Bigramer, Trigramer
+
+    Mines the aspects of corpus as pipeline.summarize does
+    '''
+    unigramer = Unigramer()
+    unigramer.candidate_unigrams(corpus)
+    bigramer = Bigramer(unigramer)
+    bigramer.candidate_bigrams(corpus)
+    trigramer = Trigramer(bigramer)
+    trigramer.candidate_trigrams(corpus)
+    bigramer.pop_bigrams(trigramer)
+    unigramer.update_review_count(bigramer, trigramer)
+
+    return unigramer, bigramer, trigramer
+
+
+def results(polarizer):
+    '''
+    INPUT: Polarizer
+    OUTPUT: tuple
+
+    Returns the results of a polarizer that every way of polarizing must
+    give
+    '''
+    return (dict(polarizer.aspect_dict), dict(polarizer.aspect_pct),
+            dict(polarizer.aspect_pol_list), dict(polarizer.ratings),
+            polarizer.top_asps)
+
+
+@pytest.mark.parametrize('batch', [False, True])
+@pytest.mark.parametrize('pool', ['process', 'thread'])
+def test_parallel_matches_serial(corpus, batch, pool):
+    miners = mine(corpus)
+    reference = Polarizer(*miners)
+    reference.polarize_aspects(corpus, batch=batch)
+    polarizer = Polarizer(*miners)
+    polarizer.polarize_aspects(corpus, batch=batch, n_jobs=3, pool=pool,
+                               min_parallel=1)
+
+    assert reference.aspect_dict
+    assert results(polarizer) == results(reference)
+
+
+@pytest.mark.parametrize('batch', [False, True])
+def test_lazy_matches_eager(corpus, batch):
+    miners = mine(corpus)
+    reference = Polarizer(*miners)
+    reference.polarize_aspects(corpus, batch=batch)
+    polarizer = Polarizer(*miners)
+    polarizer.polarize_aspects(corpus, batch=batch, lazy=True)
+
+    for n in [1, 3, 1000]:
+        assert polarizer.top_aspects(n) == [reference.top_asps[0][:n],
+                                            reference.top_asps[1][:n]]
+
+    # nothing is polarized until an aspect is looked up
+    assert not polarizer.aspect_dict
+
+    top = reference.top_asps[0][:3]
+    copy = cPickle.loads(cPickle.dumps(polarizer, 2))
+
+    for lazy in [polarizer, copy]:
+        for aspect in top:
+            assert lazy.aspect_pct[aspect] == reference.aspect_pct[aspect]
+            assert lazy.aspect_pol_list[aspect] == \
+                reference.aspect_pol_list[aspect]
+            assert lazy.ratings[aspect] == reference.ratings[aspect]
+            assert lazy.aspect_dict[aspect] == reference.aspect_dict[aspect]
+
+        assert sorted(lazy.aspect_dict) == sorted(top)
@@ -0,0 +1,64 @@
+'''
+Checks that PostingList gives the same results as the Python sets it
+replaced in the n-gram miners of parsers.py.
+'''
+
+from postings import PostingList
+import cPickle
+import numpy as np
+import pytest
+
+
+def random_sets(seed, n=200, size=500):
+    '''
+    INPUT: int, int, int
+    OUTPUT: set, set
+
+    Returns two random sets of indexes below size, with duplicates in the
+    lists they are drawn from
+    '''
+    rnd = np.random.RandomState(seed)
+    return set(rnd.randint(0, size, n).tolist()), \
+        set(rnd.randint(0, size, n // 2).tolist())
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_set_operations_match_sets(seed):
+    a, b = random_sets(seed)
+    pa, pb = PostingList(list(a) * 2), PostingList(b)
+
+    assert (pa & pb).tolist() == sorted(a & b)
+    assert (pa | pb).tolist() == sorted(a | b)
+    assert (pa - pb).tolist() == sorted(a - b)
+    assert (pa - b).tolist() == sorted(a - b)
+    assert len(pa) == len(a)
+    assert pa.isin(pb).tolist() == [idx in b for idx in sorted(a)]
+
+    for idx in range(-1, 501):
+        assert (idx in pa) == (idx in a)
+
+
+def test_in_place_operations():
+    posting = PostingList([5, 1, 3])
+    posting -= PostingList([3])
+    posting |= [7, 1]
+
+    assert posting == [1, 5, 7]
+    assert posting != [1, 5]
+    assert list(posting) == [1, 5, 7]
+    assert posting[0] == 1 and posting[1:].tolist() == [5, 7]
+
+
+def test_empty():
+    posting = PostingList()
+
+    assert not posting
+    assert 0 not in posting
+    assert (posting | [2]).tolist() == [2]
+    assert not (PostingList([1]) & posting)
+
+
+def test_pickle_round_trip():
+    posting = PostingList(range(0, 100, 3))
+
+    assert cPickle.loads(cPickle.dumps(posting, 2)) == posting
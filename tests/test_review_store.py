@@ -0,0 +1,136 @@
+'''
+Checks ReviewStore against the in-memory stand-in collections of
+mongo_writes.py and review_lookup.py: bulk upserts store the same documents
+as one update_one per review did, and cached lookups through the index give
+the same reviews as queries of the whole documents.
+'''
+
+import pytest
+
+pytest.importorskip('pymongo')
+
+from mongo_writes import RemoteCollection, sample_docs, write_each
+from review_lookup import IndexedCollection
+from review_store import REVIEW_FIELDS, ReviewStore, review_id
+
+
+@pytest.fixture(scope='module')
+def docs():
+    '''
+    Review documents of the sample products
+    '''
+    return sample_docs()
+
+
+@pytest.mark.parametrize('batch_size', [1, 7, 100, 10000])
+def test_bulk_matches_each(docs, batch_size):
+    each, bulk = RemoteCollection(0), RemoteCollection(0)
+    write_each(each, docs)
+
+    store = ReviewStore(bulk, batch_size)
+    store.put_many(docs)
+
+    assert bulk.docs == each.docs
+    assert bulk.round_trips == -(-len(docs) // batch_size)
+    assert store.stats()['documents'] == len(docs)
+    assert store.stats()['batches'] == bulk.round_trips
+
+
+def test_rewrite_updates(docs):
+    collection = RemoteCollection(0)
+    store = ReviewStore(collection, 50)
+    store.put_many(docs)
+
+    store.put_many(dict(doc, rating=1) for doc in docs[:30])
+    ratings = [collection.docs[review_id(doc['asin'], doc['review_idx'])]
+               ['rating'] for doc in docs]
+
+    assert len(collection.docs) == len(docs)
+    assert ratings == [1] * 30 + [doc['rating'] for doc in docs[30:]]
+
+
+def test_add_waits_for_full_batch(docs):
+    collection = RemoteCollection(0)
+    store = ReviewStore(collection, 10)
+
+    for doc in docs[:9]:
+        store.add(doc)
+
+    assert collection.round_trips == 0
+
+    store.add(docs[9])
+    assert collection.round_trips == 1
+    assert len(collection.docs) == 10
+
+
+def test_batch_size_must_be_positive():
+    with pytest.raises(ValueError):
+        ReviewStore(RemoteCollection(0), 0)
+
+
+def indexed_store(docs, cache_size=1000):
+    '''
+    INPUT: list(dict), int
+    OUTPUT: ReviewStore
+
+    Returns a store of docs in an indexed stand-in collection
+    '''
+    store = ReviewStore(IndexedCollection(0), 100, cache_size)
+    store.put_many(docs)
+    store.ensure_index()
+
+    return store
+
+
+def test_lookup_matches_documents(docs):
+    store = indexed_store(docs)
+
+    for doc in docs[::7]:
+        review = store.get(doc['asin'], doc['review_idx'])
+        assert review == dict((field, doc[field]) for field in REVIEW_FIELDS)
+
+    assert store.get(docs[0]['asin'], len(docs)) is None
+
+
+def test_lookup_cache(docs):
+    store = indexed_store(docs, cache_size=2)
+    keys = [(doc['asin'], doc['review_idx']) for doc in docs[:3]]
+
+    first = store.get(*keys[0])
+    store.get(*keys[1])
+    assert store.get(*keys[0]) is first
+
+    store.get(*keys[2])
+    round_trips = store.collection.round_trips
+    store.get(*keys[0])
+    store.get(*keys[2])
+    assert store.collection.round_trips == round_trips
+
+    store.get(*keys[1])
+    assert store.collection.round_trips == round_trips + 1
+    assert store.cache_stats() == {'hits': 3, 'misses': 4,
+                                   'hit_rate': 3 / 7., 'evictions': 2,
+                                   'reviews': 2}
+
+
+def test_rewrite_invalidates_cache(docs):
+    store = indexed_store(docs)
+    doc = docs[0]
+
+    store.get(doc['asin'], doc['review_idx'])
+    store.put_many([dict(doc, review=u'Rewritten')])
+
+    assert store.get(doc['asin'], doc['review_idx'])['review'] == \
+        u'Rewritten'
+
+
+def test_ensure_index_checks_keys(docs):
+    collection = IndexedCollection(0)
+    store = ReviewStore(collection)
+
+    assert store.ensure_index() == 'asin_1_review_idx_1'
+
+    collection.create_index = lambda keys: '_id_'
+
+    with pytest.raises(RuntimeError):
+        store.ensure_index()
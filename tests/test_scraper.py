@@ -0,0 +1,155 @@
+'''
+Checks how Loader.scrape in scraper.py retries crawls that do not finish,
+that Loader.extract gives the same reviews with several worker processes as
+with one, and that Loader.refresh adds the same reviews as scraping the
+product again, on the stub server of stub_server.py.
+'''
+
+import cPickle
+import functools
+import os
+import pytest
+
+pytest.importorskip('pymongo')
+pytest.importorskip('requests')
+
+from amazon_crawler import HostThrottle, crawl, crawl_delta
+from conftest import ROOT
+from crawl_manifest import CrawlManifest
+from delta_crawl import listing
+from mongo_writes import RemoteCollection
+from review_store import ReviewStore
+from stub_server import StubServer
+import scraper
+
+ASIN = 'B000000000'
+
+
+@pytest.fixture
+def failing_crawl(tmpdir, monkeypatch):
+    '''
+    Replaces the crawl of scraper.py with one that stores the pages in
+    stored and fails, and returns the folder of the product
+    '''
+    folder = tmpdir.join('reviews', 'com', ASIN).ensure(dir=True)
+    monkeypatch.chdir(tmpdir)
+    stored = []
+
+    def crawl(asins, domain, out, maxreviews, workers, progress):
+        for page in stored:
+            folder.join('page{}.html'.format(page)).write('html')
+
+        manifest = CrawlManifest(str(folder), ASIN, maxreviews)
+        manifest.completed_pages = list(stored)
+        manifest.last_page = 30
+        manifest.finish('failed')
+
+        return {ASIN: {'codes': {}, 'status': 'failed'}}
+
+    monkeypatch.setattr(scraper, 'crawl', crawl)
+
+    return folder, stored
+
+
+def test_keeps_pages_that_cover_n_reviews(failing_crawl):
+    folder, stored = failing_crawl
+    stored.extend(range(1, 11))
+
+    loader = scraper.Loader('https://www.amazon.com/dp/{}/'.format(ASIN))
+    loader.scrape(100)
+
+    assert len(folder.listdir(lambda path: path.ext == '.html')) == 10
+
+
+def test_raises_without_deleting_pages(failing_crawl):
+    folder, stored = failing_crawl
+    stored.extend(range(1, 6))
+
+    loader = scraper.Loader('https://www.amazon.com/dp/{}/'.format(ASIN))
+
+    with pytest.raises(RuntimeError) as error:
+        loader.scrape(100)
+
+    assert '5 pages' in str(error.value)
+    assert os.path.exists(str(folder.join('page5.html')))
+
+
+@pytest.fixture
+def stub(tmpdir, monkeypatch):
+    '''
+    Stub server with the reviews of a sample product, which the crawls of
+    scraper.py download without pauses
+    '''
+    stub = StubServer({}).start()
+    throttle = HostThrottle(0, jitter=0)
+    monkeypatch.chdir(tmpdir)
+    monkeypatch.setattr(scraper, 'crawl', functools.partial(
+        crawl, base_url=stub.base_url, throttle=throttle))
+    monkeypatch.setattr(scraper, 'crawl_delta', functools.partial(
+        crawl_delta, base_url=stub.base_url, throttle=throttle))
+    yield stub
+    stub.stop()
+
+
+@pytest.mark.parametrize('engine', ['soup', 'regex'])
+def test_refresh_adds_new_reviews(stub, engine):
+    asin = 'B00J7B8T5Q'
+
+    with open(os.path.join(ROOT, 'data', 'sample_data.pkl'), 'rb') as f:
+        sample_data = cPickle.load(f)[asin]
+
+    ids = ['R{:06d}'.format(i) for i in range(len(sample_data[3]))]
+    stub.pages[asin] = listing(sample_data, ids, 25)
+    url = 'https://www.amazon.com/dp/{}/'.format(asin)
+    collection = RemoteCollection(0)
+
+    loader = scraper.Loader(url)
+    loader.scrape(-1)
+    loader.extract(engine=engine, store=ReviewStore(collection))
+
+    # 25 reviews were posted since the product was scraped
+    stub.pages[asin] = listing(sample_data, ids, 0)
+    loader.refresh(engine=engine, store=ReviewStore(collection))
+    n_scraped = len(ids) - 25
+
+    assert [doc['review_id'] for doc in loader.new_reviews] == ids[:25]
+    assert [doc['review_idx'] for doc in loader.new_reviews] == \
+        range(n_scraped, len(ids))
+    assert sorted(doc['review_id'] for doc in collection.find()) == \
+        sorted(ids)
+
+    loader.refresh(engine=engine, store=ReviewStore(collection))
+
+    assert loader.new_reviews == []
+    assert len(collection.docs) == len(ids)
+
+
+@pytest.mark.parametrize('n_jobs', [1, 3])
+def test_parallel_extract_matches_serial(stub, n_jobs):
+    asin = 'B00J7B8T5Q'
+
+    with open(os.path.join(ROOT, 'data', 'sample_data.pkl'), 'rb') as f:
+        sample_data = cPickle.load(f)[asin]
+
+    ids = ['R{:06d}'.format(i) for i in range(len(sample_data[3]))]
+    stub.pages[asin] = listing(sample_data, ids, 0)
+    url = 'https://www.amazon.com/dp/{}/'.format(asin)
+    results = []
+
+    scraper.Loader(url).scrape(-1)
+
+    for jobs in [1, n_jobs]:
+        collection = RemoteCollection(0)
+        loader = scraper.Loader(url)
+        loader.extract(asin, n_jobs=jobs, store=ReviewStore(collection, 7))
+        results.append((loader.ratings, loader.reviews,
+                        sorted(collection.docs.items())))
+
+    expected, actual = results
+    docs = sorted((doc for _, doc in actual[2]),
+                  key=lambda doc: doc['review_idx'])
+
+    assert actual == expected
+    assert [doc['review_idx'] for doc in docs] == range(len(ids))
+    assert [doc['review_id'] for doc in docs] == ids
+    assert [doc['rating'] for doc in docs] == actual[0]
@@ -0,0 +1,96 @@
+'''
+Checks the sentiment scorers of sentiment.py against the TextBlob and Afinn
+packages that Polarizer called directly before.
+'''
+
+from itertools import groupby
+import pytest
+
+pytest.importorskip('textblob')
+pytest.importorskip('afinn')
+
+from sentiment import BatchScorer, SentimentCache, afinn
+from textblob import TextBlob
+import batch_sentiment
+import numpy as np
+import unicodedata
+
+
+def ascii_text(text):
+    '''
+    INPUT: unicode
+    OUTPUT: str
+
+    Returns text without accents and non ascii characters, as Polarizer
+    scored it before SentimentCache
+    '''
+    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore')
+
+
+def review_blocks(corpus):
+    '''
+    INPUT: ReviewSents
+    OUTPUT: list(list(int))
+
+    Returns the sentence indexes of every review, and of the last two
+    sentences of every review
+    '''
+    blocks = [[s.sent_idx for s in sents] for _, sents in
+              groupby(corpus.sentences, lambda s: s.review_idx)]
+
+    return blocks + [block[-2:] for block in blocks if len(block) > 2]
+
+
+def test_cache_matches_packages(corpus):
+    cache = SentimentCache(corpus.tokens.sent_text)
+
+    for block in review_blocks(corpus):
+        text = ascii_text(u''.join(corpus.tokens.sent_text[s]
+                                   for s in block))
+
+        assert round(cache.blob_polarity(block), 3) == \
+            round(TextBlob(text).sentiment.polarity, 3)
+        assert cache.afinn_score(block) == afinn.score(text)
+
+
+def test_cache_scores_once(corpus):
+    cache = SentimentCache(corpus.tokens.sent_text)
+    blocks = review_blocks(corpus)
+
+    for _ in range(2):
+        for block in blocks:
+            cache.blob_polarity(block)
+            cache.afinn_score(block)
+
+    stats = cache.stats()
+
+    assert stats['blob_calls'] == len(set(map(tuple, blocks)))
+    assert stats['blob_saved'] == 2 * len(blocks) - stats['blob_calls']
+    assert stats['afinn_calls'] == len(set(s for b in blocks for s in b))
+
+
+def test_batch_scorer_matches_packages():
+    texts, ratings = batch_sentiment.load_reviews()
+    scorer = BatchScorer()
+
+    blob_ref, afin_ref = batch_sentiment.package_scores(texts)
+    blob, afin = batch_sentiment.batch_scores(scorer, texts)
+    diff = np.abs(blob - blob_ref)
+
+    # see BatchScorer for where TextBlob polarity differs
+    assert np.mean(diff == 0) >= 0.994
+    assert np.mean(diff <= 0.05) >= 0.997
+    assert np.array_equal(afin, afin_ref)
+    assert np.mean(scorer.polarity_class(ratings, blob, afin) ==
+                   scorer.polarity_class(ratings, blob_ref, afin_ref)) >= 0.99
+
+
+def test_polarity_class_matches_rules():
+    scorer = BatchScorer()
+    cases = [(5, 0.2, 0, 'pos'), (5, 0.1, 0, 'mixed'), (4, 0.3, 4, 'pos'),
+             (4, 0.3, 3, 'mixed'), (3, -0.1, 0, 'neg'), (2, 0.1, -1, 'neg'),
+             (2, 0.1, 0, 'mixed'), (1, 0.2, -1, 'neg'), (1, 0.3, -1, 'mixed')]
+    rating, pol_blob, pol_afin, expected = zip(*cases)
+
+    assert scorer.polarity_class(rating, pol_blob, pol_afin).tolist() == \
+        list(expected)
@@ -0,0 +1,57 @@
+'''
+Checks that the streaming pipeline of Loader.stream in scraper.py feeding
+ReviewSents stores and parses the same reviews as scraping, extracting and
+parsing one after the other, on the stub server of stub_server.py.
+'''
+
+import functools
+import pytest
+
+pytest.importorskip('pymongo')
+pytest.importorskip('requests')
+pytest.importorskip('spacy.en')
+
+from amazon_crawler import HostThrottle, crawl
+from mongo_writes import RemoteCollection
+from parse_throughput import signature
+from review_store import ReviewStore
+from stream_pipeline import ASIN, sequential, streamed
+from stub_server import StubServer, sample_pages
+import scraper
+
+
+@pytest.fixture
+def stub(tmpdir, monkeypatch):
+    '''
+    Stub server with the review pages of the sample products, which the
+    crawls of scraper.py download without pauses
+    '''
+    stub = StubServer(sample_pages()).start()
+    monkeypatch.setattr(scraper, 'crawl', functools.partial(
+        crawl, base_url=stub.base_url, throttle=HostThrottle(0, jitter=0)))
+    monkeypatch.chdir(tmpdir)
+    yield stub
+    stub.stop()
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_stream_matches_sequential(stub, tmpdir, fake_parser, workers):
+    url = 'https://www.amazon.com/dp/{}/'.format(ASIN)
+    results = []
+
+    for run in [sequential, streamed]:
+        # every run scrapes the product from scratch
+        folder = tmpdir.mkdir(run.__name__)
+        folder.chdir()
+        collection = RemoteCollection(0)
+
+        corpus, _ = run(url, 120, workers, 1, 10,
+                              ReviewStore(collection, 10))
+        results.append((signature(corpus), corpus.n_reviews,
+                        sorted(collection.docs.items())))
+
+    expected, actual = results
+
+    assert expected[1] >= 120
+    assert expected[0]
+    assert actual == expected
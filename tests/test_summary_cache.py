@@ -0,0 +1,86 @@
+'''
+Checks that a PolarizerSummary gives the results pages the same data as the
+Polarizer it summarizes, also after a round-trip through SummaryCache.
+'''
+
+from conftest import sample_product
+import pytest
+
+pytest.importorskip('pymongo')
+pytest.importorskip('pandas')
+
+from summary_cache import PolarizerSummary, SummaryCache
+import app_preparer
+import summarizer
+
+
+class Collection(object):
+    '''
+    Stand-in for a MongoDB collection of whole documents
+    '''
+
+    def __init__(self):
+        self.docs = dict()
+
+    def find_one(self, query):
+        doc = self.docs.get(query['_id'])
+
+        if doc and all(doc.get(key) == value
+                       for key, value in query.items()):
+            return doc
+
+    def replace_one(self, filter_, doc, upsert=False):
+        self.docs[filter_['_id']] = doc
+
+
+def outputs(polarizer1, polarizer2):
+    '''
+    INPUT: Polarizer, Polarizer
+    OUTPUT: tuple
+
+    Returns the page data of the results pages of one and two products
+    '''
+    aspects, freqs, both = app_preparer.displayed_aspects(polarizer1,
+                                                          polarizer2)
+    single = app_preparer.displayed_aspects(polarizer1)[0]
+    asins = polarizer1.asin + '_' + polarizer2.asin
+
+    return (aspects, freqs, both,
+            app_preparer.model_data(polarizer1, aspects),
+            app_preparer.model_data(polarizer2, aspects),
+            summarizer.flask_output_iter(aspects, asins, polarizer1,
+                                         polarizer2, 105),
+            single, app_preparer.model_data(polarizer1, single),
+            summarizer.flask_output_iter(single, polarizer1.asin,
+                                         polarizer1, None, 105))
+
+
+@pytest.fixture
+def polarizers(fake_parser):
+    from pipeline import summarize
+
+    return [summarize(fake_parser.ReviewSents(sample_product(asin=asin)))
+            for asin in ['B00J7B8T5Q', 'B004NBXVFS']]
+
+
+def test_summary_matches_polarizer(polarizers):
+    summaries = [PolarizerSummary(polarizer) for polarizer in polarizers]
+
+    assert outputs(*summaries) == outputs(*polarizers)
+
+
+def test_cache_round_trip(polarizers):
+    cache = SummaryCache(Collection())
+    reference = outputs(*polarizers)
+
+    for polarizer in polarizers:
+        cache.put(polarizer, 'fingerprint')
+
+    summaries = [cache.get(polarizer.asin, 'fingerprint')
+                 for polarizer in polarizers]
+
+    assert reference[0] and reference[6]
+    assert outputs(*summaries) == reference
+    assert cache.get(polarizers[0].asin, 'changed') is None
+    assert cache.get(polarizers[0].asin, None) is None
+    assert cache.stats()['hits'] == 2 and cache.stats()['misses'] == 2
@@ -0,0 +1,97 @@
+'''
+Checks that the payloads of PayloadCodec in task_payload.py give back the
+products, summaries and results pages they were made from, and that payloads
+of another version or kind are refused.
+'''
+
+from conftest import Product, sample_product
+import pytest
+
+pytest.importorskip('msgpack')
+pytest.importorskip('pandas')
+
+from summary_cache import PolarizerSummary
+import msgpack
+import task_payload
+
+RESULT = {'aspects': [u'battery life', u'screen'],
+          'aspects_pct': [[[0.25, 0.5], [0.75, 0.125]]],
+          'ratings': [[4.5, 3.]], 'titles': [u'Caf\xe9 Product'],
+          'asins': 'B00J7B8T5Q'}
+
+
+@pytest.fixture
+def summary(fake_parser):
+    from pipeline import summarize
+
+    return PolarizerSummary(summarize(fake_parser.ReviewSents(
+        sample_product())))
+
+
+def test_product_round_trip():
+    codec = task_payload.PayloadCodec()
+    product = Product('B00J7B8T5Q', [], [], name=u'Caf\xe9 Product')
+
+    assert codec.decode_product(codec.encode_product(product)) == \
+        {'asin': 'B00J7B8T5Q', 'name': u'Caf\xe9 Product'}
+
+
+@pytest.mark.parametrize('compress_min', [None, 0])
+def test_summary_round_trip(summary, compress_min):
+    codec = task_payload.PayloadCodec(compress_min)
+    payload = codec.encode_summary(summary)
+
+    assert payload[:1] == ('m' if compress_min is None else 'z')
+    assert codec.decode_summary(payload).to_doc(None) == \
+        summary.to_doc(None)
+
+
+def test_results_round_trip():
+    codec = task_payload.PayloadCodec()
+    payload = codec.encode_results(['B00J7B8T5Q'], RESULT)
+
+    assert codec.decode_results(payload) == {'asins': ['B00J7B8T5Q'],
+                                             'result': RESULT}
+    assert codec.decode_results(codec.encode_results(['B00J7B8T5Q'],
+                                                     None))['result'] is None
+
+
+def test_compresses_large_payloads():
+    codec = task_payload.PayloadCodec(compress_min=200)
+
+    assert codec.encode_results([], None)[:1] == 'm'
+    assert codec.encode_results([], {'text': u'review ' * 100})[:1] == 'z'
+
+    stats = codec.stats()
+    assert stats['encoded'] == 2
+    assert stats['payload_bytes'] < stats['packed_bytes']
+    assert stats['mean_bytes'] == stats['payload_bytes'] / 2.
+
+
+def test_refuses_other_kind():
+    codec = task_payload.PayloadCodec()
+    payload = codec.encode_results([], None)
+
+    with pytest.raises(ValueError):
+        codec.decode_product(payload)
+
+    with pytest.raises(ValueError):
+        codec.decode_results('x' + payload[1:])
+
+    assert codec.stats()['decoded'] == 0
+
+
+def test_refuses_other_version(monkeypatch):
+    codec = task_payload.PayloadCodec()
+    payload = 'm' + msgpack.packb({'version': 0, 'kind': 'results',
+                                   'data': {}}, use_bin_type=True)
+
+    with pytest.raises(ValueError):
+        codec.decode_results(payload)
+
+    monkeypatch.setattr(task_payload, 'PAYLOAD_VERSION', 2)
+    newer = codec.encode_results([], None)
+    monkeypatch.undo()
+
+    with pytest.raises(ValueError):
+        codec.decode_results(newer)
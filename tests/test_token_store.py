@@ -0,0 +1,58 @@
+'''
+Checks that the TokenStore columns of a parsed corpus hold the attributes of
+its spacy tokens and survive pickling.
+'''
+
+import cPickle
+import numpy as np
+
+
+def test_columns_match_tokens(corpus):
+    tokens = corpus.tokens
+    rows = [(s, i, token) for s in corpus.sentences
+            for i, token in enumerate(s.sent)]
+
+    assert len(tokens) == len(rows)
+
+    for row, (sentence, i, token) in enumerate(rows):
+        assert tokens.lemmas[tokens.lemma[row]] == token.lemma_
+        assert tokens.tags[tokens.tag[row]] == token.tag_
+        assert tokens.deps[tokens.dep[row]] == token.dep_
+        assert tokens.head[row] == token.head.i - token.i
+        assert tokens.idx[row] == token.idx - sentence.sent[0].idx
+        assert tokens.pos[row] == i
+        assert tokens.sent[row] == sentence.sent_idx
+        assert tokens.review[row] == sentence.review_idx
+        assert tokens.prob[tokens.lemma[row]] == token.vocab[token.lemma].prob
+
+
+def test_sentences(corpus):
+    tokens = corpus.tokens
+
+    for sentence in corpus.sentences:
+        rows = tokens.sent_tokens(sentence.sent_idx)
+
+        assert [tokens.lemmas[i] for i in tokens.lemma[rows]] == \
+            [token.lemma_ for token in sentence.sent]
+        assert tokens.sent_text[sentence.sent_idx] == sentence.sent.string
+        assert tokens.sent_rating[sentence.sent_idx] == sentence.review_rate
+
+
+def test_mask(corpus):
+    tokens = corpus.tokens
+    nouns = tokens.mask('tag', ['NN', 'NNS'])
+
+    assert nouns.any()
+    assert all(tokens.tags[tag] in ('NN', 'NNS')
+               for tag in tokens.tag[nouns])
+    assert not tokens.mask('lemma', ['not a lemma']).any()
+
+
+def test_pickle_round_trip(corpus):
+    tokens = cPickle.loads(cPickle.dumps(corpus.tokens, 2))
+
+    for attr, value in vars(corpus.tokens).items():
+        if isinstance(value, np.ndarray):
+            assert np.array_equal(getattr(tokens, attr), value)
+        else:
+            assert getattr(tokens, attr) == value